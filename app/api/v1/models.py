@@ -1,14 +1,12 @@
 from __future__ import annotations
 
-from abc import ABC, abstractmethod
+from array import array
 from datetime import datetime
 from enum import Enum
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import pytz
-import requests
 from pydantic import BaseModel
-from pymongo.collection import Collection
 
 
 class CurrencyType(Enum):
@@ -108,62 +106,113 @@ class DatabaseCurrencyList(BaseModel):
         return self.return_currency_list_obj().get_real_currencies().get_currency_list()
 
 
-class ConversionResponse(BaseModel):
-    result: float
+class RateTable:
 
+    """Compact, immutable table of the tracked currencies of a snapshot document, used internally instead of
+    DatabaseCurrencyList (which is only built at the API boundary, by to_model).
 
-class CurrencyApiInterface(ABC):
+    Rates are stored in a flat array of doubles; the code -> rate map and the real/custom partitions are computed once,
+    when the table is built.
 
-    """Interface to establish contract to implement external interfaces to fetch conversion rates."""
-    base_url: str
+    Attributes:
+        update_time (datetime): time the rates were last updated.
+        codes (Tuple[str, ...]): currency codes, in document order.
+        rates (array): rate_usd of every currency (array of doubles, same order as codes).
+        types (Tuple[str, ...]): currency_type of every currency (same order as codes).
+        rate_map (Dict[str, float]): currency code -> rate_usd (also used as the set of tracked codes).
+        real_codes (Tuple[str, ...]): codes of the real currencies.
+        custom_codes (Tuple[str, ...]): codes of the custom currencies.
+    """
 
-    @classmethod
-    @abstractmethod
-    def url_builder(cls, currency_list: list) -> str:
-        """Returns in a single url all the conversion rates required (relative to USD)."""
-        pass
+    __slots__ = ("update_time", "codes", "rates", "types", "rate_map", "real_codes", "custom_codes")
+
+    def __init__(self, update_time: datetime, currencies: Iterable[Tuple[str, float, str]]) -> None:
+        codes, types, rates = [], [], array("d")
+        real_codes, custom_codes = [], []
+        for code, rate_usd, currency_type in currencies:
+            codes.append(code)
+            rates.append(rate_usd)
+            types.append(currency_type)
+            if currency_type == CurrencyType.REAL.value:
+                real_codes.append(code)
+            elif currency_type == CurrencyType.CUSTOM.value:
+                custom_codes.append(code)
+        self.update_time = update_time
+        self.codes = tuple(codes)
+        self.rates = rates
+        self.types = tuple(types)
+        self.rate_map: Dict[str, float] = dict(zip(self.codes, rates))
+        self.real_codes = tuple(real_codes)
+        self.custom_codes = tuple(custom_codes)
 
     @classmethod
-    @abstractmethod
-    def get_conversion(
-            cls, url: str, usd_rate_collection: Collection, tracked_collection: Collection
-    ) -> None:
-        """Updates usd_rate_collection based on a tracked_collection."""
-        pass
+    def from_document(cls, document: dict) -> RateTable:
+        """Builds the table straight from a currency_rate document (skipping pydantic validation); naive update times
+        are assumed to be UTC."""
+
+        update_time = document["update_time"]
+        if update_time.tzinfo is None:
+            update_time = update_time.replace(tzinfo=pytz.utc)
+        return cls(
+            update_time,
+            (
+                (currency["code"], float(currency["rate_usd"]), currency["currency_type"])
+                for currency in document["currencies"]["list_of_currencies"]
+            ),
+        )
 
+    def __len__(self) -> int:
+        return len(self.codes)
 
-class EconomiaAwesomeAPI(CurrencyApiInterface):
-    base_url: str = "http://economia.awesomeapi.com.br/json/last/"
+    def __contains__(self, code: str) -> bool:
+        return code in self.rate_map
 
-    def __init__(self, base_url=None) -> None:
-        if base_url is None:
-            self.base_url = "http://economia.awesomeapi.com.br/json/last/"
-        else:
-            self.base_url = base_url
+    def currency_dicts(self) -> List[dict]:
+        """Returns the currencies as dicts (code, rate_usd, currency_type), as stored in the documents."""
 
-    @classmethod
-    def url_builder(cls, currency_list: list) -> str:
-        """Returns in a single url all the conversion rates required (relative to USD)."""
+        return [
+            {"code": code, "rate_usd": rate_usd, "currency_type": currency_type}
+            for code, rate_usd, currency_type in zip(self.codes, self.rates, self.types)
+        ]
 
-        url = cls.base_url
-        for currency in currency_list:
-            url += currency + "-USD,"
-        return url[:-1]
+    def to_model(self) -> DatabaseCurrencyList:
+        """Returns the table as a DatabaseCurrencyList (built without validation, the table being trusted)."""
 
-    @classmethod
-    def get_conversion(
-            cls, url: str, usd_rate_collection: Collection, tracked_collection: Collection
-    ) -> None:
-        """Updates usd_rate_collection based on a tracked_collection."""
-
-        response_json = requests.get(url).json()
-        rates_dic = {
-            value["code"]: value["bid"] for key, value in response_json.items()
-        }
-        last_doc = usd_rate_collection.find_one({}, sort=[("_id", -1)])
-        del last_doc["_id"]
-        c = last_doc.get("currencies").get("list_of_currencies")
-        for i in c:
-            if i.get("code") in rates_dic.keys():
-                i["rate_usd"] = rates_dic.get(i.get("code"))
-        usd_rate_collection.insert_one(last_doc)
+        items = [
+            CurrencyItem.model_construct(code=code, rate_usd=rate_usd, currency_type=currency_type)
+            for code, rate_usd, currency_type in zip(self.codes, self.rates, self.types)
+        ]
+        return DatabaseCurrencyList.model_construct(
+            update_time=self.update_time, currencies=CurrencyList.model_construct(list_of_currencies=items)
+        )
+
+
+class ConversionResponse(BaseModel):
+    result: float
+
+
+class ConversionRequestItem(BaseModel):
+
+    """Single conversion of a batch request.
+
+    Attributes:
+        source (str): source currency code.
+        target (str): target currency code.
+        amount (float): amount to convert.
+        as_of (datetime): if provided, converts at the rates in effect at this moment.
+    """
+    source: str
+    target: str
+    amount: float
+    as_of: Optional[datetime] = None
+
+
+class ConversionResultItem(ConversionRequestItem):
+
+    """Result of a single conversion of a batch request (either result or error is set)."""
+    result: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatchConversionResponse(BaseModel):
+    results: List[ConversionResultItem]
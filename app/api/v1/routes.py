@@ -1,71 +1,117 @@
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.api.v1.services import (
     get_available_currencies_service,
-    fetch_external_api,
+    get_conversion_snapshot_service,
     get_conversion_service,
+    get_batch_conversion_service,
     add_custom_currency_service, track_real_currency_service, delete_currency_service,
-    update_custom_currency_rate_service, delete_penultimate_document,
+    update_custom_currency_rate_service,
+)
+from app.api.v1.models import (
+    DatabaseCurrencyList,
+    CurrencyItem,
+    CurrencyList,
+    ConversionResponse,
+    ConversionRequestItem,
+    BatchConversionResponse,
 )
-from app.api.v1.models import DatabaseCurrencyList, CurrencyItem, CurrencyList, ConversionResponse
+from app.database import get_mongo_database, rate_snapshot_cache
+from app.http_cache import cache_headers, not_modified, prepared_response, version_etag
+from app.refresher import rate_refresher
+from app.responses import TrustedModelResponse
 
 router = APIRouter(prefix="/v1", tags=["V1 - MongoDB"])
 
 
 @router.get("/available-currencies", response_model=DatabaseCurrencyList)
-def get_available_currencies():
-    """Lists tracked currencies."""
-    return get_available_currencies_service()
+async def get_available_currencies(request: Request):
+    """Lists tracked currencies.
+
+    The listing is serialized once per rate snapshot and sent with a strong ETag (304 if it matches If-None-Match).
+    """
+    return prepared_response(request, (await rate_snapshot_cache.get()).listing)
 
 
 @router.get("/conversion", response_model=ConversionResponse)
-def get_conversion(source_currency: str, target_currency: str, amount: float):
+async def get_conversion(source_currency: str, target_currency: str, amount: float, request: Request,
+                         response: Response, as_of: Optional[datetime] = None,
+                         database: AsyncIOMotorDatabase = Depends(get_mongo_database)):
     """Performs currency conversion.
-    
+
+    The response carries the version of the rate snapshot as ETag (304 if it matches If-None-Match) and may be cached
+    until the next rate refresh.
+
     Attributes:
         source_currency (str): source currency code.
         target_currency (str): target currency code.
         amount (float): amount to convert.
+        as_of (datetime): if provided, converts at the rates in effect at this moment.
     """
-    conversion = get_conversion_service(source_currency, target_currency)
+    snapshot = await get_conversion_snapshot_service(database, source_currency, target_currency, as_of)
+    conversion = await get_conversion_service(database, source_currency, target_currency, as_of, snapshot)
+    headers = cache_headers(version_etag(snapshot.version), rate_refresher.seconds_until_refresh())
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    response.headers.update(headers)
     return {"result": conversion * amount}
 
 
+@router.post("/conversions", response_model=BatchConversionResponse)
+async def get_batch_conversion(items: List[ConversionRequestItem], as_of: Optional[datetime] = None,
+                               database: AsyncIOMotorDatabase = Depends(get_mongo_database)):
+    """Performs several currency conversions at once.
+
+    Items sharing the same moment are converted with the same rate snapshot; an item with an unknown currency gets an
+    error message instead of failing the whole batch.
+
+    Attributes:
+        items (List[ConversionRequestItem]): conversions to perform (source, target, amount and optionally as_of).
+        as_of (datetime): moment used by the items without an as_of of their own (current rates if not provided).
+    """
+    return {"results": await get_batch_conversion_service(database, items, as_of)}
+
+
 @router.post("/track-real-currency", status_code=201, response_model=DatabaseCurrencyList)
-def track_real_currency(code: str):
+async def track_real_currency(code: str, database: AsyncIOMotorDatabase = Depends(get_mongo_database)):
     """Adds real currencies to tracked list.
     
     Attributes:
           code (str): code of the real currency to be tracked.  
     """
-    track_real_currency_service(code.upper())
-    return get_available_currencies_service()
+    await track_real_currency_service(database, code.upper())
+    return TrustedModelResponse(await get_available_currencies_service(database), status_code=201)
 
 
 @router.post("/add-custom-currency", status_code=201, response_model=DatabaseCurrencyList)
-def add_custom_currency(code: str, rate_usd: float):
+async def add_custom_currency(code: str, rate_usd: float,
+                              database: AsyncIOMotorDatabase = Depends(get_mongo_database)):
     """Adds custom currency to tracked list with rate provided by the user.
     
     Attributes:
         code (str): code of the currency to be added.
         rate_usd (float): conversion rate related to USD value.
     """
-    add_custom_currency_service(code.upper(), rate_usd)
-    fetch_external_api()
-    delete_penultimate_document()
-    return get_available_currencies_service()
+    await add_custom_currency_service(database, code.upper(), rate_usd)
+    return TrustedModelResponse(await get_available_currencies_service(database), status_code=201)
 
 
 @router.delete("/delete-currency", status_code=200, response_model=DatabaseCurrencyList)
-def delete_currency(code: str):
+async def delete_currency(code: str, database: AsyncIOMotorDatabase = Depends(get_mongo_database)):
     """Deletes currency based on its code."""
     if code.upper() == "USD":
         raise HTTPException(status_code=404, detail="Can't delete backing currency.")
 
-    return delete_currency_service(code.upper())
+    return TrustedModelResponse(await delete_currency_service(database, code.upper()))
 
 
 @router.put("/update-custom-currency", status_code=200, response_model=DatabaseCurrencyList)
-def update_custom_currency_rate(code: str, usd_rate: float):
+async def update_custom_currency_rate(code: str, usd_rate: float,
+                                      database: AsyncIOMotorDatabase = Depends(get_mongo_database)):
     """Updates custom currency usd_rate."""
-    return update_custom_currency_rate_service(code, usd_rate)
+    return TrustedModelResponse(await update_custom_currency_rate_service(database, code, usd_rate))
@@ -1,66 +1,99 @@
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import List, Optional
 
-import httpx
-import pytz
 from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorDatabase
 
-from app.api.v1.models import CurrencyType, DatabaseCurrencyList
+from app.api.v1.models import CurrencyType, DatabaseCurrencyList, ConversionRequestItem, RateTable
 from app.database import (
-    tracked_currencies_collection,
-    currency_rate_collection,
-    get_last_updated_document,
+    CURRENCY_RATE_COLLECTION,
+    RATE_HISTORY_COLLECTION,
+    get_database,
+    get_snapshot_document,
     update_conversion_collection,
+    push_currency,
+    pull_currency,
+    set_custom_currency_rate,
+    append_rate_history,
+    snapshot_from_document,
+    load_rate_snapshot_as_of,
+    rate_snapshot_cache,
 )
+from app.rate_providers import get_rate_provider
+from app.snapshot import RateSnapshot, convert_many_as_of
 
 
-def get_available_currencies_service() -> DatabaseCurrencyList:
+def currency_list_from_document(document: dict) -> DatabaseCurrencyList:
+    """Returns the DatabaseCurrencyList of a snapshot document, built from its RateTable (without validation)."""
+    return RateTable.from_document(document).to_model()
+
+
+async def get_available_currencies_service(database: AsyncIOMotorDatabase) -> DatabaseCurrencyList:
     """Lists tracked currencies."""
-    fetch_external_api()
-    delete_penultimate_document()
-    last_doc = get_last_updated_document(currency_rate_collection)
-    del last_doc["_id"]
-    obj = DatabaseCurrencyList(**last_doc)
-    return obj
+    return currency_list_from_document(await get_snapshot_document(database[CURRENCY_RATE_COLLECTION]))
 
 
-def fetch_external_api() -> None:
+async def fetch_external_api(database: AsyncIOMotorDatabase) -> None:
     """Updates conversion rates."""
-    update_conversion_collection(
-        currency_rate_collection, tracked_currencies_collection
+    await update_conversion_collection(
+        database[CURRENCY_RATE_COLLECTION],
+        snapshot_cache=rate_snapshot_cache,
+        history_collection=database[RATE_HISTORY_COLLECTION],
     )
     return None
 
 
-def delete_penultimate_document() -> None:
-    last_two_documents = currency_rate_collection.find().sort([("_id", -1)]).limit(2)
+async def refresh_rates_service() -> None:
+    """Updates conversion rates (used by the background refresher)."""
+    await fetch_external_api(get_database())
+
+
+async def publish_document(
+        database: AsyncIOMotorDatabase, document: dict, changed_codes: Optional[set] = None
+) -> None:
+    """Publishes an updated snapshot document to the rate snapshot cache (and the rates of changed_codes to the rate
+    history)."""
+    if changed_codes:
+        await append_rate_history(database[RATE_HISTORY_COLLECTION], document, changed_codes)
+    await rate_snapshot_cache.publish(snapshot_from_document(document))
 
-    last_two_documents_list = list(last_two_documents)
-    penultimate_document = last_two_documents_list[1].get("_id")
-    currency_rate_collection.delete_one({"_id": penultimate_document})
 
+async def get_conversion_snapshot_service(
+        database: AsyncIOMotorDatabase, source_currency: str, target_currency: str, as_of: Optional[datetime] = None
+) -> RateSnapshot:
+    """Returns the rate snapshot a conversion is performed with: the current rates or, if as_of is provided, the rates
+    of both currencies in effect at this moment (from the rate history)."""
+    if as_of is None:
+        return await rate_snapshot_cache.get()
+    return await load_rate_snapshot_as_of(database[RATE_HISTORY_COLLECTION], {source_currency, target_currency}, as_of)
 
-def get_conversion_service(source_currency: str, target_currency: str) -> float:
+
+async def get_conversion_service(
+        database: AsyncIOMotorDatabase,
+        source_currency: str,
+        target_currency: str,
+        as_of: Optional[datetime] = None,
+        snapshot: Optional[RateSnapshot] = None,
+) -> float:
     """Performs currency conversion.
 
     Attributes:
     source_currency (str): source currency code.
     target_currency (str): target currency code.
+    as_of (datetime): if provided, uses the rates in effect at this moment (from the rate history).
+    snapshot (RateSnapshot): snapshot returned by get_conversion_snapshot_service (loaded if not provided).
     """
     if source_currency.upper() == target_currency.upper():
         return 1
-    last_doc = get_last_updated_document(currency_rate_collection)
-    del last_doc["_id"]
-    obj = DatabaseCurrencyList(**last_doc)
-
-    if source_currency not in obj.get_currencies_list(all_currencies=True):
-        raise HTTPException(status_code=400, detail=f"Currency with code={source_currency} is not being tracked")
-    if target_currency not in obj.get_currencies_list(all_currencies=True):
-        raise HTTPException(status_code=400, detail=f"Currency with code={target_currency} is not being tracked")
-    if obj.update_time < datetime.now().astimezone(pytz.utc) - timedelta(minutes=2):
-        fetch_external_api()
-        delete_penultimate_document()
-    cl = obj.return_currency_list_obj()
-    dic = cl.get_currency_rate()
+    if snapshot is None:
+        snapshot = await get_conversion_snapshot_service(database, source_currency, target_currency, as_of)
+    missing = "is not being tracked" if as_of is None else f"has no rate as of {as_of.isoformat()}"
+
+    if source_currency not in snapshot.rates:
+        raise HTTPException(status_code=400, detail=f"Currency with code={source_currency} {missing}")
+    if target_currency not in snapshot.rates:
+        raise HTTPException(status_code=400, detail=f"Currency with code={target_currency} {missing}")
+    dic = snapshot.rates
 
     def find_usd_rate(currency: str):
         """Returns single conversion rate based on USD value."""
@@ -75,88 +108,84 @@ def get_conversion_service(source_currency: str, target_currency: str) -> float:
         return find_usd_rate(source_currency) / find_usd_rate(target_currency)
 
 
-def add_custom_currency_service(code: str, rate_usd: float) -> None:
+async def get_batch_conversion_service(
+        database: AsyncIOMotorDatabase, items: List[ConversionRequestItem], as_of: Optional[datetime] = None
+) -> List[dict]:
+    """Performs several currency conversions, using one rate snapshot per distinct as_of.
+
+    Attributes:
+        items (List[ConversionRequestItem]): conversions to perform.
+        as_of (datetime): moment used by the items without an as_of of their own (current rates if None).
+    """
+    async def load_current(codes):
+        return await rate_snapshot_cache.get()
+
+    async def load_as_of(codes, moment):
+        return await load_rate_snapshot_as_of(database[RATE_HISTORY_COLLECTION], codes, moment)
+
+    return await convert_many_as_of(items, as_of, load_current, load_as_of)
+
+
+async def add_custom_currency_service(database: AsyncIOMotorDatabase, code: str, rate_usd: float) -> None:
     """Adds custom currency to tracked list with rate provided by the user.
 
     Attributes:
         code (str): code of the currency to be added.
         rate_usd (float): conversion rate related to USD value.
     """
-    updated_currencies = get_last_updated_document(tracked_currencies_collection)
-    del updated_currencies["_id"]
-    db_currency_list_obj = DatabaseCurrencyList(**updated_currencies)
+    if code.upper() in (await rate_snapshot_cache.get()).rates:
+        raise HTTPException(status_code=400, detail=f"Currency with {code=} is already being tracked")
+    elif await get_rate_provider().pair_exists("USD", code):
+        raise HTTPException(status_code=400, detail=f"Currency with {code=} already exists, please choose another "
+                                                    f"code or add the real currency to the tracking list using the "
+                                                    f"'track-real-currency' endpoint")
+
     new_currency = {
         "code": code,
         "currency_type": CurrencyType.CUSTOM.value,
         "rate_usd": rate_usd,
     }
-    currency_list = updated_currencies.get("currencies").get("list_of_currencies")
-    if code.upper() in db_currency_list_obj.get_currencies_list():
+    document = await push_currency(database[CURRENCY_RATE_COLLECTION], new_currency)
+    if document is None:
         raise HTTPException(status_code=400, detail=f"Currency with {code=} is already being tracked")
-    elif httpx.get(f"https://economia.awesomeapi.com.br/last/USD-{code}").status_code == 200:
-        raise HTTPException(status_code=400, detail=f"Currency with {code=} already exists, please choose another "
-                                                    f"code or add the real currency to the tracking list using the "
-                                                    f"'track-real-currency' endpoint")
-    else:
-        currency_list.append(new_currency)
-
-    tracked_currencies_collection.insert_one(updated_currencies)
+    await publish_document(database, document, {code})
 
 
-def track_real_currency_service(code: str) -> None:
+async def track_real_currency_service(database: AsyncIOMotorDatabase, code: str) -> None:
     """Adds real currencies to tracked list.
 
     Attributes:
           code (str): code of the real currency to be tracked.
     """
-    request = httpx.get(f"https://economia.awesomeapi.com.br/last/{code}-USD")
+    pair_exists = await get_rate_provider().pair_exists(code, "USD")
     code = code.upper()
-    updated_currencies = get_last_updated_document(tracked_currencies_collection)
-    del updated_currencies["_id"]
-    db_currency_list_obj = DatabaseCurrencyList(**updated_currencies)
-    if request.status_code != 200:
+    if not pair_exists:
         raise HTTPException(status_code=400, detail=f"Currency with {code=} not found. Use 'add-custom-currency' to "
                             f"create and track it.")
-    elif code.upper() in db_currency_list_obj.get_currencies_list(all_currencies=True):
-        raise HTTPException(status_code=400, detail=f"Currency with {code=} is already being tracked")
 
     new_currency = {
         "code": code,
         "currency_type": CurrencyType.REAL.value,
         "rate_usd": 0,
     }
-    currency_list = updated_currencies.get("currencies").get("list_of_currencies")
-    currency_list.append(new_currency)
-    tracked_currencies_collection.insert_one(updated_currencies)
-    fetch_external_api()
-    delete_penultimate_document()
+    if await push_currency(database[CURRENCY_RATE_COLLECTION], new_currency) is None:
+        raise HTTPException(status_code=400, detail=f"Currency with {code=} is already being tracked")
+    await fetch_external_api(database)
 
 
-def delete_currency_service(code: str):
+async def delete_currency_service(database: AsyncIOMotorDatabase, code: str):
     """Deletes currency based on its code."""
-    updated_currencies = get_last_updated_document(currency_rate_collection)
-    del updated_currencies["_id"]
-    db_currency_list_obj = DatabaseCurrencyList(**updated_currencies)
-    if code not in db_currency_list_obj.get_currencies_list(all_currencies=True):
+    document = await pull_currency(database[CURRENCY_RATE_COLLECTION], code)
+    if document is None:
         raise HTTPException(status_code=400, detail=f"Currency with {code=} is not being tracked")
-
-    currency_list = updated_currencies.get("currencies").get("list_of_currencies")
-    for i in currency_list:
-        if i.get("code") == code:
-            del currency_list[currency_list.index(i)]
-            break
-    tracked_currencies_collection.insert_one(updated_currencies)
-    fetch_external_api()
-    updated_currencies_obj = get_available_currencies_service()
-    delete_penultimate_document()
-    return updated_currencies_obj
+    await publish_document(database, document)
+    return currency_list_from_document(document)
 
 
-def update_custom_currency_rate_service(code: str, usd_rate: float):
+async def update_custom_currency_rate_service(database: AsyncIOMotorDatabase, code: str, usd_rate: float):
     """Updates custom currency usd_rate."""
-    delete_currency_service(code)
-    add_custom_currency_service(code, usd_rate)
-    fetch_external_api()
-    delete_penultimate_document()
-    updated_currencies_obj = get_available_currencies_service()
-    return updated_currencies_obj
+    document = await set_custom_currency_rate(database[CURRENCY_RATE_COLLECTION], code, usd_rate)
+    if document is None:
+        raise HTTPException(status_code=400, detail=f"Custom currency with {code=} is not being tracked")
+    await publish_document(database, document, {code})
+    return currency_list_from_document(document)
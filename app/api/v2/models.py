@@ -2,6 +2,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional
 
+from sqlalchemy import Enum as SQLEnum, Index, String
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -21,10 +22,23 @@ class Currency(Base):
 
     """Currency model"""
     __tablename__ = "currencies"
+    __table_args__ = (
+        Index("ix_currencies_code", "code", unique=True),
+    )
 
     id: Mapped[Optional[int]] = mapped_column(primary_key=True)
     code: Mapped[str]
     rate_usd: Mapped[float]
-    type: Mapped[CurrencyType]
+    type: Mapped[CurrencyType] = mapped_column(SQLEnum(CurrencyType, native_enum=False, length=20))
     update_time: Mapped[datetime]
 
+
+class RateHistory(Base):
+
+    """Rate history model: append-only, one row per currency and rate update (partitioned by month on PostgreSQL)"""
+    __tablename__ = "rate_history"
+    __table_args__ = {"postgresql_partition_by": "RANGE (time)"}
+
+    code: Mapped[str] = mapped_column(String(10), primary_key=True)
+    time: Mapped[datetime] = mapped_column(primary_key=True)
+    rate_usd: Mapped[float]
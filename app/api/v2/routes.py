@@ -1,15 +1,39 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Literal, Optional
 
-import pytz
-import requests
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.v2.models import Currency, CurrencyType
-from app.api.v2.schemas import CurrencyList, CurrencySchema
-from app.api.v2.services import update_conversion, check_if_update, get_usd_rate, check_currency_exists_db
-from app.pg_database import get_session
+from app.api.v2.schemas import (
+    CurrencyList,
+    CurrencySchema,
+    ConversionRequestItem,
+    BatchConversionResponse,
+    RateHistoryResponse,
+    DatabasePoolStatus,
+    SingleFlightStatus,
+)
+from app.api.v2.services import (
+    update_conversion,
+    bulk_insert_missing,
+    get_rate_snapshot_as_of,
+    check_currency_exists_db,
+    add_currency,
+    utc_now,
+    to_naive_utc,
+    get_rate_history,
+    interval_seconds,
+    MAX_HISTORY_BUCKETS,
+    rate_snapshot_cache,
+)
+from app.http_cache import cache_headers, not_modified, prepared_response, version_etag
+from app.pg_database import get_session, get_pool_status
+from app.rate_providers import get_rate_provider
+from app.refresher import rate_refresher
+from app.singleflight import async_upstream_flight
+from app.snapshot import convert_many_as_of
 
 router = APIRouter(prefix="/v2", tags=["V2 - Postgres"])
 
@@ -23,109 +47,212 @@ currency_list = [
 
 
 @router.get("/")
-def populate_database(currencies: list[CurrencySchema] = currency_list, session: Session = Depends(get_session)):
-    for currency in currencies:
-        db_currency = session.scalar(select(Currency).where(Currency.code == currency.code))
-        if not db_currency:
-            db_currency = Currency(code=currency.code, rate_usd=currency.rate_usd, type=currency.type,
-                                   update_time=datetime.now())
-            session.add(db_currency)
-            session.commit()
-            session.refresh(db_currency)
+async def populate_database(currencies: list[CurrencySchema] = currency_list,
+                            session: AsyncSession = Depends(get_session)):
+    await bulk_insert_missing(session, [
+        {"code": currency.code, "rate_usd": currency.rate_usd, "type": currency.type, "update_time": utc_now()}
+        for currency in currencies
+    ])
+    await session.commit()
+    await rate_snapshot_cache.invalidate()
 
 
 @router.get("/available-currencies", response_model=CurrencyList)
-def get_available_currencies(session: Session = Depends(get_session)):
-    """Lists tracked currencies."""
-    update_conversion(session=session)
-    currencies = session.scalars(select(Currency)).all()
-    return {"currencies": currencies}
+async def get_available_currencies(request: Request):
+    """Lists tracked currencies.
+
+    The listing is serialized once per rate snapshot and sent with a strong ETag (304 if it matches If-None-Match).
+    """
+    return prepared_response(request, (await rate_snapshot_cache.get()).listing)
 
 
 @router.get("/conversion")
-def get_conversion(source_currency: str, target_currency: str, amount: float, session: Session = Depends(get_session)):
+async def get_conversion(source_currency: str, target_currency: str, amount: float, request: Request,
+                         response: Response, as_of: Optional[datetime] = None,
+                         session: AsyncSession = Depends(get_session)):
     """Performs currency conversion.
 
+    Current rates are read from the rate snapshot shared by every worker. The response carries the version of the rates
+    it was computed with (update time and both rates) as ETag (304 if it matches If-None-Match) and may be cached until
+    the next rate refresh.
+
     Attributes:
         source_currency (str): source currency code.
         target_currency (str): target currency code.
         amount (float): amount to convert.
-        session (Session): db session (for dependency injection purposes).
+        as_of (datetime): if provided, converts at the rates in effect at this moment (from the rate history).
+        session (AsyncSession): db session (for dependency injection purposes).
     """
     if source_currency == target_currency:
         return {"result": "%.2f" % amount}
 
-    if check_if_update(session=session):
-        update_conversion(session=session)
+    if as_of is None:
+        snapshot = await rate_snapshot_cache.get()
+        missing = "is not being tracked"
+    else:
+        snapshot = await get_rate_snapshot_as_of(session, {source_currency, target_currency}, to_naive_utc(as_of))
+        missing = f"has no rate as of {as_of.isoformat()}"
+    source_rate, target_rate = snapshot.rates.get(source_currency), snapshot.rates.get(target_currency)
+    update_time = snapshot.update_time.replace(tzinfo=None)
 
-    if target_currency == "USD":
-        result = get_usd_rate(session=session, code=source_currency) * amount
-        return {"result": "%.2f" % result}
+    if source_rate is None:
+        raise HTTPException(status_code=400, detail=f"Currency with code={source_currency} {missing}")
+    if target_rate is None:
+        raise HTTPException(status_code=400, detail=f"Currency with code={target_currency} {missing}")
+    if not target_rate:
+        raise HTTPException(status_code=400, detail=f"Currency with code={target_currency} has no conversion rate yet")
 
-    result = get_usd_rate(session, source_currency) / get_usd_rate(session, target_currency) * amount
+    headers = cache_headers(
+        version_etag(update_time, source_rate, target_rate), rate_refresher.seconds_until_refresh()
+    )
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    response.headers.update(headers)
+    result = source_rate / target_rate * amount
     return {"result": "%.2f" % result}
 
 
+@router.post("/conversions", response_model=BatchConversionResponse)
+async def get_batch_conversion(items: list[ConversionRequestItem], as_of: Optional[datetime] = None,
+                               session: AsyncSession = Depends(get_session)):
+    """Performs several currency conversions at once.
+
+    Current rates come from the shared rate snapshot and the rates of every other moment are read in a single query; an
+    item with an unknown currency gets an error message instead of failing the whole batch.
+
+    Attributes:
+        items (list[ConversionRequestItem]): conversions to perform (source, target, amount and optionally as_of).
+        as_of (datetime): moment used by the items without an as_of of their own (current rates if not provided).
+        session (AsyncSession): db session (for dependency injection purposes).
+    """
+    async def load_current(codes):
+        return await rate_snapshot_cache.get()
+
+    async def load_as_of(codes, moment):
+        return await get_rate_snapshot_as_of(session, codes, to_naive_utc(moment))
+
+    return {"results": await convert_many_as_of(items, as_of, load_current, load_as_of)}
+
+
+@router.get("/rates/matrix")
+async def get_rates_matrix(format: Literal["json", "npy"] = "json"):
+    """Returns the cross-rate table of every tracked currency.
+
+    The table is computed and serialized once per rate snapshot, so this endpoint only copies bytes.
+
+    Attributes:
+        format (str): "json" ({"update_time", "currencies", "rates"}, rates[i][j] being the amount of currencies[j]
+                worth one currencies[i]) or "npy" (float64 matrix in NumPy .npy format, with the currency codes in the
+                X-Currency-Codes header).
+    """
+    matrix = (await rate_snapshot_cache.get()).cross_rate_matrix
+    if format == "npy":
+        headers = {"X-Currency-Codes": ",".join(matrix.codes)}
+        return Response(content=matrix.npy, media_type="application/octet-stream", headers=headers)
+    return Response(content=matrix.json, media_type="application/json")
+
+
+@router.get("/rates/history", response_model=RateHistoryResponse)
+async def get_rates_history(
+        code: str,
+        from_: Optional[datetime] = Query(None, alias="from"),
+        to: Optional[datetime] = None,
+        interval: str = Query("1h", pattern=r"^[1-9][0-9]*[smhd]$"),
+        session: AsyncSession = Depends(get_session),
+):
+    """Returns the rate history of a currency, downsampled to OHLC buckets.
+
+    Attributes:
+        code (str): currency code.
+        from_ (datetime): first instant (default: 24 hours before to).
+        to (datetime): last instant, exclusive (default: now).
+        interval (str): bucket length, a number followed by s, m, h or d (e.g. 30s, 5m, 1h, 1d).
+        session (AsyncSession): db session (for dependency injection purposes).
+    """
+    end = to_naive_utc(to) if to else utc_now()
+    start = to_naive_utc(from_) if from_ else end - timedelta(days=1)
+    seconds = interval_seconds(interval)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be earlier than 'to'")
+    if (end - start).total_seconds() / seconds > MAX_HISTORY_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"The range spans more than {MAX_HISTORY_BUCKETS} buckets, please "
+                                                    f"use a larger interval")
+    buckets = await get_rate_history(session, code, start, end, seconds)
+    return {"code": code, "interval": interval, "buckets": buckets}
+
+
 @router.post("/track-real-currency", status_code=201, response_model=CurrencySchema)
-def track_real_currency(code: str, session: Session = Depends(get_session)):
+async def track_real_currency(code: str, session: AsyncSession = Depends(get_session)):
     """Adds real currencies to tracked list.
 
     Attributes:
           code (str): code of the real currency to be tracked.
     """
     code = code.upper()
-    if check_currency_exists_db(code=code, session=session):
+    if await check_currency_exists_db(code=code, session=session):
         raise HTTPException(status_code=400, detail=f"Currency with {code=} is already being tracked")
-    response = requests.get(f"https://economia.awesomeapi.com.br/last/USD-{code}")
-    if response.status_code != 200:
+    if not await get_rate_provider().pair_exists("USD", code):
         raise HTTPException(status_code=400, detail=f"Real currency with {code=} not found!")
     db_currency = Currency(code=code, rate_usd=0, type=CurrencyType.REAL,
-                           update_time=datetime.now())
-    session.add(db_currency)
-    session.commit()
-    session.refresh(db_currency)
-    update_conversion(session=session)
+                           update_time=utc_now())
+    await add_currency(session, db_currency)
+    await update_conversion(session=session)
+    await session.refresh(db_currency)
+    await rate_snapshot_cache.invalidate()
     return db_currency
 
 
 @router.post("/add-custom-currency", status_code=201, response_model=CurrencySchema)
-def add_custom_currency(code: str, rate_usd: float, session: Session = Depends(get_session)):
+async def add_custom_currency(code: str, rate_usd: float, session: AsyncSession = Depends(get_session)):
     """Adds custom currency to tracked list with rate provided by the user.
 
     Attributes:
         code (str): code of the currency to be added.
         rate_usd (float): conversion rate related to USD value.
     """
-    if check_currency_exists_db(code=code, session=session):
+    if await check_currency_exists_db(code=code, session=session):
         raise HTTPException(status_code=404, detail=f"Currency with {code=} is already being tracked")
-    response = requests.get(f"https://economia.awesomeapi.com.br/last/USD-{code}")
-    if response.status_code == 200:
+    if await get_rate_provider().pair_exists("USD", code):
         raise HTTPException(status_code=400, detail=f"Real currency with {code=} already exists, please use another code")
     db_currency = Currency(code=code, rate_usd=rate_usd, type=CurrencyType.CUSTOM,
-                           update_time=datetime.now().astimezone(pytz.utc))
-    session.add(db_currency)
-    session.commit()
-    session.refresh(db_currency)
+                           update_time=utc_now())
+    db_currency = await add_currency(session, db_currency)
+    await rate_snapshot_cache.invalidate()
     return db_currency
 
 
 @router.delete("/delete-currency", status_code=200)
-def delete_currency(code: str, session: Session = Depends(get_session)):
+async def delete_currency(code: str, session: AsyncSession = Depends(get_session)):
     """Deletes currency based on its code."""
-    currency = session.scalar(select(Currency).where(Currency.code == code))
+    currency = await session.scalar(select(Currency).where(Currency.code == code))
 
     if not currency:
         raise HTTPException(status_code=404, detail=f"Currency with {code=} not found.")
-    session.delete(currency)
-    session.commit()
+    await session.delete(currency)
+    await session.commit()
+    await rate_snapshot_cache.invalidate()
     return {"message": "Currency has been deleted successfully."}
 
 
 @router.patch("/update-custom-currency", status_code=200, response_model=CurrencySchema)
-def update_custom_currency_rate(code: str, rate_usd: float, session: Session = Depends(get_session)):
+async def update_custom_currency_rate(code: str, rate_usd: float, session: AsyncSession = Depends(get_session)):
     """Updates custom currency usd_rate."""
-    currency_db = session.scalar(select(Currency).where(Currency.code == code))
+    currency_db = await session.scalar(select(Currency).where(Currency.code == code))
     if not currency_db:
         raise HTTPException(status_code=400, detail=f"Currency with {code=} not found.")
-    delete_currency(code=code, session=session)
-    return add_custom_currency(code=code, rate_usd=rate_usd, session=session)
+    await delete_currency(code=code, session=session)
+    return await add_custom_currency(code=code, rate_usd=rate_usd, session=session)
+
+
+@router.get("/metrics/database-pool", response_model=DatabasePoolStatus)
+async def get_database_pool_metrics():
+    """Returns the PostgreSQL connection pool state (connections in use, overflow) and its checkout wait times."""
+    return get_pool_status()
+
+
+@router.get("/metrics/upstream-single-flight", response_model=SingleFlightStatus)
+async def get_upstream_single_flight_metrics():
+    """Returns the upstream rate fetches actually sent (calls) and those served by a concurrent identical fetch
+    (coalesced), since the worker started."""
+    return async_upstream_flight.stats()
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel, ConfigDict
 
@@ -23,3 +24,51 @@ class CurrencyList(BaseModel):
     currencies: list[CurrencySchema]
 
 
+class ConversionRequestItem(BaseModel):
+    """pydantic schema of a single conversion of a batch request (as_of: converts at the rates in effect then)"""
+    source: str
+    target: str
+    amount: float
+    as_of: Optional[datetime] = None
+
+
+class ConversionResultItem(ConversionRequestItem):
+    """pydantic schema of a single conversion result of a batch request (either result or error is set)"""
+    result: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatchConversionResponse(BaseModel):
+    results: list[ConversionResultItem]
+
+
+class RateHistoryBucket(BaseModel):
+    """pydantic schema of a rate history bucket (open, high, low and close rate_usd of the ticks in the bucket)"""
+    time: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    ticks: int
+
+
+class RateHistoryResponse(BaseModel):
+    code: str
+    interval: str
+    buckets: list[RateHistoryBucket]
+
+
+class DatabasePoolStatus(BaseModel):
+    size: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    checkouts: int
+    timeouts: int
+    wait_time: float
+    max_wait_time: float
+
+
+class SingleFlightStatus(BaseModel):
+    calls: int
+    coalesced: int
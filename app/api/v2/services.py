@@ -1,56 +1,366 @@
 from datetime import datetime, timedelta
-from typing import Type
+from typing import Iterable, Mapping, Optional, Type, Union
 
 import pytz
-from fastapi import Depends
-from sqlalchemy import select, create_engine, desc
-from sqlalchemy.orm import Session
-
-from app.api.v2.external_api import CurrencyApiInterface, EconomiaAwesomeAPI
-from app.api.v2.models import Currency, CurrencyType
-from app.api.v2.schemas import CurrencySchema
-from app.pg_database import get_session
-from app.settings import Settings
-
-
-def update_conversion(session: Session, api: CurrencyApiInterface = EconomiaAwesomeAPI) -> None:
-    """Updates conversion for real currencies."""
-    currencies_list = []
-
-    rows = session.query(Currency).filter(Currency.type == CurrencyType.REAL).all()
-    for row in rows:
-        if row.type == CurrencyType.REAL:
-            currencies_list.append(row.code)
-    url = api.url_builder(currencies_list)
-    updated_usd_rate_dict = api.get_conversion(url=url)
-
-    for row in rows:
-        code = row.code
-        if code in updated_usd_rate_dict:
-            row.rate_usd = updated_usd_rate_dict[code]
-            row.update_time = datetime.now().astimezone(pytz.utc)
-            session.commit()
-            session.refresh(row)
-
-
-def check_if_update(session: Session):
-    """Checks if the current data is updated."""
-    rows = session.query(Currency).filter(Currency.type == CurrencyType.REAL).order_by(desc(Currency.update_time))
-    oldest_update = rows.first().update_time
-    if oldest_update.replace(tzinfo=pytz.utc) < datetime.now().astimezone(pytz.utc) - timedelta(seconds=30):
-        return True
-    return False
+from sqlalchemy import (
+    BigInteger,
+    Float,
+    Integer,
+    Select,
+    String,
+    and_,
+    bindparam,
+    cast,
+    column,
+    func,
+    insert,
+    literal_column,
+    select,
+    text,
+    union_all,
+    update,
+    values,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.api.v2.models import Currency, CurrencyType, RateHistory
+from app.external_api import AsyncCurrencyApiInterface
+from app.http_cache import PreparedBody
+from app.pg_database import async_session, get_engine
+from app.rate_providers import get_rate_provider
+from app.snapshot import RateSnapshot, RateSnapshotCache
+
+
+def utc_now() -> datetime:
+    """Returns the current UTC time as a naive datetime (update_time is stored without time zone)."""
+    return datetime.now(pytz.utc).replace(tzinfo=None)
+
+
+def to_naive_utc(time: datetime) -> datetime:
+    """Returns time as a naive UTC datetime (naive datetimes are assumed to be UTC already)."""
+    if time.tzinfo is None:
+        return time
+    return time.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+async def update_conversion(
+        session: AsyncSession,
+        api: Union[Type[AsyncCurrencyApiInterface], AsyncCurrencyApiInterface, None] = None,
+) -> None:
+    """Updates conversion for real currencies (a single bulk update, committed once), fetched from api (the composite
+    rate source by default)."""
+    api = api or get_rate_provider()
+    codes = (await session.scalars(select(Currency.code).where(Currency.type == CurrencyType.REAL))).all()
+    url = api.url_builder(codes)
+    updated_usd_rate_dict = await api.get_conversion(url=url)
+
+    rates = {code: float(updated_usd_rate_dict[code]) for code in codes if code in updated_usd_rate_dict}
+    update_time = utc_now()
+    await bulk_update_rates(session, rates, update_time)
+    await append_rate_history(session, rates, update_time)
+    await session.commit()
+
+
+# rows per statement, keeping bulk statements below the bind parameter limit (32767 for asyncpg and SQLite).
+BULK_CHUNK_SIZE = 5_000
+
+
+async def bulk_update_rates(session: AsyncSession, rates: Mapping[str, float], update_time: datetime) -> None:
+    """Sets rate_usd (and update_time) of every currency in rates, without committing.
+
+    PostgreSQL gets one UPDATE ... FROM (VALUES ...) per chunk; other dialects (SQLite, used in development) get an
+    executemany of the same UPDATE. Codes that are no longer in the table are ignored.
+
+    Arguments:
+        session (AsyncSession): db session.
+        rates (Mapping[str, float]): currency code -> new rate_usd.
+        update_time (datetime): new update_time (naive UTC).
+    """
+    items = list(rates.items())
+    if session.bind.dialect.name == "postgresql":
+        for start in range(0, len(items), BULK_CHUNK_SIZE):
+            new_rates = values(
+                column("code", String), column("rate_usd", Float), name="new_rates"
+            ).data(items[start:start + BULK_CHUNK_SIZE])
+            await session.execute(
+                update(Currency)
+                .where(Currency.code == new_rates.c.code)
+                .values(rate_usd=new_rates.c.rate_usd, update_time=update_time)
+                .execution_options(synchronize_session=False)
+            )
+    elif items:
+        statement = (
+            update(Currency.__table__)
+            .where(Currency.code == bindparam("new_code"))
+            .values(rate_usd=bindparam("new_rate"), update_time=update_time)
+        )
+        await session.execute(statement, [{"new_code": code, "new_rate": rate} for code, rate in items])
+
+
+async def bulk_insert_missing(session: AsyncSession, currencies: Iterable[dict]) -> None:
+    """Inserts every currency whose code is not in the table yet (INSERT ... ON CONFLICT (code) DO NOTHING), without
+    committing.
+
+    Arguments:
+        session (AsyncSession): db session.
+        currencies (Iterable[dict]): code, rate_usd, type and update_time of every currency.
+    """
+    dialect_insert = postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+    currencies = list(currencies)
+    for start in range(0, len(currencies), BULK_CHUNK_SIZE):
+        await session.execute(
+            dialect_insert(Currency)
+            .values(currencies[start:start + BULK_CHUNK_SIZE])
+            .on_conflict_do_nothing(index_elements=[Currency.code])
+        )
+
+
+# months whose rate_history partition is known to exist (PostgreSQL only).
+history_partitions: set = set()
+
+
+def month_start(time: datetime) -> datetime:
+    """Returns the first instant of the month of time."""
+    return time.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+async def ensure_history_partitions(engine: AsyncEngine, time: datetime) -> None:
+    """Creates the rate_history partitions of the month of time and of the next month (PostgreSQL only).
+
+    The partitions are created in a transaction of their own, so that a failing refresh never rolls back a partition
+    already recorded in history_partitions. They are created on startup and ahead of time (the next month), so that
+    the first refresh of a month never waits for DDL.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    start = month_start(time)
+    missing = []
+    for _ in range(2):
+        end = month_start(start + timedelta(days=32))
+        if start not in history_partitions:
+            missing.append((start, end))
+        start = end
+    if not missing:
+        return
+    async with engine.begin() as connection:
+        for start, end in missing:
+            await connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS rate_history_{start:%Y_%m} PARTITION OF rate_history "
+                f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+            ))
+    history_partitions.update(start for start, _ in missing)
+
+
+async def init_history_partitions() -> None:
+    """Creates the rate_history partitions of the current and of the next month, if they don't exist."""
+    await ensure_history_partitions(get_engine(), utc_now())
+
+
+async def append_rate_history(session: AsyncSession, rates: Mapping[str, float], time: datetime) -> None:
+    """Appends a rate_history tick for every currency in rates, without committing.
+
+    Placeholder rates (0, for currencies that weren't refreshed yet) get no tick.
 
+    Arguments:
+        session (AsyncSession): db session.
+        rates (Mapping[str, float]): currency code -> rate_usd.
+        time (datetime): time of the ticks (naive UTC).
+    """
+    ticks = [{"code": code, "time": time, "rate_usd": rate} for code, rate in rates.items() if rate]
+    if not ticks:
+        return
+    await ensure_history_partitions(session.bind, time)
+    for start in range(0, len(ticks), BULK_CHUNK_SIZE):
+        await session.execute(insert(RateHistory), ticks[start:start + BULK_CHUNK_SIZE])
 
-def get_usd_rate(session: Session, code: str) -> float:
-    """Returns usd rate of given currency."""
-    return session.query(Currency).filter(Currency.code == code).first().rate_usd
 
+# rate history interval units, in seconds.
+HISTORY_INTERVAL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+# largest number of buckets a single rate history request may span.
+MAX_HISTORY_BUCKETS = 10_000
 
-def check_currency_exists_db(session: Session, code: str) -> bool:
+
+def interval_seconds(interval: str) -> int:
+    """Returns the length, in seconds, of an interval such as "30s", "5m", "1h" or "1d"."""
+    return int(interval[:-1]) * HISTORY_INTERVAL_UNITS[interval[-1]]
+
+
+def rate_history_query(dialect_name: str, code: str, start: datetime, end: datetime, seconds: int) -> Select:
+    """Returns the query of the OHLC buckets of a currency in [start, end).
+
+    Ticks are grouped by floor(epoch / seconds) in the database, using the (code, time) primary key (and, on
+    PostgreSQL, partition pruning); open and close are then looked up by primary key from the first and last tick time
+    of each bucket. Only buckets with ticks are returned.
+
+    Arguments:
+        dialect_name (str): database dialect ("postgresql" or "sqlite").
+        code (str): currency code.
+        start (datetime): first instant (naive UTC, inclusive).
+        end (datetime): last instant (naive UTC, exclusive).
+        seconds (int): bucket length.
+    """
+    if dialect_name == "postgresql":
+        epoch = cast(func.floor(func.extract("epoch", RateHistory.time)), BigInteger)
+    else:
+        epoch = cast(func.strftime("%s", RateHistory.time), Integer)
+    bucket = (epoch // literal_column(str(int(seconds)), Integer)).label("bucket")
+
+    buckets = (
+        select(
+            bucket,
+            func.min(RateHistory.time).label("first_time"),
+            func.max(RateHistory.time).label("last_time"),
+            func.max(RateHistory.rate_usd).label("high"),
+            func.min(RateHistory.rate_usd).label("low"),
+            func.count().label("ticks"),
+        )
+        .where(RateHistory.code == code, RateHistory.time >= start, RateHistory.time < end)
+        .group_by(literal_column("bucket"))
+        .subquery()
+    )
+    opening = aliased(RateHistory)
+    closing = aliased(RateHistory)
+    # the time range is repeated on both lookups so that only the partitions of the range are probed.
+    return (
+        select(
+            buckets.c.bucket,
+            opening.rate_usd.label("open"),
+            buckets.c.high,
+            buckets.c.low,
+            closing.rate_usd.label("close"),
+            buckets.c.ticks,
+        )
+        .select_from(buckets)
+        .join(opening, and_(
+            opening.code == code, opening.time == buckets.c.first_time, opening.time >= start, opening.time < end
+        ))
+        .join(closing, and_(
+            closing.code == code, closing.time == buckets.c.last_time, closing.time >= start, closing.time < end
+        ))
+        .order_by(buckets.c.bucket)
+    )
+
+
+async def get_rate_history(session: AsyncSession, code: str, start: datetime, end: datetime, seconds: int) -> list:
+    """Returns the OHLC buckets (time, open, high, low, close and ticks) of a currency in [start, end)."""
+    rows = (await session.execute(rate_history_query(session.bind.dialect.name, code, start, end, seconds))).all()
+    return [
+        {
+            "time": datetime.fromtimestamp(row.bucket * seconds, pytz.utc),
+            "open": row.open,
+            "high": row.high,
+            "low": row.low,
+            "close": row.close,
+            "ticks": row.ticks,
+        }
+        for row in rows
+    ]
+
+
+async def get_real_currencies(session: AsyncSession) -> list[Currency]:
+    """Returns all real currencies."""
+    result = await session.scalars(select(Currency).where(Currency.type == CurrencyType.REAL))
+    return list(result.all())
+
+
+async def refresh_rates() -> None:
+    """Updates conversion for real currencies in a session of its own (used by the background refresher)."""
+    async with async_session() as session:
+        await update_conversion(session=session)
+        snapshot = await get_rate_snapshot(session)
+    snapshot.precompute()
+    await rate_snapshot_cache.publish(snapshot)
+
+
+def rate_snapshot_query(codes: Optional[Iterable[str]] = None) -> Select:
+    """Returns the query of the code, rate_usd, type and update_time of the given currencies (all of them if codes is
+    None), ordered by code (the unique code index serves both the lookup and the order)."""
+    query = select(Currency.code, Currency.rate_usd, Currency.type, Currency.update_time).order_by(Currency.code)
+    if codes is not None:
+        query = query.where(Currency.code.in_(set(codes)))
+    return query
+
+
+async def get_rate_snapshot(session: AsyncSession, codes: Optional[Iterable[str]] = None) -> RateSnapshot:
+    """Returns a RateSnapshot with the usd rates of the given currencies (all of them if codes is None), read in a
+    single query. Snapshots of all currencies also carry the serialized available-currencies listing."""
+    rows = (await session.execute(rate_snapshot_query(codes))).all()
+    update_times = [row.update_time for row in rows]
+    update_time = max(update_times) if update_times else utc_now()
+    listing = None
+    if codes is None:
+        listing = PreparedBody.from_object(
+            {"currencies": [{"code": row.code, "rate_usd": row.rate_usd, "type": row.type} for row in rows]}
+        )
+    return RateSnapshot(
+        rates={row.code: row.rate_usd for row in rows},
+        update_time=update_time.replace(tzinfo=pytz.utc),
+        listing=listing,
+    )
+
+
+# currencies per rate history "as of" statement (3 bind parameters each).
+AS_OF_CHUNK_SIZE = 1_000
+
+
+def latest_tick_query(code: str, as_of: datetime) -> Select:
+    """Returns the query of the latest rate history tick (code, rate_usd, time) of a currency at or before as_of.
+
+    It is a backward range scan of the (code, time) primary key stopping at the first row.
+    """
+    return select(
+        select(RateHistory.code, RateHistory.rate_usd, RateHistory.time)
+        .where(RateHistory.code == code, RateHistory.time <= as_of)
+        .order_by(RateHistory.time.desc())
+        .limit(1)
+        .subquery()
+    )
+
+
+async def get_rate_snapshot_as_of(session: AsyncSession, codes: Iterable[str], as_of: datetime) -> RateSnapshot:
+    """Returns a RateSnapshot with the usd rates of the given currencies in effect at as_of (naive UTC).
+
+    The latest tick of every currency is looked up in a single statement (UNION ALL of one indexed lookup per
+    currency). Currencies without a tick at or before as_of are left out, except USD (the backing currency), whose rate
+    is always 1.
+    """
+    codes = sorted(set(codes))
+    rows = []
+    for start in range(0, len(codes), AS_OF_CHUNK_SIZE):
+        queries = [latest_tick_query(code, as_of) for code in codes[start:start + AS_OF_CHUNK_SIZE]]
+        rows += (await session.execute(union_all(*queries) if len(queries) > 1 else queries[0])).all()
+    rates = {row.code: row.rate_usd for row in rows}
+    if "USD" in codes:
+        rates.setdefault("USD", 1.0)
+    update_time = max((row.time for row in rows), default=as_of)
+    return RateSnapshot(rates=rates, update_time=update_time.replace(tzinfo=pytz.utc))
+
+
+async def load_rate_snapshot() -> RateSnapshot:
+    """Loads a RateSnapshot of every tracked currency in a session of its own."""
+    async with async_session() as session:
+        return await get_rate_snapshot(session)
+
+
+async def add_currency(session: AsyncSession, currency: Currency) -> Currency:
+    """Adds a currency to the database (and its first rate to the rate history) and returns it refreshed."""
+    session.add(currency)
+    await append_rate_history(session, {currency.code: currency.rate_usd}, currency.update_time)
+    await session.commit()
+    await session.refresh(currency)
+    return currency
+
+
+async def check_currency_exists_db(session: AsyncSession, code: str) -> bool:
     """Check if currency already exists in database."""
-    result = session.query(Currency).filter(Currency.code == code).first()
+    result = (await session.scalars(select(Currency).where(Currency.code == code))).first()
     if result:
         return True
     return False
 
+
+# in-process snapshot of every currency rate (published by refresh_rates, so derived data is built once per refresh;
+# its ttl and shared cache are set on startup).
+rate_snapshot_cache = RateSnapshotCache(loader=load_rate_snapshot, key="v2:rate_snapshot")
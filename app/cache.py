@@ -0,0 +1,295 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+from urllib.parse import unquote, urlparse
+
+from app.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+
+    """Interface of the byte caches shared by the v1 and v2 service layers."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Returns the value stored under key (None if it is missing or expired)."""
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Stores value under key for ttl seconds."""
+        pass
+
+    @abstractmethod
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Stores value under key for ttl seconds unless key already holds a value.
+
+        Returns:
+            bool: True if value was stored (False if key was already taken).
+        """
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Removes key (no-op if it is missing)."""
+        pass
+
+    async def close(self) -> None:
+        """Releases the resources (connections) held by the cache."""
+        pass
+
+
+class LocalCache(CacheBackend):
+
+    """Bounded in-process LRU cache whose entries expire after their own TTL.
+
+    Attributes:
+        max_entries (int): number of entries kept; storing one more evicts the least recently used.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+
+class RedisError(Exception):
+
+    """Error reply sent by a Redis-protocol server."""
+
+
+RespValue = Union[None, int, bytes, str, List["RespValue"]]
+
+
+class RedisCache(CacheBackend):
+
+    """Cache stored on a server speaking the Redis protocol (RESP2), shared by every worker and node.
+
+    Connections are opened on first use and kept in a small pool; a connection that fails or times out is dropped.
+
+    Attributes:
+        url (str): redis://[:password@]host[:port][/db] url of the server.
+        timeout (float): seconds allowed for connecting and for each command.
+        max_connections (int): maximum number of connections open at once.
+    """
+
+    def __init__(self, url: str, timeout: float = 0.5, max_connections: int = 10) -> None:
+        parsed = urlparse(url)
+        self.url = url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port or 6379
+        self._password = unquote(parsed.password) if parsed.password else None
+        self._db = int(parsed.path.lstrip("/") or 0)
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    @staticmethod
+    def encode_command(*args: Union[str, bytes]) -> bytes:
+        """Returns a command encoded as a RESP array of bulk strings."""
+
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg.encode() if isinstance(arg, str) else arg
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    @classmethod
+    async def read_reply(cls, reader: asyncio.StreamReader) -> RespValue:
+        """Reads one RESP reply (raising RedisError for error replies)."""
+
+        line = (await reader.readuntil(b"\r\n"))[:-2]
+        kind, payload = line[:1], line[1:]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return (await reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await cls.read_reply(reader) for _ in range(length)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self._host, self._port)
+        try:
+            if self._password is not None:
+                await self._send(reader, writer, "AUTH", self._password)
+            if self._db:
+                await self._send(reader, writer, "SELECT", str(self._db))
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def _send(
+            self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, *args: Union[str, bytes]
+    ) -> RespValue:
+        writer.write(self.encode_command(*args))
+        await writer.drain()
+        return await self.read_reply(reader)
+
+    async def execute(self, *args: Union[str, bytes]) -> RespValue:
+        """Sends a command and returns its reply."""
+
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(self._connect(), self.timeout)
+                reply = await asyncio.wait_for(self._send(*connection, *args), self.timeout)
+            except RedisError:
+                if connection is not None:
+                    self._idle.append(connection)
+                raise
+            except BaseException:
+                if connection is not None:
+                    connection[1].close()
+                raise
+            self._idle.append(connection)
+            return reply
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.execute("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.execute("SET", key, value, "PX", str(max(int(ttl * 1000), 1)))
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return await self.execute("SET", key, value, "PX", str(max(int(ttl * 1000), 1)), "NX") is not None
+
+    async def delete(self, key: str) -> None:
+        await self.execute("DEL", key)
+
+    async def close(self) -> None:
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+class TieredCache(CacheBackend):
+
+    """In-process tier in front of a shared (network) tier.
+
+    Reads hit the local tier first and fill it from the shared one; writes and deletes go to both, while add() only
+    involves the shared tier (its keys are taken by a single worker). Errors of the shared tier are logged and the cache
+    keeps working with the local tier alone.
+
+    Attributes:
+        local (CacheBackend): in-process tier.
+        shared (CacheBackend): tier shared by every worker.
+        local_ttl (float): maximum seconds a value read from the shared tier is kept in the local tier.
+    """
+
+    def __init__(self, local: CacheBackend, shared: CacheBackend, local_ttl: float = 5) -> None:
+        self.local = local
+        self.shared = shared
+        self.local_ttl = local_ttl
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = await self.local.get(key)
+        if value is not None:
+            return value
+        try:
+            value = await self.shared.get(key)
+        except Exception:
+            logger.warning("Shared cache read of %r failed", key, exc_info=True)
+            return None
+        if value is not None:
+            await self.local.set(key, value, self.local_ttl)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.local.set(key, value, min(ttl, self.local_ttl))
+        try:
+            await self.shared.set(key, value, ttl)
+        except Exception:
+            logger.warning("Shared cache write of %r failed", key, exc_info=True)
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        try:
+            return await self.shared.add(key, value, ttl)
+        except Exception:
+            logger.warning("Shared cache add of %r failed", key, exc_info=True)
+            return await self.local.add(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.local.delete(key)
+        try:
+            await self.shared.delete(key)
+        except Exception:
+            logger.warning("Shared cache delete of %r failed", key, exc_info=True)
+
+    async def close(self) -> None:
+        await self.local.close()
+        await self.shared.close()
+
+
+# process-wide cache, created on first use.
+_cache: Optional[CacheBackend] = None
+
+
+def get_cache() -> CacheBackend:
+    """Returns the process-wide cache: a LocalCache, in front of a RedisCache if CACHE_REDIS_URL is set."""
+    global _cache
+    if _cache is None:
+        settings = Settings()
+        local = LocalCache(max_entries=settings.CACHE_LOCAL_MAX_ENTRIES)
+        if settings.CACHE_REDIS_URL:
+            shared = RedisCache(
+                settings.CACHE_REDIS_URL,
+                timeout=settings.CACHE_REDIS_TIMEOUT,
+                max_connections=settings.CACHE_REDIS_MAX_CONNECTIONS,
+            )
+            _cache = TieredCache(local, shared, local_ttl=settings.CACHE_LOCAL_TTL)
+        else:
+            _cache = local
+    return _cache
+
+
+async def close_cache() -> None:
+    """Closes the process-wide cache (a new one is created on the next use)."""
+    global _cache
+    if _cache is not None:
+        await _cache.close()
+        _cache = None
@@ -0,0 +1,111 @@
+import io
+import json
+from datetime import datetime
+from itertools import repeat
+from typing import Iterable, Mapping, Sequence, Tuple
+
+import numpy as np
+
+
+class RateVector:
+
+    """Conversion rates (relative to USD) stored in a contiguous float64 array, with a code -> index map.
+
+    Converting n amounts is a single gather-and-divide over index arrays, so it can be used both by the HTTP layer
+    (batch requests) and by offline jobs working on millions of items.
+
+    Attributes:
+        codes (Tuple[str, ...]): currency codes, in array order.
+        index (dict): currency code -> position in the rates array.
+        rates (np.ndarray): rate_usd of every currency.
+    """
+
+    def __init__(self, codes: Sequence[str], rates: Sequence[float]) -> None:
+        self.codes = tuple(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.rates = np.ascontiguousarray(rates, dtype=np.float64)
+
+    @classmethod
+    def from_mapping(cls, rates: Mapping[str, float]) -> "RateVector":
+        """Builds a RateVector from a currency code -> rate_usd mapping."""
+
+        return cls(list(rates.keys()), list(rates.values()))
+
+    def cross_rates(self) -> np.ndarray:
+        """Returns the cross-rate matrix: cross_rates()[i, j] is the amount of codes[j] worth one codes[i].
+
+        Entries involving a currency without a rate (rate_usd == 0) are inf or nan.
+        """
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.divide.outer(self.rates, self.rates)
+
+    def lookup(self, codes: Iterable[str]) -> np.ndarray:
+        """Returns the index of every code (-1 for codes that are not in the vector)."""
+
+        return np.fromiter(map(self.index.get, codes, repeat(-1)), dtype=np.intp)
+
+    def convert(self, source_indices: np.ndarray, target_indices: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+        """Returns amounts * rates[source] / rates[target] for every item.
+
+        Indices must be valid (>= 0). A target without a rate (rate_usd == 0) yields inf or nan instead of raising.
+        """
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.asarray(amounts, dtype=np.float64) * self.rates[source_indices] / self.rates[target_indices]
+
+    def convert_codes(
+            self, source_codes: Sequence[str], target_codes: Sequence[str], amounts: Sequence[float]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Converts items given by currency codes.
+
+        Items whose source and target are equal keep their amount (even if the code is unknown). Items with an unknown
+        code get nan as result.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: results, source indices and target indices.
+        """
+
+        source_indices = self.lookup(source_codes)
+        target_indices = self.lookup(target_codes)
+        amounts = np.asarray(amounts, dtype=np.float64)
+
+        valid = (source_indices >= 0) & (target_indices >= 0)
+        if valid.all():
+            results = self.convert(source_indices, target_indices, amounts)
+        else:
+            results = np.full(len(amounts), np.nan)
+            results[valid] = self.convert(source_indices[valid], target_indices[valid], amounts[valid])
+            for i in np.flatnonzero(~valid).tolist():
+                if source_codes[i] == target_codes[i]:
+                    results[i] = amounts[i]
+        same = valid & (source_indices == target_indices)
+        results[same] = amounts[same]
+        return results, source_indices, target_indices
+
+
+class CrossRateMatrix:
+
+    """Cross-rate table of a RateVector, serialized once so that serving it is just a memory copy.
+
+    Attributes:
+        codes (Tuple[str, ...]): currency codes, in row/column order.
+        json (bytes): {"update_time", "currencies", "rates"} JSON document, rates[i][j] being the amount of
+                currencies[j] worth one currencies[i] (null when a currency has no rate yet).
+        npy (bytes): the same matrix as a float64 .npy file (nan/inf when a currency has no rate yet).
+    """
+
+    def __init__(self, vector: RateVector, update_time: datetime) -> None:
+        matrix = vector.cross_rates()
+        self.codes = vector.codes
+        self.json = json.dumps(
+            {
+                "update_time": update_time.isoformat(),
+                "currencies": list(self.codes),
+                "rates": np.where(np.isfinite(matrix), matrix, None).tolist(),
+            },
+            separators=(",", ":"),
+        ).encode()
+        buffer = io.BytesIO()
+        np.save(buffer, matrix, allow_pickle=False)
+        self.npy = buffer.getvalue()
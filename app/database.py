@@ -1,93 +1,260 @@
-from typing import Type, List
+import asyncio
+from datetime import datetime
+from types import MappingProxyType
+from typing import Iterable, Mapping, Type, Optional, Union
 
-from pymongo import MongoClient
-from pymongo.collection import Collection
+import pytz
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 
 from app.api.v1.models import (
-    CurrencyApiInterface,
-    EconomiaAwesomeAPI,
     CurrencyItem,
     CurrencyType,
     CurrencyList,
     DatabaseCurrencyList,
+    RateTable,
 )
+from app.external_api import AsyncCurrencyApiInterface
+from app.http_cache import PreparedBody
+from app.rate_providers import get_rate_provider
+from app.settings import Settings
+from app.snapshot import RateSnapshot, RateSnapshotCache
 
 
-def mongodb_connect(
-        database: str = "database",
-        collection: str = "collection",
-        host: str = "database",
-        port: int = 27017,
-) -> Collection:
-    """Returns a pymongo collection connected to MongoDB.
+# _id of the single currency_rate document holding the tracked currencies and their current rates.
+SNAPSHOT_ID = "current"
 
-    Arguments:
-        database (str): database name.
-        collection (str): collection name.
-        host (str): Host address of the MongoDB server.
-        port (int): Port number.
+# collection names (tracked_currencies is only read to migrate databases created with the previous layout).
+CURRENCY_RATE_COLLECTION = "currency_rate"
+TRACKED_CURRENCIES_COLLECTION = "tracked_currencies"
+RATE_HISTORY_COLLECTION = "rate_history"
 
-    Returns:
-        Collection (pymongo.collection.Collection): MongoDB collection.
-    """
+# process-wide motor client, created on first use and shared by every collection (and its connection pool).
+_mongo_client: Optional[AsyncIOMotorClient] = None
+_mongo_database_name: Optional[str] = None
+
+
+def write_concern_w(w: str):
+    """Returns the "w" write concern option from its setting ("majority", a tag set name or a number of nodes)."""
+    return int(w) if w.isdigit() else w
+
+
+def get_mongo_client() -> AsyncIOMotorClient:
+    """Returns the process-wide motor client, configured from Settings (it connects lazily, on the first operation)."""
+    global _mongo_client, _mongo_database_name
+    if _mongo_client is None:
+        settings = Settings()
+        _mongo_client = AsyncIOMotorClient(
+            host=settings.MONGO_HOST,
+            port=settings.MONGO_PORT,
+            maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+            connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            socketTimeoutMS=settings.MONGO_SOCKET_TIMEOUT_MS or None,
+            readPreference=settings.MONGO_READ_PREFERENCE,
+            w=write_concern_w(settings.MONGO_WRITE_CONCERN),
+        )
+        _mongo_database_name = settings.MONGO_DATABASE
+    return _mongo_client
 
-    client = MongoClient(host=host, port=port)
 
-    database = client[f"{database}"]
+def close_mongo_client() -> None:
+    """Closes the process-wide motor client (a new one is created on the next use)."""
+    global _mongo_client
+    if _mongo_client is not None:
+        _mongo_client.close()
+        _mongo_client = None
 
-    collection = database[f"{collection}"]
 
-    return collection
+def get_database() -> AsyncIOMotorDatabase:
+    """Returns the application database of the process-wide motor client."""
+    return get_mongo_client()[_mongo_database_name]
 
 
-def get_last_updated_document(collection: Collection) -> dict:
+async def get_mongo_database():
+    """Yields the application database to perform MongoDB operations."""
+    yield get_database()
+
+
+async def get_last_updated_document(collection: AsyncIOMotorCollection) -> dict:
     """Returns the last document added to a given collection."""
-    return collection.find_one({}, sort=[("_id", -1)])
+    return await collection.find_one({}, sort=[("_id", -1)])
+
 
+async def get_snapshot_document(usd_rate_collection: AsyncIOMotorCollection) -> Optional[dict]:
+    """Returns the currency snapshot document (tracked currencies and their current rates)."""
+    return await usd_rate_collection.find_one({"_id": SNAPSHOT_ID})
 
-def update_conversion_collection(
-        usd_rate_collection: Collection,
-        tracked_collection: Collection,
-        api: Type[CurrencyApiInterface] = EconomiaAwesomeAPI,
+
+async def update_conversion_collection(
+        usd_rate_collection: AsyncIOMotorCollection,
+        api: Union[Type[AsyncCurrencyApiInterface], AsyncCurrencyApiInterface, None] = None,
+        snapshot_cache: Optional[RateSnapshotCache] = None,
+        history_collection: Optional[AsyncIOMotorCollection] = None,
 ) -> None:
     """Updates the conversions (relative to USD value) using the external API.
 
-    Takes all registered currencies on tracked_collection and creates a new document in
-    usd_rate_coll with updated currency conversion values (in relation to USD value) based on the provided API instance.
+    Takes the real currencies of the snapshot document and sets their rates (fetched from the provided API) with a
+    single atomic update of that document.
 
     Arguments:
-        usd_rate_collection (Collection): pymongo collection of the currency rates.
-        tracked_collection (Collection): pymongo collection of the currency list (will be used to fetch all
-                registered currencies).
-        api (CurrencyApiInterface): API class (must be a valid CurrencyAPI subclass) to fetch external data.
+        usd_rate_collection (AsyncIOMotorCollection): motor collection of the currency snapshot document.
+        api (AsyncCurrencyApiInterface): API class or instance (must be a valid AsyncCurrencyApiInterface) to fetch
+                external data (the composite rate source by default).
+        snapshot_cache (RateSnapshotCache): if provided, the updated document is published to it as the current
+                snapshot.
+        history_collection (AsyncIOMotorCollection): if provided, a tick with the rate of every currency of the updated
+                document is appended to it.
     """
-    updated_currencies = get_last_updated_document(tracked_collection)
-    del updated_currencies["_id"]
-    db_currency_list_obj = DatabaseCurrencyList(**updated_currencies)
+    api = api or get_rate_provider()
+    document = await get_snapshot_document(usd_rate_collection)
+    url = api.url_builder(list(RateTable.from_document(document).real_codes))
+    rates_dic = await api.get_conversion(url)
 
-    usd_rate_collection.insert_one(db_currency_list_obj.model_dump())
-    real_currencies_list = db_currency_list_obj.get_currencies_list()
+    document = await set_currency_rates(usd_rate_collection, {code: float(rate) for code, rate in rates_dic.items()})
+    if history_collection is not None:
+        await append_rate_history(history_collection, document)
+    if snapshot_cache is not None:
+        await snapshot_cache.publish(snapshot_from_document(document))
 
-    url = api.url_builder(real_currencies_list)
 
-    api.get_conversion(url, usd_rate_collection, tracked_collection)
+async def set_currency_rates(usd_rate_collection: AsyncIOMotorCollection, rates: Mapping[str, float]) -> dict:
+    """Sets the rate_usd of every tracked currency in rates, and update_time, in a single atomic update.
 
-    last_two_documents = usd_rate_collection.find().sort([("_id", -1)]).limit(2)
+    Each currency is matched by an array filter, so currencies added or removed concurrently are left alone (and codes
+    that are no longer tracked are ignored).
 
-    last_two_documents_list = list(last_two_documents)
-    penultimate_document = last_two_documents_list[1].get("_id")
-    usd_rate_collection.delete_one({"_id": penultimate_document})
+    Returns:
+        dict: the updated snapshot document.
+    """
+    fields = {"update_time": datetime.now().astimezone(pytz.utc)}
+    array_filters = []
+    for i, (code, rate) in enumerate(rates.items()):
+        fields[f"currencies.list_of_currencies.$[c{i}].rate_usd"] = rate
+        array_filters.append({f"c{i}.code": code})
+    return await usd_rate_collection.find_one_and_update(
+        {"_id": SNAPSHOT_ID},
+        {"$set": fields},
+        array_filters=array_filters or None,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def push_currency(usd_rate_collection: AsyncIOMotorCollection, currency: dict) -> Optional[dict]:
+    """Adds a currency (code, currency_type and rate_usd) to the snapshot document, unless its code is already there.
+
+    Returns:
+        dict: the updated snapshot document (None if the currency was already tracked).
+    """
+    return await usd_rate_collection.find_one_and_update(
+        {"_id": SNAPSHOT_ID, "currencies.list_of_currencies.code": {"$ne": currency["code"]}},
+        {"$push": {"currencies.list_of_currencies": currency}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def pull_currency(usd_rate_collection: AsyncIOMotorCollection, code: str) -> Optional[dict]:
+    """Removes a currency from the snapshot document.
 
+    Returns:
+        dict: the updated snapshot document (None if the currency was not tracked).
+    """
+    return await usd_rate_collection.find_one_and_update(
+        {"_id": SNAPSHOT_ID, "currencies.list_of_currencies.code": code},
+        {"$pull": {"currencies.list_of_currencies": {"code": code}}},
+        return_document=ReturnDocument.AFTER,
+    )
 
-def check_empty_collection(collection: Collection) -> bool:
-    """Checks if a given collection is empty (document count == 0)."""
-    if collection.count_documents({}) == 0:
-        return True
-    return False
 
+async def set_custom_currency_rate(
+        usd_rate_collection: AsyncIOMotorCollection, code: str, rate_usd: float
+) -> Optional[dict]:
+    """Sets the rate_usd of a custom currency of the snapshot document.
 
-def populate_tracked_currencies(tracked_collection: Collection) -> None:
-    """Populates de tracked currencies database based on the default list: BRL, EUR, BTC, ETH, USD."""
+    Returns:
+        dict: the updated snapshot document (None if no custom currency with this code is tracked).
+    """
+    return await usd_rate_collection.find_one_and_update(
+        {
+            "_id": SNAPSHOT_ID,
+            "currencies.list_of_currencies": {
+                "$elemMatch": {"code": code, "currency_type": CurrencyType.CUSTOM.value}
+            },
+        },
+        {"$set": {"currencies.list_of_currencies.$.rate_usd": rate_usd}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def append_rate_history(
+        history_collection: AsyncIOMotorCollection, document: dict, codes: Optional[Iterable[str]] = None
+) -> None:
+    """Appends a tick (code, time, rate_usd) for every currency (or only the given codes) of a snapshot document to the
+    rate history. Placeholder rates (0, for currencies that weren't refreshed yet) get no tick."""
+    codes = None if codes is None else set(codes)
+    time = document["update_time"] if codes is None else datetime.now().astimezone(pytz.utc)
+    ticks = [
+        {"code": currency["code"], "time": time, "rate_usd": float(currency["rate_usd"])}
+        for currency in document["currencies"]["list_of_currencies"]
+        if codes is None or currency["code"] in codes
+    ]
+    ticks = [tick for tick in ticks if tick["rate_usd"]]
+    if ticks:
+        await history_collection.insert_many(ticks)
+
+
+async def create_rate_history_collection(history_collection: AsyncIOMotorCollection) -> None:
+    """Creates the rate history as a MongoDB time-series collection (ticks bucketed by code), if it doesn't exist."""
+    database = history_collection.database
+    if history_collection.name not in await database.list_collection_names():
+        await database.create_collection(
+            history_collection.name,
+            timeseries={"timeField": "time", "metaField": "code", "granularity": "seconds"},
+        )
+    await history_collection.create_index([("code", 1), ("time", -1)])
+
+
+def snapshot_from_document(document: dict) -> RateSnapshot:
+    """Builds a RateSnapshot from the RateTable of a currency_rate document (skipping pydantic validation), along with
+    the serialized available-currencies listing of the document."""
+    table = RateTable.from_document(document)
+    listing = PreparedBody.from_object(
+        {"update_time": table.update_time, "currencies": {"list_of_currencies": table.currency_dicts()}}
+    )
+    return RateSnapshot(rates=MappingProxyType(table.rate_map), update_time=table.update_time, listing=listing)
+
+
+async def load_rate_snapshot() -> RateSnapshot:
+    """Loads the current RateSnapshot from the snapshot document."""
+    return snapshot_from_document(await get_snapshot_document(get_database()[CURRENCY_RATE_COLLECTION]))
+
+
+async def load_rate_snapshot_as_of(
+        history_collection: AsyncIOMotorCollection, codes: Iterable[str], as_of: datetime
+) -> RateSnapshot:
+    """Builds a RateSnapshot with the rates of the given currencies in effect at as_of.
+
+    Every currency is an indexed lookup of its latest rate history tick <= as_of (run concurrently); currencies without
+    such a tick are left out of the snapshot, except USD (the backing currency), whose rate is always 1.
+    """
+    codes = set(codes)
+    ticks = await asyncio.gather(*(
+        history_collection.find_one({"code": code, "time": {"$lte": as_of}}, sort=[("time", -1)])
+        for code in codes
+    ))
+    ticks = [tick for tick in ticks if tick is not None]
+    rates = {tick["code"]: tick["rate_usd"] for tick in ticks}
+    if "USD" in codes:
+        rates.setdefault("USD", 1.0)
+    update_time = max((tick["time"] for tick in ticks), default=as_of)
+    if update_time.tzinfo is None:
+        update_time = update_time.replace(tzinfo=pytz.utc)
+    return RateSnapshot(rates=rates, update_time=update_time)
+
+
+def default_currencies_document() -> dict:
+    """Returns a snapshot document with the default currencies: BRL, EUR, BTC, ETH, USD."""
     default_currencies = CurrencyList(
         [
             CurrencyItem(code="BRL", rate_usd=0, currency_type=CurrencyType.REAL.value),
@@ -99,26 +266,36 @@ def populate_tracked_currencies(tracked_collection: Collection) -> None:
             ),
         ]
     )
-    database_currency_list_obj = DatabaseCurrencyList(currencies=default_currencies)
-    tracked_collection.insert_one(database_currency_list_obj.model_dump())
+    return DatabaseCurrencyList(currencies=default_currencies).model_dump()
 
 
-def init_databases() -> List[Collection]:
-    """Initialize Rate and Tracked Currency databases with default currencies."""
-    rate_collection = mongodb_connect(database="database", collection="currency_rate")
-    tracked_collection = mongodb_connect(
-        database="database", collection="tracked_currencies"
-    )
-    if check_empty_collection(tracked_collection):
-        populate_tracked_currencies(tracked_collection)
-    return [rate_collection, tracked_collection]
+async def create_snapshot_document(
+        usd_rate_collection: AsyncIOMotorCollection, legacy_collection: AsyncIOMotorCollection
+) -> None:
+    """Creates the snapshot document, if it doesn't exist yet, and removes the documents of the previous layout.
+
+    The snapshot document starts from the last currency_rate document of the previous layout (one document per refresh)
+    or, failing that, the last tracked_currencies document or the default currencies.
+    """
+    if await get_snapshot_document(usd_rate_collection) is None:
+        legacy_document = (
+            await usd_rate_collection.find_one({"_id": {"$ne": SNAPSHOT_ID}}, sort=[("_id", -1)])
+            or await get_last_updated_document(legacy_collection)
+        )
+        if legacy_document is None:
+            document = default_currencies_document()
+        else:
+            document = {"update_time": legacy_document["update_time"], "currencies": legacy_document["currencies"]}
+        await usd_rate_collection.update_one({"_id": SNAPSHOT_ID}, {"$setOnInsert": document}, upsert=True)
+    await usd_rate_collection.delete_many({"_id": {"$ne": SNAPSHOT_ID}})
+
 
+async def init_databases() -> None:
+    """Initialize the currency snapshot document (with default currencies, if empty) and the rate history collection."""
+    database = get_database()
+    await create_snapshot_document(database[CURRENCY_RATE_COLLECTION], database[TRACKED_CURRENCIES_COLLECTION])
+    await create_rate_history_collection(database[RATE_HISTORY_COLLECTION])
 
-# instantiating both collections.
-[currency_rate_collection, tracked_currencies_collection] = init_databases()
 
-# updating conversion rates.
-update_conversion_collection(
-    usd_rate_collection=currency_rate_collection,
-    tracked_collection=tracked_currencies_collection,
-    api=EconomiaAwesomeAPI)
+# in-process snapshot of the latest conversion rates (its ttl and shared cache are set on startup).
+rate_snapshot_cache = RateSnapshotCache(loader=load_rate_snapshot, key="v1:rate_snapshot")
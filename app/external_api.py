@@ -0,0 +1,212 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+import orjson
+
+from app.settings import Settings
+from app.singleflight import async_single_flight
+
+logger = logging.getLogger(__name__)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def start_http_client() -> httpx.AsyncClient:
+    """Creates the process-wide pooled httpx.AsyncClient (no-op if it already exists)."""
+    global _http_client
+    if _http_client is None:
+        settings = Settings()
+        _http_client = httpx.AsyncClient(
+            http2=settings.HTTP_CLIENT_HTTP2,
+            timeout=httpx.Timeout(settings.HTTP_CLIENT_TIMEOUT, connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Closes the process-wide httpx.AsyncClient and its pooled connections."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the process-wide httpx.AsyncClient, creating it on first use."""
+    return start_http_client()
+
+
+def parse_rates(content: bytes) -> Dict[str, float]:
+    """Returns the rates (code -> bid, as a float) of a raw AwesomeAPI "last" response body.
+
+    The body is decoded with orjson and code/bid are taken in a single pass, skipping the str decoding of the body and
+    the intermediate dict of string bids.
+    """
+    return {value["code"]: float(value["bid"]) for value in orjson.loads(content).values()}
+
+
+class AsyncCurrencyApiInterface(ABC):
+
+    """Async interface to establish contract to implement external interfaces to fetch conversion rates."""
+    base_url: str
+
+    @classmethod
+    @abstractmethod
+    def url_builder(cls, currency_list: list) -> str:
+        """Returns in a single url all the conversion rates required (relative to USD)."""
+        pass
+
+    @classmethod
+    @abstractmethod
+    async def get_conversion(cls, url: str) -> Dict[str, float]:
+        """Returns updated conversions dictionary related to USD."""
+        pass
+
+    @classmethod
+    @abstractmethod
+    async def pair_exists(cls, source_currency: str, target_currency: str) -> bool:
+        """Checks if the external API knows the given currency pair."""
+        pass
+
+    @classmethod
+    async def get_rates(cls, currency_list: Sequence[str]) -> Dict[str, float]:
+        """Returns the conversions dictionary (related to USD) of the given currencies."""
+        return await cls.get_conversion(cls.url_builder(list(currency_list)))
+
+    @classmethod
+    def configure(cls, settings: Settings) -> None:
+        """Applies the provider-specific settings (called once, when the rate source is set up)."""
+        pass
+
+
+class AsyncEconomiaAwesomeAPI(AsyncCurrencyApiInterface):
+
+    """AwesomeAPI provider, fetching large currency sets in chunks.
+
+    Attributes:
+        max_url_length (int): maximum length of the url of a chunk.
+        max_codes_per_chunk (int): maximum number of currencies of a chunk.
+        max_parallel_chunks (int): maximum number of chunks fetched at once.
+        chunk_retries (int): number of times a failing chunk is retried.
+        chunk_retry_backoff (float): seconds waited before the first retry (doubled at every retry).
+    """
+    base_url: str = "https://economia.awesomeapi.com.br/json/last/"
+    max_url_length: int = 2000
+    max_codes_per_chunk: int = 50
+    max_parallel_chunks: int = 4
+    chunk_retries: int = 2
+    chunk_retry_backoff: float = 0.1
+
+    @classmethod
+    def configure(cls, settings: Settings) -> None:
+        """Reads the chunking settings (UPSTREAM_*)."""
+        cls.max_url_length = settings.UPSTREAM_MAX_URL_LENGTH
+        cls.max_codes_per_chunk = settings.UPSTREAM_CHUNK_MAX_CODES
+        cls.max_parallel_chunks = settings.UPSTREAM_MAX_PARALLEL_CHUNKS
+        cls.chunk_retries = settings.UPSTREAM_CHUNK_RETRIES
+        cls.chunk_retry_backoff = settings.UPSTREAM_CHUNK_RETRY_BACKOFF
+
+    @classmethod
+    def url_builder(cls, currency_list: list) -> str:
+        """Returns in a single url all the conversion rates required (relative to USD)."""
+
+        url = cls.base_url
+        for currency in currency_list:
+            if currency != "USD":
+                url += currency + "-USD,"
+        return url[:-1]
+
+    @classmethod
+    @async_single_flight(key=lambda cls, url: (cls, url))
+    async def get_conversion(cls, url: str) -> Dict[str, float]:
+        """Returns updated conversions dictionary related to USD.
+
+        Concurrent calls for the same url share a single request to the external API.
+        """
+        response = await get_http_client().get(url)
+        response.raise_for_status()
+        return parse_rates(response.content)
+
+    @classmethod
+    async def pair_exists(cls, source_currency: str, target_currency: str) -> bool:
+        """Checks if the external API knows the given currency pair (raises httpx.HTTPStatusError on server errors,
+        which don't tell whether the pair exists)."""
+        response = await get_http_client().get(f"{cls.base_url}{source_currency}-{target_currency}")
+        if response.is_server_error:
+            response.raise_for_status()
+        return response.status_code == 200
+
+    @classmethod
+    def url_chunks(cls, currency_list: Sequence[str], max_url_length: int, max_codes: int) -> List[str]:
+        """Splits the url of currency_list into urls of at most max_url_length characters and max_codes currencies."""
+
+        chunks, chunk = [], []
+        length = len(cls.base_url)
+        for currency in currency_list:
+            if currency == "USD":
+                continue
+            # every currency adds "<code>-USD" to the url, plus a comma after the first one.
+            added = len(currency) + 4 + bool(chunk)
+            if chunk and (len(chunk) >= max_codes or length + added > max_url_length):
+                chunks.append(chunk)
+                chunk, length, added = [], len(cls.base_url), added - 1
+            chunk.append(currency)
+            length += added
+        if chunk:
+            chunks.append(chunk)
+        return [cls.url_builder(chunk) for chunk in chunks]
+
+    @classmethod
+    async def _get_chunk(
+            cls, url: str, semaphore: asyncio.Semaphore, retries: int, backoff: float
+    ) -> Dict[str, float]:
+        for attempt in range(retries + 1):
+            try:
+                async with semaphore:
+                    return await cls.get_conversion(url)
+            except Exception:
+                if attempt == retries:
+                    raise
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+    @classmethod
+    async def get_rates(cls, currency_list: Sequence[str]) -> Dict[str, float]:
+        """Returns the conversions dictionary (related to USD) of the given currencies.
+
+        The currencies are fetched in chunks (bounded by max_url_length and max_codes_per_chunk) running concurrently,
+        at most max_parallel_chunks at a time. A failing chunk is retried on its own (up to chunk_retries times); the
+        rates of the chunks that succeeded are returned even if others failed.
+
+        Raises:
+            Exception: the error of the last chunk, if every chunk failed.
+        """
+        urls = cls.url_chunks(currency_list, cls.max_url_length, cls.max_codes_per_chunk)
+        if not urls:
+            return {}
+        semaphore = asyncio.Semaphore(cls.max_parallel_chunks)
+        results = await asyncio.gather(
+            *(
+                cls._get_chunk(url, semaphore, cls.chunk_retries, cls.chunk_retry_backoff)
+                for url in urls
+            ),
+            return_exceptions=True,
+        )
+        rates = {}
+        errors = []
+        for url, result in zip(urls, results):
+            if isinstance(result, BaseException):
+                errors.append(result)
+                logger.warning("Fetching %s failed", url, exc_info=result)
+            else:
+                rates.update(result)
+        if len(errors) == len(urls):
+            raise errors[-1]
+        return rates
@@ -0,0 +1,79 @@
+import hashlib
+from typing import Any, Mapping, Optional
+
+import pydantic_core
+from fastapi import Request, Response
+
+
+class PreparedBody:
+
+    """Response body serialized once (as JSON bytes), along with its strong ETag.
+
+    Attributes:
+        body (bytes): serialized response body.
+        etag (str): strong ETag of body (a quoted hash of its bytes).
+    """
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+    @classmethod
+    def from_object(cls, obj: Any) -> "PreparedBody":
+        """Serializes obj (dicts, lists, datetimes, enums...) the same way pydantic serializes response models."""
+
+        return cls(pydantic_core.to_json(obj))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Returns whether an If-None-Match header value matches etag ("*" matches any; weak validators are compared
+    by their opaque tag, as If-None-Match uses the weak comparison)."""
+
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def version_etag(*parts: Any) -> str:
+    """Returns a strong ETag identifying the given version parts (rates, update times...) of a response."""
+
+    return f'"{hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()}"'
+
+
+def cache_headers(etag: str, max_age: Optional[float]) -> dict:
+    """Returns the ETag and Cache-Control headers of a response that stays valid for max_age seconds (it must be
+    revalidated right away if max_age is None)."""
+
+    return {"ETag": etag, "Cache-Control": f"public, max-age={max(int(max_age or 0), 0)}"}
+
+
+def not_modified(request: Request, headers: Mapping[str, str]) -> Optional[Response]:
+    """Returns an empty 304 Not Modified response (carrying headers) if the request's If-None-Match matches the ETag
+    of headers, None otherwise."""
+
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=dict(headers))
+    return None
+
+
+def prepared_response(
+        request: Request,
+        prepared: PreparedBody,
+        media_type: str = "application/json",
+        headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    """Returns prepared as a raw Response carrying its ETag, or an empty 304 Not Modified if the request's
+    If-None-Match already matches it.
+
+    Arguments:
+        request (Request): incoming request.
+        prepared (PreparedBody): response body and ETag.
+        media_type (str): content type of the body.
+        headers (Mapping[str, str]): extra headers sent with both 200 and 304 responses.
+    """
+
+    response_headers = {"ETag": prepared.etag, **(headers or {})}
+    return not_modified(request, response_headers) or Response(
+        content=prepared.body, media_type=media_type, headers=response_headers
+    )
@@ -1,15 +1,94 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 
+from app import database
 from app.api.v1 import routes
+from app.api.v1.services import refresh_rates_service
 from app.api.v2 import routes as routes_v2
+from app.api.v2 import services as services_v2
+from app.cache import close_cache, get_cache
+from app.database import init_databases, close_mongo_client
+from app.external_api import start_http_client, close_http_client
+from app.pg_database import dispose_engine
+from app.rate_providers import ProvidersUnavailableError
+from app.refresher import rate_refresher
+from app.settings import Settings
+
+# True between a successful startup() and the following shutdown().
+_started = False
+
+
+async def startup() -> None:
+    """Configures the rate snapshot caches (TTL and shared cache) and the rate refresher from Settings, opens the shared
+    HTTP client, initializes the MongoDB collections and the PostgreSQL rate history partitions, refreshes rates (or
+    loads the snapshots of the worker holding the refresh lease) and starts the background rate refresher.
+
+    Importing the application doesn't perform any I/O: connections are only opened here (lazily, on first use). Calling
+    startup() again before shutdown() has no effect.
+    """
+    global _started
+    if _started:
+        return
+    settings = Settings()
+    rate_refresher.interval = settings.RATE_REFRESH_INTERVAL
+    rate_refresher.jitter = settings.RATE_REFRESH_JITTER
+    # with a shared cache, a single worker refreshes the rates per interval and the others load its snapshots.
+    rate_refresher.lease = get_cache() if settings.CACHE_REDIS_URL else None
+    for snapshot_cache in (database.rate_snapshot_cache, services_v2.rate_snapshot_cache):
+        snapshot_cache.ttl = settings.RATE_SNAPSHOT_TTL
+        snapshot_cache.shared = get_cache() if settings.CACHE_REDIS_URL else None
+
+    start_http_client()
+    await init_databases()
+    await services_v2.init_history_partitions()
+    rate_refresher.register(refresh_rates_service)
+    rate_refresher.register(services_v2.refresh_rates)
+    rate_refresher.follow(database.rate_snapshot_cache.load_shared)
+    rate_refresher.follow(services_v2.rate_snapshot_cache.load_shared)
+    await rate_refresher.refresh_cycle()
+    rate_refresher.start()
+    _started = True
+
 
-app = FastAPI(title="Currency Conversion")
+async def shutdown() -> None:
+    """Stops the background rate refresher and closes the shared HTTP, MongoDB, PostgreSQL and cache clients (safe to
+    call even if startup() failed halfway or never ran)."""
+    global _started
+    await rate_refresher.stop()
+    await close_http_client()
+    close_mongo_client()
+    await dispose_engine()
+    await close_cache()
+    _started = False
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Runs startup() before serving requests and shutdown() afterwards."""
+    try:
+        await startup()
+        yield
+    finally:
+        await shutdown()
+
+
+# routes returning plain objects are rendered with orjson (models built by the services are returned as
+# app.responses.TrustedModelResponse, skipping response_model validation).
+app = FastAPI(title="Currency Conversion", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.include_router(routes.router)
 app.include_router(routes_v2.router)
 
 
+@app.exception_handler(ProvidersUnavailableError)
+async def providers_unavailable_handler(request: Request, error: ProvidersUnavailableError):
+    """Answers 503 when no rate provider could be reached (the request may be retried later)."""
+    return ORJSONResponse(status_code=503, content={"detail": "Rate providers are unavailable, please try again later"})
+
+
 @app.get("/", tags=["V1"], name="Home")
 def index():
     return "Server is running!"
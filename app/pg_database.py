@@ -1,11 +1,164 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+import threading
+import time
+from typing import Optional
+from uuid import uuid4
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
 from app.settings import Settings
 
-engine = create_engine(Settings().DATABASE_URL)
+# process-wide engine and session factory, created on first use (importing this module doesn't touch the database).
+_engine: Optional[AsyncEngine] = None
+_async_sessionmaker: Optional[async_sessionmaker] = None
+
+
+class PoolMetrics:
+
+    """Counters of the connection checkouts of the engine pool.
+
+    Attributes:
+        checkouts (int): number of connections handed out by the pool.
+        timeouts (int): number of checkouts that failed because the pool (and its overflow) stayed exhausted for the
+                whole pool timeout.
+        wait_time (float): total seconds spent getting connections from the pool (including opening new ones).
+        max_wait_time (float): longest single checkout, in seconds.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Zeroes every counter."""
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_time = 0.0
+            self.max_wait_time = 0.0
+
+    def record(self, wait_time: float, timed_out: bool = False) -> None:
+        """Adds one checkout (successful or not) that took wait_time seconds."""
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+
+    """AsyncAdaptedQueuePool recording the time taken by every checkout in pool_metrics."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record(time.perf_counter() - start)
+        return connection
+
+
+def async_database_url(url: str) -> str:
+    """Returns the database url using the asyncpg driver for PostgreSQL urls (other urls are kept as they are)."""
+    database_url = make_url(url)
+    if database_url.get_backend_name() == "postgresql":
+        database_url = database_url.set(drivername="postgresql+asyncpg")
+    return database_url.render_as_string(hide_password=False)
+
+
+def engine_options(settings: Settings) -> dict:
+    """Returns the create_async_engine keyword arguments (pool and asyncpg options) defined by settings.
+
+    Pool sizing only applies to PostgreSQL (other databases, like the SQLite used in tests, keep their default pool).
+    In PgBouncer mode (transaction pooling) prepared statements are not cached and get unique names, and the statement
+    timeout is enforced by the client, since PgBouncer rejects it as a startup parameter.
+    """
+    if make_url(settings.DATABASE_URL).get_backend_name() != "postgresql":
+        return {}
+
+    connect_args = {}
+    if settings.DATABASE_PGBOUNCER:
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+        if settings.DATABASE_STATEMENT_TIMEOUT_MS:
+            connect_args["command_timeout"] = settings.DATABASE_STATEMENT_TIMEOUT_MS / 1000
+    elif settings.DATABASE_STATEMENT_TIMEOUT_MS:
+        connect_args["server_settings"] = {"statement_timeout": str(settings.DATABASE_STATEMENT_TIMEOUT_MS)}
+
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+def get_engine() -> AsyncEngine:
+    """Returns the process-wide engine, configured from Settings (it connects lazily, on the first query)."""
+    global _engine, _async_sessionmaker
+    if _engine is None:
+        settings = Settings()
+        _engine = create_async_engine(async_database_url(settings.DATABASE_URL), **engine_options(settings))
+        _async_sessionmaker = async_sessionmaker(_engine, class_=AsyncSession, expire_on_commit=False)
+    return _engine
+
+
+def get_pool_status() -> dict:
+    """Returns the current state of the engine pool along with the checkout counters of pool_metrics.
+
+    Returns:
+        dict: size (connections kept by the pool), checked_out (connections in use), checked_in (idle connections),
+            overflow (connections opened beyond size, negative while the pool isn't full yet) and the PoolMetrics
+            counters (checkouts, timeouts, wait_time, max_wait_time).
+    """
+    status = {"size": 0, "checked_out": 0, "checked_in": 0, "overflow": 0}
+    pool = _engine.pool if _engine is not None else None
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+        }
+    status.update(
+        checkouts=pool_metrics.checkouts,
+        timeouts=pool_metrics.timeouts,
+        wait_time=pool_metrics.wait_time,
+        max_wait_time=pool_metrics.max_wait_time,
+    )
+    return status
+
+
+def async_session() -> AsyncSession:
+    """Returns a new session bound to the process-wide engine."""
+    get_engine()
+    return _async_sessionmaker()
+
+
+async def dispose_engine() -> None:
+    """Closes the pooled connections of the process-wide engine (a new one is created on the next use)."""
+    global _engine, _async_sessionmaker
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        _async_sessionmaker = None
 
 
-def get_session():
+async def get_session():
     """Yields a session to perform database operations."""
-    with Session(engine) as session:
+    async with async_session() as session:
         yield session
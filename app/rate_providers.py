@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Type
+
+from app.external_api import AsyncCurrencyApiInterface, AsyncEconomiaAwesomeAPI
+from app.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# providers that can be listed (by name) in the RATE_PROVIDERS setting.
+PROVIDER_REGISTRY: Dict[str, Type[AsyncCurrencyApiInterface]] = {
+    "awesomeapi": AsyncEconomiaAwesomeAPI,
+}
+
+
+def register_provider(name: str, provider: Type[AsyncCurrencyApiInterface]) -> None:
+    """Makes provider available to the RATE_PROVIDERS setting under name."""
+    PROVIDER_REGISTRY[name] = provider
+
+
+class ProvidersUnavailableError(Exception):
+
+    """Raised when no provider answered and there are no last-known-good rates to fall back to."""
+
+
+class LatencyTracker:
+
+    """Latencies (seconds) of the latest successful calls to a provider.
+
+    Attributes:
+        window (int): number of latencies kept.
+        samples (Deque[float]): latest latencies, oldest first.
+    """
+
+    def __init__(self, window: int = 100) -> None:
+        self.window = window
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        """Adds the latency of a successful call."""
+
+        self.samples.append(latency)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Returns the q-quantile (nearest rank) of the kept latencies (None if there are none)."""
+
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(max(math.ceil(q * len(ordered)) - 1, 0), len(ordered) - 1)]
+
+
+class CircuitBreaker:
+
+    """Per-provider circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens and the provider is skipped. Once reset_timeout
+    seconds have passed, a single trial call is let through (half-open): its success closes the circuit, its failure
+    opens it again.
+
+    Attributes:
+        failure_threshold (int): consecutive failures that open the circuit.
+        reset_timeout (float): seconds the circuit stays open before a trial call.
+        state (str): "closed", "open" or "half-open".
+        failures (int): consecutive failures so far.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        """Returns whether a call may be made now (moving an open circuit to half-open once reset_timeout is over)."""
+
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """Closes the circuit."""
+
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        """Counts a failure, opening the circuit if the threshold is reached or the trial call failed."""
+
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+class CompositeCurrencyAPI(AsyncCurrencyApiInterface):
+
+    """Rate source querying several AsyncCurrencyApiInterface providers, in order of preference.
+
+    The first allowed provider is queried; if it hasn't answered once its hedge delay (the hedge_quantile of its recent
+    latencies) is over, the next one is queried too, and the first answer wins (the other calls are cancelled). A
+    failing provider is replaced by the next one right away. Providers whose circuit breaker is open are skipped. If
+    every provider fails, the last-known-good rates of the requested currencies are returned.
+
+    Since every provider builds its own url, the "url" of a composite (returned by url_builder) is the comma-separated
+    list of currency codes.
+
+    Attributes:
+        providers (List[Type[AsyncCurrencyApiInterface]]): providers, in order of preference.
+        breakers (Dict[Type[AsyncCurrencyApiInterface], CircuitBreaker]): circuit breaker of every provider.
+        latencies (Dict[Type[AsyncCurrencyApiInterface], LatencyTracker]): recent latencies of every provider.
+        hedge_quantile (float): latency quantile used as hedge delay.
+        hedge_delay (float): hedge delay of providers without enough latency samples yet.
+        min_hedge_delay (float): lower bound of the hedge delay.
+        min_samples (int): latency samples needed before the quantile is used.
+        last_good (Dict[str, float]): latest rate returned for every currency.
+    """
+
+    def __init__(
+            self,
+            providers: Sequence[Type[AsyncCurrencyApiInterface]],
+            hedge_quantile: float = 0.95,
+            hedge_delay: float = 0.5,
+            min_hedge_delay: float = 0.05,
+            min_samples: int = 5,
+            failure_threshold: int = 3,
+            reset_timeout: float = 30,
+    ) -> None:
+        if not providers:
+            raise ValueError("At least one provider is required")
+        self.providers = list(providers)
+        self.breakers = {provider: CircuitBreaker(failure_threshold, reset_timeout) for provider in self.providers}
+        self.latencies = {provider: LatencyTracker() for provider in self.providers}
+        self.hedge_quantile = hedge_quantile
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.last_good: Dict[str, float] = {}
+
+    def url_builder(self, currency_list: list) -> str:
+        """Returns the currency codes to fetch (each provider builds its own url from them)."""
+
+        return ",".join(currency_list)
+
+    def provider_hedge_delay(self, provider: Type[AsyncCurrencyApiInterface]) -> float:
+        """Returns how long to wait for provider before also querying the next one."""
+
+        tracker = self.latencies[provider]
+        if len(tracker.samples) < self.min_samples:
+            return self.hedge_delay
+        return max(tracker.quantile(self.hedge_quantile), self.min_hedge_delay)
+
+    async def _fetch(self, provider: Type[AsyncCurrencyApiInterface], codes: List[str]) -> Dict[str, float]:
+        start = time.perf_counter()
+        try:
+            rates = await provider.get_rates(codes)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.breakers[provider].record_failure()
+            raise
+        self.latencies[provider].record(time.perf_counter() - start)
+        self.breakers[provider].record_success()
+        return rates
+
+    async def get_conversion(self, url: str) -> Dict[str, float]:
+        """Returns the rates (related to USD) of the currencies of url, from the first provider to answer.
+
+        Raises:
+            ProvidersUnavailableError: if every provider failed (or was skipped) and none of the currencies has a
+                last-known-good rate.
+        """
+
+        codes = [code for code in url.split(",") if code]
+        candidates = [provider for provider in self.providers if self.breakers[provider].allow()]
+        running: Dict[asyncio.Task, Type[AsyncCurrencyApiInterface]] = {}
+        launched = 0
+
+        def launch_next() -> None:
+            nonlocal launched
+            if launched < len(candidates):
+                provider = candidates[launched]
+                running[asyncio.create_task(self._fetch(provider, codes))] = provider
+                launched += 1
+
+        launch_next()
+        try:
+            while running:
+                timeout = self.provider_hedge_delay(candidates[launched - 1]) if launched < len(candidates) else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch_next()
+                    continue
+                for task in done:
+                    provider = running.pop(task)
+                    if task.cancelled():
+                        # cancelled from within (not by this call): counted as a failure of the provider.
+                        self.breakers[provider].record_failure()
+                        logger.warning("Rate provider %s was cancelled", provider.__name__)
+                    elif task.exception() is None:
+                        rates = task.result()
+                        self.last_good.update(rates)
+                        return rates
+                    else:
+                        logger.warning("Rate provider %s failed", provider.__name__, exc_info=task.exception())
+                    launch_next()
+        finally:
+            for task in running:
+                task.cancel()
+
+        fallback = {code: self.last_good[code] for code in codes if code in self.last_good}
+        if not fallback:
+            raise ProvidersUnavailableError(f"No rate provider answered for {codes}")
+        logger.warning("No rate provider answered, using last-known-good rates for %s", list(fallback))
+        return fallback
+
+    async def pair_exists(self, source_currency: str, target_currency: str) -> bool:
+        """Checks if any provider knows the given currency pair (providers that fail or are skipped don't count).
+
+        Raises:
+            ProvidersUnavailableError: if no provider answered (so whether the pair exists is unknown).
+        """
+
+        answered = False
+        for provider in self.providers:
+            if not self.breakers[provider].allow():
+                continue
+            try:
+                exists = await provider.pair_exists(source_currency, target_currency)
+            except Exception:
+                self.breakers[provider].record_failure()
+                logger.warning("Rate provider %s failed", provider.__name__, exc_info=True)
+                continue
+            self.breakers[provider].record_success()
+            answered = True
+            if exists:
+                return True
+        if not answered:
+            raise ProvidersUnavailableError(f"No rate provider answered for {source_currency}-{target_currency}")
+        return False
+
+
+# process-wide rate source, created on first use.
+_rate_provider: Optional[CompositeCurrencyAPI] = None
+
+
+def get_rate_provider() -> CompositeCurrencyAPI:
+    """Returns the process-wide composite rate source, built from the RATE_PROVIDER* settings (the providers are
+    configured from Settings once, here)."""
+    global _rate_provider
+    if _rate_provider is None:
+        settings = Settings()
+        providers = [PROVIDER_REGISTRY[name.strip()] for name in settings.RATE_PROVIDERS.split(",") if name.strip()]
+        for provider in providers:
+            provider.configure(settings)
+        _rate_provider = CompositeCurrencyAPI(
+            providers,
+            hedge_quantile=settings.RATE_PROVIDER_HEDGE_QUANTILE,
+            hedge_delay=settings.RATE_PROVIDER_HEDGE_DELAY,
+            min_hedge_delay=settings.RATE_PROVIDER_MIN_HEDGE_DELAY,
+            failure_threshold=settings.RATE_PROVIDER_FAILURE_THRESHOLD,
+            reset_timeout=settings.RATE_PROVIDER_RESET_TIMEOUT,
+        )
+    return _rate_provider
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from app.cache import CacheBackend
+
+logger = logging.getLogger(__name__)
+
+
+class RateRefresher:
+
+    """Background task that periodically refreshes the conversion rates.
+
+    Every registered job (a coroutine function) is awaited once per cycle. Cycles are spaced by interval plus a random
+    jitter so that several workers don't hit the external API at the same moment.
+
+    With a lease cache shared by every worker, a cycle first takes the refresh lease (valid for interval seconds): only
+    the worker holding it runs the refresh jobs, the others run the follow jobs instead (loading the snapshots it
+    publishes), so the fleet fetches the rates once per interval.
+
+    Attributes:
+        interval (float): base number of seconds between two refreshes.
+        jitter (float): maximum number of seconds randomly added to the interval.
+        jobs (List[Callable[[], Awaitable[None]]]): refresh jobs run on every cycle (holding the lease).
+        follow_jobs (List[Callable[[], Awaitable[None]]]): jobs run on the cycles where another worker holds the lease.
+        lease (Optional[CacheBackend]): cache shared by every worker holding the refresh lease (every worker runs the
+                refresh jobs if None).
+        lease_key (str): key of the refresh lease in the lease cache.
+        next_refresh (Optional[float]): time.monotonic() value of the next scheduled refresh.
+    """
+
+    def __init__(
+            self,
+            interval: float,
+            jitter: float = 0,
+            lease: Optional[CacheBackend] = None,
+            lease_key: str = "rate_refresher:lease",
+    ) -> None:
+        self.interval = interval
+        self.jitter = jitter
+        self.jobs: List[Callable[[], Awaitable[None]]] = []
+        self.follow_jobs: List[Callable[[], Awaitable[None]]] = []
+        self.lease = lease
+        self.lease_key = lease_key
+        self.next_refresh: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, job: Callable[[], Awaitable[None]]) -> None:
+        """Adds a job to be run on every refresh cycle (registering the same job twice has no effect)."""
+
+        if job not in self.jobs:
+            self.jobs.append(job)
+
+    def follow(self, job: Callable[[], Awaitable[None]]) -> None:
+        """Adds a job to be run on the cycles where another worker holds the refresh lease (registering the same job
+        twice has no effect)."""
+
+        if job not in self.follow_jobs:
+            self.follow_jobs.append(job)
+
+    def seconds_until_refresh(self) -> Optional[float]:
+        """Returns the number of seconds left before the next scheduled refresh (None if the loop isn't running)."""
+
+        if self._task is None or self.next_refresh is None:
+            return None
+        return max(self.next_refresh - time.monotonic(), 0)
+
+    def next_delay(self) -> float:
+        """Returns the number of seconds to wait before the next cycle."""
+
+        return self.interval + random.uniform(0, self.jitter)
+
+    @staticmethod
+    async def _run_jobs(jobs: List[Callable[[], Awaitable[None]]]) -> None:
+        for job in jobs:
+            try:
+                await job()
+            except Exception:
+                logger.exception("Rate refresh job %r failed", job)
+
+    async def refresh_once(self) -> None:
+        """Runs every registered job once. A failing job is logged and doesn't prevent the others from running."""
+
+        await self._run_jobs(self.jobs)
+
+    async def acquire_lease(self) -> bool:
+        """Takes the refresh lease for the next interval seconds.
+
+        Returns:
+            bool: True if this worker holds the lease (always True without a lease cache, or if it can't be reached).
+        """
+
+        if self.lease is None:
+            return True
+        try:
+            return await self.lease.add(self.lease_key, b"1", self.interval)
+        except Exception:
+            logger.warning("Refresh lease %r could not be taken, refreshing anyway", self.lease_key, exc_info=True)
+            return True
+
+    async def refresh_cycle(self) -> None:
+        """Runs the refresh jobs if this worker takes the refresh lease, the follow jobs otherwise."""
+
+        if await self.acquire_lease():
+            await self.refresh_once()
+        else:
+            await self._run_jobs(self.follow_jobs)
+
+    async def _run(self) -> None:
+        while True:
+            delay = self.next_delay()
+            self.next_refresh = time.monotonic() + delay
+            await asyncio.sleep(delay)
+            await self.refresh_cycle()
+
+    def start(self) -> None:
+        """Starts the refresh loop on the running event loop (the first refresh happens after one interval)."""
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancels the refresh loop and waits for it to finish."""
+
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# interval, jitter and lease are set from Settings on startup (see app.main.startup).
+rate_refresher = RateRefresher(interval=30)
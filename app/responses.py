@@ -0,0 +1,20 @@
+from typing import Any
+
+import pydantic_core
+from fastapi.responses import Response
+
+
+class TrustedModelResponse(Response):
+
+    """JSON response of an already-validated pydantic model (or list of models).
+
+    For a returned model, FastAPI dumps it to a dict, validates that dict against response_model again (running custom
+    __init__s once more) and walks the result with jsonable_encoder before encoding it. Objects built by the services
+    are trusted, so they are serialized straight to bytes by their own pydantic serializer instead. Routes keep their
+    response_model for the documentation.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content)
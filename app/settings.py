@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,3 +10,45 @@ class Settings(BaseSettings):
     )
 
     DATABASE_URL: str
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 20
+    DATABASE_POOL_TIMEOUT: float = 30
+    DATABASE_POOL_RECYCLE: int = 1800
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_STATEMENT_TIMEOUT_MS: int = 0
+    DATABASE_PGBOUNCER: bool = False
+    RATE_SNAPSHOT_TTL: float = 30
+    RATE_REFRESH_INTERVAL: float = 30
+    RATE_REFRESH_JITTER: float = 5
+    HTTP_CLIENT_TIMEOUT: float = 10
+    HTTP_CLIENT_CONNECT_TIMEOUT: float = 5
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 100
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = 30
+    HTTP_CLIENT_HTTP2: bool = True
+    MONGO_HOST: str = "database"
+    MONGO_PORT: int = 27017
+    MONGO_DATABASE: str = "database"
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_SOCKET_TIMEOUT_MS: int = 0
+    MONGO_READ_PREFERENCE: str = "primary"
+    MONGO_WRITE_CONCERN: str = "1"
+    CACHE_LOCAL_MAX_ENTRIES: int = 1024
+    CACHE_LOCAL_TTL: float = 5
+    CACHE_REDIS_URL: Optional[str] = None
+    CACHE_REDIS_TIMEOUT: float = 0.5
+    CACHE_REDIS_MAX_CONNECTIONS: int = 10
+    RATE_PROVIDERS: str = "awesomeapi"
+    RATE_PROVIDER_HEDGE_QUANTILE: float = 0.95
+    RATE_PROVIDER_HEDGE_DELAY: float = 0.5
+    RATE_PROVIDER_MIN_HEDGE_DELAY: float = 0.05
+    RATE_PROVIDER_FAILURE_THRESHOLD: int = 3
+    RATE_PROVIDER_RESET_TIMEOUT: float = 30
+    UPSTREAM_MAX_URL_LENGTH: int = 2000
+    UPSTREAM_CHUNK_MAX_CODES: int = 50
+    UPSTREAM_MAX_PARALLEL_CHUNKS: int = 4
+    UPSTREAM_CHUNK_RETRIES: int = 2
+    UPSTREAM_CHUNK_RETRY_BACKOFF: float = 0.1
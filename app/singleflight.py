@@ -0,0 +1,88 @@
+import asyncio
+import functools
+from typing import Any, Callable, Dict, Hashable
+
+
+class _AsyncCall:
+
+    """In-flight coroutine shared by every caller of the same key."""
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+
+    """Coalesces concurrent calls sharing the same key into a single execution.
+
+    The first caller of a key starts the execution; coroutines calling with the same key while it is still running
+    await it and get the same result (or exception) instead of running the function again.
+
+    The execution runs in a task of its own, awaited (shielded) by every caller: cancelling a caller, the first one
+    included, only cancels that caller while the others keep waiting for the result. The execution itself is cancelled
+    once every caller is gone.
+
+    Attributes:
+        calls (int): number of times a coroutine function was actually awaited.
+        coalesced (int): number of calls that were served by another caller's execution.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: Dict[Hashable, _AsyncCall] = {}
+
+    def _done(self, key: Hashable, call: _AsyncCall) -> None:
+        if self._in_flight.get(key) is call:
+            del self._in_flight[key]
+        if not call.task.cancelled():
+            # marks the exception as retrieved when no caller was left waiting for it.
+            call.task.exception()
+
+    async def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """Awaits fn(*args, **kwargs) unless a call with the same key is already in flight, in which case its result
+        is returned once it finishes."""
+
+        call = self._in_flight.get(key)
+        if call is None:
+            call = _AsyncCall(asyncio.ensure_future(fn(*args, **kwargs)))
+            call.task.add_done_callback(lambda task: self._done(key, call))
+            self._in_flight[key] = call
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                call.task.cancel()
+
+    def stats(self) -> dict:
+        """Returns the execution and coalescing counters."""
+
+        return {"calls": self.calls, "coalesced": self.coalesced}
+
+
+async_upstream_flight = AsyncSingleFlight()
+
+
+def async_single_flight(key: Callable[..., Hashable], group: AsyncSingleFlight = async_upstream_flight) -> Callable:
+    """Decorator that runs the decorated coroutine function through an AsyncSingleFlight group.
+
+    Arguments:
+        key (Callable): receives the same arguments as the decorated function and returns the coalescing key.
+        group (AsyncSingleFlight): group tracking in-flight calls and counters.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await group.do(key(*args, **kwargs), fn, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import cached_property
+from typing import AbstractSet, Awaitable, Callable, List, Mapping, Optional, Sequence, Tuple
+
+from app.cache import CacheBackend
+from app.conversion_kernel import CrossRateMatrix, RateVector
+from app.http_cache import PreparedBody
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateSnapshot:
+
+    """Immutable view of the conversion rates (relative to USD) at a given moment.
+
+    Attributes:
+        rates (Mapping[str, float]): currency code -> rate_usd.
+        update_time (datetime): time the rates were last updated (timezone aware).
+        listing (Optional[PreparedBody]): pre-serialized available-currencies response matching these rates (only set
+                on snapshots of every tracked currency).
+    """
+    rates: Mapping[str, float]
+    update_time: datetime
+    listing: Optional[PreparedBody] = field(default=None, compare=False, repr=False)
+
+    def convert(self, source_currency: str, target_currency: str, amount: float) -> float:
+        """Converts amount from source_currency to target_currency.
+
+        Raises:
+            KeyError: if one of the currencies is not in the snapshot.
+            ZeroDivisionError: if target_currency has no rate yet (rate_usd == 0).
+        """
+
+        if source_currency == target_currency:
+            return amount
+        return amount * self.rates[source_currency] / self.rates[target_currency]
+
+    def to_bytes(self) -> bytes:
+        """Serializes the snapshot (rates, update time and listing) to be stored in a shared cache."""
+
+        return json.dumps(
+            {
+                "update_time": self.update_time.isoformat(),
+                "rates": dict(self.rates),
+                "listing": None if self.listing is None else self.listing.body.decode(),
+            },
+            separators=(",", ":"),
+        ).encode()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "RateSnapshot":
+        """Rebuilds a snapshot serialized by to_bytes (its listing keeps the same bytes, hence the same ETag)."""
+
+        content = json.loads(data)
+        listing = content.get("listing")
+        return cls(
+            rates=content["rates"],
+            update_time=datetime.fromisoformat(content["update_time"]),
+            listing=None if listing is None else PreparedBody(listing.encode()),
+        )
+
+    @cached_property
+    def version(self) -> str:
+        """Digest of the update time and rates, identifying this snapshot (computed on first use)."""
+
+        content = repr((self.update_time.isoformat(), sorted(self.rates.items()))).encode()
+        return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+    @cached_property
+    def vector(self) -> RateVector:
+        """Array-backed copy of the rates used for vectorized conversions (built on first use)."""
+
+        return RateVector.from_mapping(self.rates)
+
+    @cached_property
+    def cross_rate_matrix(self) -> CrossRateMatrix:
+        """Serialized cross-rate table of every currency in the snapshot (built on first use)."""
+
+        return CrossRateMatrix(self.vector, self.update_time)
+
+    def precompute(self) -> None:
+        """Builds the derived representations (rate vector and cross-rate matrix) ahead of the first request."""
+
+        self.cross_rate_matrix
+
+    def convert_many(self, items: Sequence) -> List[dict]:
+        """Converts every item (objects with source, target and amount attributes) using this snapshot.
+
+        The conversion itself is one vectorized operation over all items. A failing item gets an error message instead
+        of a result; it doesn't fail the other items.
+        """
+
+        sources = [item.source for item in items]
+        targets = [item.target for item in items]
+        amounts = [item.amount for item in items]
+        values, source_indices, target_indices = self.vector.convert_codes(sources, targets, amounts)
+
+        results = []
+        for i, value in enumerate(values.tolist()):
+            result = {"source": sources[i], "target": targets[i], "amount": amounts[i], "result": None, "error": None}
+            if math.isfinite(value):
+                result["result"] = value
+            elif source_indices[i] < 0:
+                result["error"] = f"Currency with code={sources[i]} is not being tracked"
+            elif target_indices[i] < 0:
+                result["error"] = f"Currency with code={targets[i]} is not being tracked"
+            else:
+                result["error"] = f"Currency with code={targets[i]} has no conversion rate yet"
+            results.append(result)
+        return results
+
+
+class RateSnapshotCache:
+
+    """In-process holder of the latest RateSnapshot, optionally backed by a cache shared by every worker.
+
+    Readers never take a lock: the current snapshot and its expiry are stored as a single tuple, so publishing a new
+    snapshot is one atomic reference swap. Only a stale read goes through the shared cache and then the loader (under
+    a lock, so concurrent stale readers trigger a single load). Snapshots loaded or published by one worker are stored
+    in the shared cache, so the other workers read them instead of querying the database.
+
+    Attributes:
+        loader (Callable[[], Awaitable[RateSnapshot]]): builds a fresh snapshot from the backing store.
+        ttl (float): seconds a snapshot is served before the loader is called again.
+        shared (Optional[CacheBackend]): cache shared by every worker (snapshots are only kept in-process if None).
+        key (str): key of the snapshot in the shared cache.
+    """
+
+    def __init__(
+            self,
+            loader: Callable[[], Awaitable[RateSnapshot]],
+            ttl: float = 30,
+            shared: Optional[CacheBackend] = None,
+            key: str = "rate_snapshot",
+    ) -> None:
+        self.loader = loader
+        self.ttl = ttl
+        self.shared = shared
+        self.key = key
+        self._entry: Optional[Tuple[RateSnapshot, float]] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> RateSnapshot:
+        """Returns the current snapshot, reloading it (from the shared cache, if possible) if it has expired."""
+
+        entry = self._entry
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        async with self._lock:
+            entry = self._entry
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            snapshot = await self._get_shared()
+            if snapshot is not None:
+                self._entry = (snapshot, time.monotonic() + self.ttl)
+                return snapshot
+            snapshot = await self.loader()
+            await self.publish(snapshot)
+            return snapshot
+
+    async def _get_shared(self) -> Optional[RateSnapshot]:
+        if self.shared is None:
+            return None
+        data = await self.shared.get(self.key)
+        if data is None:
+            return None
+        try:
+            return RateSnapshot.from_bytes(data)
+        except (ValueError, KeyError):
+            logger.warning("Discarding malformed shared snapshot %r", self.key, exc_info=True)
+            return None
+
+    async def load_shared(self) -> bool:
+        """Replaces the current snapshot by the one published in the shared cache, if any (used by the workers that
+        don't refresh the rates themselves).
+
+        Returns:
+            bool: True if a published snapshot was found.
+        """
+
+        snapshot = await self._get_shared()
+        if snapshot is None:
+            return False
+        self._entry = (snapshot, time.monotonic() + self.ttl)
+        return True
+
+    async def publish(self, snapshot: RateSnapshot) -> None:
+        """Replaces the current snapshot (in-process and in the shared cache) and restarts its TTL."""
+
+        self._entry = (snapshot, time.monotonic() + self.ttl)
+        if self.shared is not None:
+            await self.shared.set(self.key, snapshot.to_bytes(), self.ttl)
+
+    async def invalidate(self) -> None:
+        """Drops the current snapshot (in-process and in the shared cache) so that the next read hits the loader."""
+
+        self._entry = None
+        if self.shared is not None:
+            await self.shared.delete(self.key)
+
+
+async def convert_many_as_of(
+        items: Sequence,
+        as_of: Optional[datetime],
+        load_current: Callable[[AbstractSet[str]], Awaitable[RateSnapshot]],
+        load_as_of: Callable[[AbstractSet[str], datetime], Awaitable[RateSnapshot]],
+) -> List[dict]:
+    """Converts every item at the rates in effect at its own as_of (or at as_of, or at the current rates).
+
+    Items are grouped by moment, so that a single snapshot (loaded with the currencies of its group only) serves every
+    item of a group. Results keep the order of items and carry the moment used (as_of is None for current rates).
+
+    Arguments:
+        items (Sequence): objects with source, target, amount and (optionally) as_of attributes.
+        as_of (datetime): moment used by the items without an as_of of their own (current rates if None).
+        load_current (Callable): currency codes -> current RateSnapshot.
+        load_as_of (Callable): (currency codes, moment) -> RateSnapshot of the rates in effect at that moment.
+    """
+
+    groups = defaultdict(list)
+    for i, item in enumerate(items):
+        groups[getattr(item, "as_of", None) or as_of].append(i)
+
+    results: List[Optional[dict]] = [None] * len(items)
+    for moment, indices in groups.items():
+        group = [items[i] for i in indices]
+        codes = {code for item in group for code in (item.source, item.target)}
+        snapshot = await load_current(codes) if moment is None else await load_as_of(codes, moment)
+        for i, result in zip(indices, snapshot.convert_many(group)):
+            result["as_of"] = moment
+            results[i] = result
+    return results
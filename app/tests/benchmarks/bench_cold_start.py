@@ -0,0 +1,45 @@
+"""Measures the cold-start time of app.main (importing it in a fresh interpreter) with no backing services.
+
+DATABASE_URL is unset and MongoDB points to an unroutable address, so any connection attempted at import time would
+fail or hang. The target is TARGET_SECONDS for the median import time.
+
+Usage: python -m app.tests.benchmarks.bench_cold_start [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = 10
+TARGET_SECONDS = 2.0
+
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+
+def cold_start_environment() -> dict:
+    """Returns the environment of the measured interpreters (no DATABASE_URL, unreachable MongoDB)."""
+    environment = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    environment["MONGO_HOST"] = "10.255.255.1"
+    return environment
+
+
+def cold_start() -> float:
+    """Returns the time (seconds) taken to import app.main in a fresh interpreter."""
+    completed = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], env=cold_start_environment(), capture_output=True, text=True, check=True
+    )
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+    timings = [cold_start() for _ in range(runs)]
+    median = statistics.median(timings)
+    print(f"{'runs':>6} {'min (s)':>9} {'median (s)':>11} {'max (s)':>9} {'target (s)':>11}")
+    print(f"{runs:>6} {min(timings):>9.3f} {median:>11.3f} {max(timings):>9.3f} {TARGET_SECONDS:>11.3f}")
+    if median > TARGET_SECONDS:
+        sys.exit(f"median cold start {median:.3f}s is above the {TARGET_SECONDS}s target")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Compares the vectorized RateVector kernel against the scalar conversion path.
+
+Usage: python -m app.tests.benchmarks.bench_conversion_kernel
+"""
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+from app.conversion_kernel import RateVector
+from app.snapshot import RateSnapshot
+
+SIZES = [1_000, 100_000, 10_000_000]
+
+
+def build_rates(n: int = 200) -> dict:
+    """Returns n random currency rates (USD included)."""
+    rates = {f"C{i:03d}": random.uniform(0.001, 1000) for i in range(n - 1)}
+    rates["USD"] = 1.0
+    return rates
+
+
+def scalar_path(snapshot: RateSnapshot, sources: list, targets: list, amounts: list) -> list:
+    """Per-pair Python conversion, as done by the single conversion endpoints."""
+    return [snapshot.convert(s, t, a) for s, t, a in zip(sources, targets, amounts)]
+
+
+def timed(fn, *args) -> float:
+    """Returns the time (seconds) taken by fn(*args)."""
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    rates = build_rates()
+    codes = list(rates)
+    snapshot = RateSnapshot(rates=rates, update_time=datetime.now().astimezone(pytz.utc))
+    vector = RateVector.from_mapping(rates)
+
+    print(f"{'items':>12} {'scalar (s)':>12} {'kernel+lookup (s)':>18} {'kernel only (s)':>16} {'speedup':>8}")
+    for size in SIZES:
+        sources = random.choices(codes, k=size)
+        targets = random.choices(codes, k=size)
+        amounts = np.random.uniform(1, 1000, size)
+        amounts_list = amounts.tolist()
+        source_indices = vector.lookup(sources)
+        target_indices = vector.lookup(targets)
+
+        scalar = timed(scalar_path, snapshot, sources, targets, amounts_list)
+        with_lookup = timed(vector.convert_codes, sources, targets, amounts)
+        kernel = timed(vector.convert, source_indices, target_indices, amounts)
+        print(f"{size:>12} {scalar:>12.4f} {with_lookup:>18.4f} {kernel:>16.4f} {scalar / kernel:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Compares the orjson single-pass parsing of provider responses against the previous response.json() path, on a
+recorded 500-currency AwesomeAPI response.
+
+Usage: python -m app.tests.benchmarks.bench_provider_parsing [repetitions]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+import httpx
+
+from app.external_api import parse_rates
+
+FIXTURE = Path(__file__).parent.parent / "fixtures" / "awesomeapi_last_500.json"
+
+
+def previous_path(response: httpx.Response) -> dict:
+    """response.json() into a dict of string bids, coerced to floats afterwards (as the refresh services did)."""
+    rates = {value["code"]: value["bid"] for value in response.json().values()}
+    return {code: float(rate) for code, rate in rates.items()}
+
+
+def orjson_path(response: httpx.Response) -> dict:
+    """Single pass over the orjson-decoded body, straight into float bids."""
+    return parse_rates(response.content)
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    content = FIXTURE.read_bytes()
+    assert previous_path(httpx.Response(200, content=content)) == orjson_path(httpx.Response(200, content=content))
+
+    print(f"fixture: {FIXTURE.name} ({len(content) / 1024:.0f} KiB)")
+    print(f"{'path':>10} {'ms/response':>12} {'speedup':>8}")
+    timings = {}
+    for name, path in [("previous", previous_path), ("orjson", orjson_path)]:
+        # a fresh Response every time, so that no decoded text is reused between repetitions.
+        timings[name] = min(
+            timeit.repeat(lambda: path(httpx.Response(200, content=content)), number=repetitions, repeat=5)
+        ) / repetitions
+        print(f"{name:>10} {timings[name] * 1000:>12.3f} {timings['previous'] / timings[name]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
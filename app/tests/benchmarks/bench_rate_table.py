@@ -0,0 +1,81 @@
+"""Compares the memory and time of the RateTable against the pydantic DatabaseCurrencyList for a snapshot document with
+10,000 currencies.
+
+Measured operations: building from the document, listing every code, listing the real codes (the refresh path) and
+building the code -> rate map (the conversion path).
+
+Usage: python -m app.tests.benchmarks.bench_rate_table [currencies]
+"""
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import pytz
+
+from app.api.v1.models import DatabaseCurrencyList, RateTable
+
+SIZE = 10_000
+
+
+def build_document(n: int) -> dict:
+    """Returns a snapshot document with n currencies (one custom currency out of ten)."""
+    currencies = [
+        {"code": f"C{i:05d}", "rate_usd": 1 + i / 7, "currency_type": "custom" if i % 10 == 0 else "real"}
+        for i in range(n)
+    ]
+    return {"update_time": datetime.now().astimezone(pytz.utc), "currencies": {"list_of_currencies": currencies}}
+
+
+def allocated(build) -> int:
+    """Returns the memory (bytes) still allocated by the object returned by build()."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def per_call(fn, budget: float = 0.5) -> float:
+    """Returns the mean time (seconds) of fn(), called for about budget seconds."""
+    calls, start = 0, time.perf_counter()
+    while time.perf_counter() - start < budget:
+        fn()
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else SIZE
+    document = build_document(size)
+    model = DatabaseCurrencyList(**document)
+    table = RateTable.from_document(document)
+    assert model.get_currencies_list(all_currencies=True) == list(table.codes)
+    assert model.get_currencies_list() == list(table.real_codes)
+    assert model.return_currency_list_obj().get_currency_rate() == table.rate_map
+
+    operations = [
+        ("build", lambda: DatabaseCurrencyList(**document), lambda: RateTable.from_document(document)),
+        ("all codes", lambda: model.get_currencies_list(all_currencies=True), lambda: table.codes),
+        ("real codes", lambda: model.get_currencies_list(), lambda: table.real_codes),
+        ("rate map", lambda: model.return_currency_list_obj().get_currency_rate(), lambda: table.rate_map),
+    ]
+
+    print(f"currencies: {size}")
+    print(f"{'memory':>12} {'pydantic (KiB)':>16} {'RateTable (KiB)':>16} {'ratio':>7}")
+    # DatabaseCurrencyList keeps a reference to the raw currencies of the document: its helpers validate them into a
+    # CurrencyList on every call, so the CurrencyList is what the pydantic representation holds in memory.
+    pydantic_memory = allocated(lambda: DatabaseCurrencyList(**document).return_currency_list_obj())
+    table_memory = allocated(lambda: RateTable.from_document(document))
+    print(f"{'':>12} {pydantic_memory / 1024:>16.0f} {table_memory / 1024:>16.0f} {pydantic_memory / table_memory:>6.1f}x")
+
+    print(f"{'operation':>12} {'pydantic (ms)':>16} {'RateTable (ms)':>16} {'speedup':>7}")
+    for name, pydantic_op, table_op in operations:
+        pydantic_time, table_time = per_call(pydantic_op), per_call(table_op)
+        print(f"{name:>12} {pydantic_time * 1000:>16.4f} {table_time * 1000:>16.4f} {pydantic_time / table_time:>6.0f}x")
+
+
+if __name__ == "__main__":
+    main()
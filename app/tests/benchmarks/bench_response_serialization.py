@@ -0,0 +1,75 @@
+"""Measures the serialization cost per request of the /v1/available-currencies body with 10, 500 and 5,000 currencies.
+
+Compared paths:
+    json: FastAPI's response_model path (dump, validation against DatabaseCurrencyList, jsonable_encoder) rendered by
+        the standard library JSONResponse (the previous default).
+    orjson: the same response_model path rendered by ORJSONResponse (the current default response class).
+    trusted: TrustedModelResponse, serializing the model straight to bytes (no response_model validation).
+    listing: building the PreparedBody served by the endpoint, paid once per rate snapshot instead of per request.
+
+Usage: python -m app.tests.benchmarks.bench_response_serialization [sizes, e.g. 10,500,5000]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime
+
+import pytz
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+
+from app.api.v1.models import CurrencyItem, CurrencyList, DatabaseCurrencyList
+from app.api.v1.routes import router
+from app.http_cache import PreparedBody
+from app.responses import TrustedModelResponse
+
+SIZES = [10, 500, 5_000]
+
+
+def build_currency_list(n: int) -> DatabaseCurrencyList:
+    """Returns a DatabaseCurrencyList with n currencies."""
+    items = [CurrencyItem(f"C{i:04d}", 1 + i / 7, "real" if i % 10 else "custom") for i in range(n)]
+    return DatabaseCurrencyList(currencies=CurrencyList(items))
+
+
+def per_call(fn, budget: float = 0.5) -> float:
+    """Returns the mean time (seconds) of fn(), called for about budget seconds."""
+    calls, start = 0, time.perf_counter()
+    while time.perf_counter() - start < budget:
+        fn()
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1].split(",")] if len(sys.argv) > 1 else SIZES
+    field = next(route for route in router.routes if route.path == "/v1/available-currencies").response_field
+    loop = asyncio.new_event_loop()
+
+    def response_model_path(response_class):
+        def render(model):
+            content = loop.run_until_complete(serialize_response(field=field, response_content=model))
+            return response_class(content).body
+        return render
+
+    paths = {
+        "json": response_model_path(JSONResponse),
+        "orjson": response_model_path(ORJSONResponse),
+        "trusted": lambda model: TrustedModelResponse(model).body,
+        "listing": lambda model: PreparedBody.from_object(model.model_dump()).body,
+    }
+
+    print(f"{'currencies':>10} " + " ".join(f"{name + ' (ms)':>13}" for name in paths) + f" {'json/trusted':>13}")
+    for size in sizes:
+        model = build_currency_list(size)
+        model.update_time = datetime(2024, 3, 9, tzinfo=pytz.utc)
+        bodies = {name: path(model) for name, path in paths.items()}
+        assert len({body.replace(b" ", b"") for body in bodies.values()}) == 1, "paths render different bodies"
+        timings = {name: per_call(lambda: path(model)) for name, path in paths.items()}
+        print(f"{size:>10} " + " ".join(f"{timings[name] * 1000:>13.3f}" for name in paths)
+              + f" {timings['json'] / timings['trusted']:>12.1f}x")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
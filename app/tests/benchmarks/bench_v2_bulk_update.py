@@ -0,0 +1,87 @@
+"""Compares the v2 rate refresh committing every row (previous path) against the bulk update of update_conversion.
+
+Runs against DATABASE_URL (use a scratch database: the benchmark inserts currencies with codes Q00000, Q00001, ... as
+real currencies and deletes them at the end).
+
+Usage: python -m app.tests.benchmarks.bench_v2_bulk_update [sizes, e.g. 10,1000,50000]
+"""
+import asyncio
+import random
+import sys
+import time
+
+from sqlalchemy import delete
+
+from app.api.v2.models import Base, Currency, CurrencyType
+from app.api.v2.services import bulk_insert_missing, get_real_currencies, update_conversion, utc_now
+from app.pg_database import async_session, dispose_engine, get_engine
+
+SIZES = [10, 1_000, 50_000]
+PREFIX = "Q"
+
+
+class BenchAPI:
+    """Stand-in for the upstream API: returns a random rate for every benchmark currency."""
+
+    codes: list = []
+
+    @classmethod
+    def url_builder(cls, currencies: list) -> str:
+        return ""
+
+    @classmethod
+    async def get_conversion(cls, url: str) -> dict:
+        return {code: str(random.uniform(0.001, 1000)) for code in cls.codes}
+
+
+async def per_row_update_conversion(session, api) -> None:
+    """Previous update_conversion: one commit and one refresh per currency."""
+    rows = await get_real_currencies(session)
+    updated_usd_rate_dict = await api.get_conversion(url=api.url_builder([row.code for row in rows]))
+    for row in rows:
+        if row.code in updated_usd_rate_dict:
+            row.rate_usd = float(updated_usd_rate_dict[row.code])
+            row.update_time = utc_now()
+            await session.commit()
+            await session.refresh(row)
+
+
+async def timed(path) -> float:
+    """Returns the time (seconds) taken by a refresh of every currency in a new session."""
+    async with async_session() as session:
+        start = time.perf_counter()
+        await path(session, BenchAPI)
+        return time.perf_counter() - start
+
+
+async def remove_bench_currencies() -> None:
+    async with async_session() as session:
+        await session.execute(delete(Currency).where(Currency.code.like(f"{PREFIX}%")))
+        await session.commit()
+
+
+async def main(sizes: list):
+    async with get_engine().begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    print(f"{'currencies':>12} {'per row (s)':>12} {'bulk (s)':>10} {'speedup':>8}")
+    for size in sizes:
+        BenchAPI.codes = [f"{PREFIX}{i:05d}" for i in range(size)]
+        await remove_bench_currencies()
+        async with async_session() as session:
+            await bulk_insert_missing(session, [
+                {"code": code, "rate_usd": 0, "type": CurrencyType.REAL, "update_time": utc_now()}
+                for code in BenchAPI.codes
+            ])
+            await session.commit()
+
+        per_row = await timed(per_row_update_conversion)
+        bulk = await timed(update_conversion)
+        print(f"{size:>12} {per_row:>12.3f} {bulk:>10.3f} {per_row / bulk:>7.0f}x")
+
+    await remove_bench_currencies()
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(size) for size in sys.argv[1].split(",")] if len(sys.argv) > 1 else SIZES))
@@ -0,0 +1,253 @@
+import asyncio
+import time
+import unittest
+from typing import Dict, List, Optional, Tuple
+
+from app.cache import CacheBackend, LocalCache, RedisCache, RedisError, TieredCache
+
+
+class FakeRedisServer:
+
+    """In-memory server speaking the subset of the Redis protocol used by RedisCache (AUTH, SELECT, GET, SET PX [NX],
+    DEL).
+
+    Attributes:
+        password (Optional[str]): password required by AUTH (no authentication if None).
+        commands (List[Tuple[bytes, ...]]): every command received.
+        port (int): port the server listens on (set by start).
+    """
+
+    def __init__(self, password: Optional[str] = None) -> None:
+        self.password = password
+        self.commands: List[Tuple[bytes, ...]] = []
+        self.port = 0
+        self._data: Dict[Tuple[int, bytes], Tuple[bytes, Optional[float]]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        db, authenticated = 0, self.password is None
+        try:
+            while True:
+                count = int((await reader.readuntil(b"\r\n"))[1:-2])
+                args = []
+                for _ in range(count):
+                    length = int((await reader.readuntil(b"\r\n"))[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                self.commands.append(tuple(args))
+                name = args[0].upper()
+                if name == b"AUTH":
+                    authenticated = args[1].decode() == self.password
+                    writer.write(b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n")
+                elif not authenticated:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                elif name == b"SELECT":
+                    db = int(args[1])
+                    writer.write(b"+OK\r\n")
+                elif name == b"GET":
+                    value = self._data.get((db, args[1]))
+                    if value is None or (value[1] is not None and value[1] <= time.monotonic()):
+                        writer.write(b"$-1\r\n")
+                    else:
+                        writer.write(b"$%d\r\n%s\r\n" % (len(value[0]), value[0]))
+                elif name == b"SET":
+                    expiry = time.monotonic() + int(args[4]) / 1000 if len(args) > 3 else None
+                    current = self._data.get((db, args[1]))
+                    taken = current is not None and (current[1] is None or current[1] > time.monotonic())
+                    if b"NX" in args[5:] and taken:
+                        writer.write(b"$-1\r\n")
+                    else:
+                        self._data[(db, args[1])] = (args[2], expiry)
+                        writer.write(b"+OK\r\n")
+                elif name == b"DEL":
+                    writer.write(b":%d\r\n" % (self._data.pop((db, args[1]), None) is not None))
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+
+class FailingCache(CacheBackend):
+
+    """Cache whose every operation fails, standing for an unreachable shared tier."""
+
+    async def get(self, key):
+        raise ConnectionRefusedError
+
+    async def set(self, key, value, ttl):
+        raise ConnectionRefusedError
+
+    async def add(self, key, value, ttl):
+        raise ConnectionRefusedError
+
+    async def delete(self, key):
+        raise ConnectionRefusedError
+
+
+class TestLocalCache(unittest.TestCase):
+    """Tests LocalCache class."""
+
+    def test_lru_eviction(self):
+        """Tests if storing past max_entries evicts the least recently used entry."""
+        async def run():
+            cache = LocalCache(max_entries=2)
+            await cache.set("a", b"1", 60)
+            await cache.set("b", b"2", 60)
+            await cache.get("a")
+            await cache.set("c", b"3", 60)
+            return cache, [await cache.get(key) for key in ("a", "b", "c")]
+
+        cache, values = asyncio.run(run())
+        self.assertEqual(values, [b"1", None, b"3"])
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl(self):
+        """Tests if expired entries are dropped."""
+        async def run():
+            cache = LocalCache()
+            await cache.set("a", b"1", 0)
+            await cache.set("b", b"2", 60)
+            await cache.delete("b")
+            return await cache.get("a"), await cache.get("b")
+
+        self.assertEqual(asyncio.run(run()), (None, None))
+
+    def test_add(self):
+        """Tests if add only stores a value under a free (or expired) key."""
+        async def run():
+            cache = LocalCache()
+            added = [await cache.add("lease", b"1", 60), await cache.add("lease", b"2", 60)]
+            await cache.set("expired", b"1", 0)
+            added.append(await cache.add("expired", b"2", 60))
+            return added, await cache.get("lease")
+
+        self.assertEqual(asyncio.run(run()), ([True, False, True], b"1"))
+
+
+class TestRedisCache(unittest.TestCase):
+    """Tests RedisCache class against an in-memory fake server."""
+
+    def run_with_server(self, test, password: Optional[str] = None, url_suffix: str = ""):
+        """Runs test(cache, server) with a RedisCache connected to a fresh fake server."""
+        server = FakeRedisServer(password=password)
+
+        async def run():
+            await server.start()
+            credentials = f":{password}@" if password else ""
+            cache = RedisCache(f"redis://{credentials}127.0.0.1:{server.port}{url_suffix}", timeout=1)
+            try:
+                return await test(cache, server)
+            finally:
+                await cache.close()
+                await server.stop()
+
+        return asyncio.run(run())
+
+    def test_encode_command(self):
+        """Tests the RESP encoding of commands."""
+        self.assertEqual(RedisCache.encode_command("GET", b"k"), b"*2\r\n$3\r\nGET\r\n$1\r\nk\r\n")
+
+    def test_get_set_delete(self):
+        """Tests if values round-trip through the server and expire after their TTL."""
+        async def test(cache, server):
+            await cache.set("rates", b"\x00binary\r\n", 60)
+            await cache.set("short", b"1", 0.01)
+            await asyncio.sleep(0.05)
+            values = [await cache.get("rates"), await cache.get("short"), await cache.get("missing")]
+            await cache.delete("rates")
+            values.append(await cache.get("rates"))
+            return values, server.commands
+
+        values, commands = self.run_with_server(test)
+        self.assertEqual(values, [b"\x00binary\r\n", None, None, None])
+        self.assertEqual(commands[0], (b"SET", b"rates", b"\x00binary\r\n", b"PX", b"60000"))
+
+    def test_add(self):
+        """Tests if add is a SET ... NX, refused while the key holds a value."""
+        async def test(cache, server):
+            added = [await cache.add("lease", b"1", 60), await cache.add("lease", b"2", 60)]
+            return added, await cache.get("lease"), server.commands[0]
+
+        added, value, command = self.run_with_server(test)
+        self.assertEqual(added, [True, False])
+        self.assertEqual(value, b"1")
+        self.assertEqual(command, (b"SET", b"lease", b"1", b"PX", b"60000", b"NX"))
+
+    def test_connection_reuse(self):
+        """Tests if sequential commands share one pooled connection."""
+        async def test(cache, server):
+            for _ in range(3):
+                await cache.get("k")
+            return len(cache._idle)
+
+        self.assertEqual(self.run_with_server(test), 1)
+
+    def test_auth_and_select(self):
+        """Tests if the password and database of the url are sent when connecting."""
+        async def test(cache, server):
+            await cache.set("k", b"v", 60)
+            return server.commands[:2]
+
+        commands = self.run_with_server(test, password="secret", url_suffix="/2")
+        self.assertEqual(commands, [(b"AUTH", b"secret"), (b"SELECT", b"2")])
+
+    def test_error_reply(self):
+        """Tests if error replies raise RedisError."""
+        async def test(cache, server):
+            with self.assertRaises(RedisError):
+                await cache.execute("FLUSHALL")
+            return await cache.get("k")
+
+        self.assertIsNone(self.run_with_server(test))
+
+
+class TestTieredCache(unittest.TestCase):
+    """Tests TieredCache class."""
+
+    def test_fills_local_tier(self):
+        """Tests if values read from the shared tier are kept in the local tier."""
+        async def run():
+            local, shared = LocalCache(), LocalCache()
+            await shared.set("k", b"v", 60)
+            cache = TieredCache(local, shared, local_ttl=60)
+            return await cache.get("k"), await local.get("k")
+
+        self.assertEqual(asyncio.run(run()), (b"v", b"v"))
+
+    def test_shared_tier_failure(self):
+        """Tests if the cache keeps working with its local tier when the shared one fails."""
+        async def run():
+            cache = TieredCache(LocalCache(), FailingCache(), local_ttl=60)
+            await cache.set("k", b"v", 60)
+            value = await cache.get("k")
+            await cache.delete("k")
+            return value, await cache.get("k")
+
+        with self.assertLogs("app.cache", level="WARNING"):
+            self.assertEqual(asyncio.run(run()), (b"v", None))
+
+    def test_add_uses_shared_tier(self):
+        """Tests if add is decided by the shared tier, so that only one of the workers sharing it takes a key."""
+        async def run():
+            shared = LocalCache()
+            workers = [TieredCache(LocalCache(), shared, local_ttl=60) for _ in range(2)]
+            return [await worker.add("lease", b"1", 60) for worker in workers]
+
+        self.assertEqual(asyncio.run(run()), [True, False])
+
+    def test_add_shared_tier_failure(self):
+        """Tests if add falls back to the local tier when the shared one fails."""
+        async def run():
+            cache = TieredCache(LocalCache(), FailingCache(), local_ttl=60)
+            return await cache.add("lease", b"1", 60), await cache.add("lease", b"1", 60)
+
+        with self.assertLogs("app.cache", level="WARNING"):
+            self.assertEqual(asyncio.run(run()), (True, False))
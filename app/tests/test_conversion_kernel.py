@@ -0,0 +1,80 @@
+import io
+import json
+import unittest
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+from app.conversion_kernel import CrossRateMatrix, RateVector
+
+
+class TestRateVector(unittest.TestCase):
+    """Tests RateVector class."""
+
+    def setUp(self):
+        """Fixture setup."""
+        self.vector = RateVector.from_mapping({"USD": 1.0, "EUR": 1.1, "BRL": 0.2, "NEW": 0})
+
+    def test_attributes(self):
+        """Tests if rates are stored in a contiguous float64 array following codes order."""
+        self.assertEqual(self.vector.codes, ("USD", "EUR", "BRL", "NEW"))
+        self.assertEqual(self.vector.rates.dtype, np.float64)
+        self.assertTrue(self.vector.rates.flags["C_CONTIGUOUS"])
+        self.assertEqual(self.vector.index["BRL"], 2)
+
+    def test_lookup(self):
+        """Tests if unknown codes get index -1."""
+        self.assertEqual(self.vector.lookup(["EUR", "XYZ"]).tolist(), [1, -1])
+
+    def test_convert(self):
+        """Tests the vectorized conversion against the scalar formula."""
+        results = self.vector.convert(np.array([1, 1, 2]), np.array([2, 0, 1]), np.array([10.0, 10.0, 5.0]))
+        np.testing.assert_allclose(results, [55.0, 11.0, 5 * 0.2 / 1.1])
+
+    def test_convert_zero_rate(self):
+        """Tests if a target without rate yields a non finite value instead of raising."""
+        results = self.vector.convert(np.array([1]), np.array([3]), np.array([10.0]))
+        self.assertFalse(np.isfinite(results[0]))
+
+    def test_convert_codes(self):
+        """Tests conversion by codes, including unknown and equal codes."""
+        results, source_indices, target_indices = self.vector.convert_codes(
+            ["EUR", "XYZ", "XYZ"], ["BRL", "BRL", "XYZ"], [10, 10, 7]
+        )
+        self.assertAlmostEqual(results[0], 55.0)
+        self.assertTrue(np.isnan(results[1]))
+        self.assertEqual(results[2], 7)
+        self.assertEqual(source_indices.tolist(), [1, -1, -1])
+
+
+class TestCrossRateMatrix(unittest.TestCase):
+    """Tests CrossRateMatrix class."""
+
+    def setUp(self):
+        """Fixture setup."""
+        self.vector = RateVector.from_mapping({"USD": 1.0, "EUR": 1.1, "BRL": 0.2, "NEW": 0})
+        self.matrix = CrossRateMatrix(self.vector, datetime(2024, 3, 1, tzinfo=pytz.utc))
+
+    def test_cross_rates(self):
+        """Tests if every cross rate matches the pairwise conversion."""
+        cross_rates = self.vector.cross_rates()
+        self.assertEqual(cross_rates.shape, (4, 4))
+        self.assertAlmostEqual(cross_rates[1, 2], 5.5)
+        self.assertAlmostEqual(cross_rates[2, 1], 0.2 / 1.1)
+        np.testing.assert_allclose(np.diag(cross_rates)[:3], 1.0)
+
+    def test_json(self):
+        """Tests the JSON document, with null for currencies without a rate."""
+        document = json.loads(self.matrix.json)
+        self.assertEqual(document["currencies"], ["USD", "EUR", "BRL", "NEW"])
+        self.assertEqual(document["update_time"], "2024-03-01T00:00:00+00:00")
+        self.assertAlmostEqual(document["rates"][1][2], 5.5)
+        self.assertIsNone(document["rates"][1][3])
+        self.assertEqual(document["rates"][3][1], 0.0)
+
+    def test_npy(self):
+        """Tests if the binary format loads back to the cross-rate matrix."""
+        loaded = np.load(io.BytesIO(self.matrix.npy))
+        self.assertEqual(loaded.dtype, np.float64)
+        np.testing.assert_array_equal(loaded, self.vector.cross_rates())
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+
+from app import external_api
+from app.external_api import AsyncCurrencyApiInterface, AsyncEconomiaAwesomeAPI, parse_rates
+from app.settings import Settings
+
+FIXTURE_500 = Path(__file__).parent / "fixtures" / "awesomeapi_last_500.json"
+
+
+def mock_client(handler) -> httpx.AsyncClient:
+    """Returns an AsyncClient answering every request with the given handler."""
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestAsyncEconomiaAwesomeAPI(unittest.TestCase):
+    """Tests AsyncEconomiaAwesomeAPI class."""
+
+    def test_is_interface_subclass(self):
+        """Tests if the provider implements the async interface."""
+        self.assertTrue(issubclass(AsyncEconomiaAwesomeAPI, AsyncCurrencyApiInterface))
+
+    def test_url_builder(self):
+        """Tests if USD is skipped and every other currency is quoted against USD."""
+        self.assertEqual(
+            AsyncEconomiaAwesomeAPI.url_builder(["EUR", "USD", "BRL"]),
+            "https://economia.awesomeapi.com.br/json/last/EUR-USD,BRL-USD",
+        )
+
+    def test_get_conversion(self):
+        """Tests get_conversion method."""
+        def handler(request):
+            return httpx.Response(200, json={
+                "EURUSD": {"code": "EUR", "bid": "1.1"},
+                "BRLUSD": {"code": "BRL", "bid": "0.2"},
+            })
+
+        with patch.object(external_api, "_http_client", mock_client(handler)):
+            rates = asyncio.run(AsyncEconomiaAwesomeAPI.get_conversion("https://example.com/EUR-USD,BRL-USD"))
+        self.assertEqual(rates, {"EUR": 1.1, "BRL": 0.2})
+
+    def test_parse_rates(self):
+        """Tests if a recorded 500-currency response is parsed into float bids matching the stdlib json path."""
+        content = FIXTURE_500.read_bytes()
+        rates = parse_rates(content)
+        expected = {value["code"]: float(value["bid"]) for value in json.loads(content).values()}
+        self.assertEqual(len(rates), 500)
+        self.assertEqual(rates, expected)
+        self.assertTrue(all(isinstance(rate, float) for rate in rates.values()))
+
+    def test_pair_exists(self):
+        """Tests pair_exists method."""
+        def handler(request):
+            if request.url.path.endswith("USD-ERR"):
+                return httpx.Response(503)
+            return httpx.Response(200 if request.url.path.endswith("USD-EUR") else 404)
+
+        with patch.object(external_api, "_http_client", mock_client(handler)):
+            self.assertTrue(asyncio.run(AsyncEconomiaAwesomeAPI.pair_exists("USD", "EUR")))
+            self.assertFalse(asyncio.run(AsyncEconomiaAwesomeAPI.pair_exists("USD", "XYZ")))
+            with self.assertRaises(httpx.HTTPStatusError):
+                asyncio.run(AsyncEconomiaAwesomeAPI.pair_exists("USD", "ERR"))
+
+
+class TestChunkedRates(unittest.TestCase):
+    """Tests the chunked fetch of AsyncEconomiaAwesomeAPI.get_rates."""
+
+    codes = [f"C{index:02d}" for index in range(40)]
+
+    @staticmethod
+    def requested_codes(request) -> list:
+        return [pair.split("-")[0] for pair in request.url.path.rsplit("/", 1)[-1].split(",")]
+
+    def get_rates(self, handler, **attributes):
+        attributes = {"max_codes_per_chunk": 5, "max_parallel_chunks": 4, "chunk_retry_backoff": 0, **attributes}
+        with patch.multiple(AsyncEconomiaAwesomeAPI, **attributes):
+            with patch.object(external_api, "_http_client", mock_client(handler)):
+                return asyncio.run(AsyncEconomiaAwesomeAPI.get_rates(self.codes + ["USD"]))
+
+    def test_configure(self):
+        """Tests if the chunking attributes are read from the UPSTREAM_* settings."""
+        settings = Settings(DATABASE_URL="sqlite+aiosqlite://", UPSTREAM_CHUNK_MAX_CODES=7, UPSTREAM_CHUNK_RETRIES=1)
+        provider = type("ConfiguredAPI", (AsyncEconomiaAwesomeAPI,), {})
+        provider.configure(settings)
+        self.assertEqual((provider.max_codes_per_chunk, provider.chunk_retries), (7, 1))
+        self.assertEqual(AsyncEconomiaAwesomeAPI.max_codes_per_chunk, 50)
+
+    def test_url_chunks(self):
+        """Tests if the urls respect both the length and the currency count bounds and cover every currency."""
+        urls = AsyncEconomiaAwesomeAPI.url_chunks(self.codes, max_url_length=70, max_codes=5)
+        self.assertTrue(all(len(url) <= 70 for url in urls))
+        self.assertTrue(all(url.count(",") < 5 for url in urls))
+        self.assertEqual(",".join(url.rsplit("/", 1)[-1] for url in urls), ",".join(f"{c}-USD" for c in self.codes))
+        self.assertEqual(len(AsyncEconomiaAwesomeAPI.url_chunks(self.codes, 2000, 5)), 8)
+
+    def test_parallel_chunks(self):
+        """Tests if the chunks run concurrently, at most max_parallel_chunks at a time."""
+        running = peak = 0
+
+        async def handler(request):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.1)
+            running -= 1
+            return httpx.Response(200, json={f"{c}USD": {"code": c, "bid": "1"} for c in self.requested_codes(request)})
+
+        rates = self.get_rates(handler)
+        self.assertEqual(sorted(rates), self.codes)
+        self.assertEqual(peak, 4)
+
+    def test_retry_and_partial_results(self):
+        """Tests if a failing chunk is retried on its own and the other chunks are kept if it keeps failing."""
+        calls = {}
+
+        def handler(request):
+            codes = self.requested_codes(request)
+            calls[codes[0]] = calls.get(codes[0], 0) + 1
+            if codes[0] == "C00" or (codes[0] == "C05" and calls["C05"] == 1):
+                return httpx.Response(503)
+            return httpx.Response(200, json={f"{c}USD": {"code": c, "bid": "1"} for c in codes})
+
+        with self.assertLogs("app.external_api", level="WARNING"):
+            rates = self.get_rates(handler, chunk_retries=2)
+        self.assertEqual(sorted(rates), self.codes[5:])
+        self.assertEqual(calls["C00"], 3)
+        self.assertEqual(calls["C05"], 2)
+        self.assertEqual(calls["C10"], 1)
+
+    def test_every_chunk_failed(self):
+        """Tests if get_rates raises when no chunk could be fetched."""
+        with self.assertRaises(httpx.HTTPStatusError):
+            self.get_rates(lambda request: httpx.Response(500), chunk_retries=0)
@@ -0,0 +1,78 @@
+import unittest
+from datetime import datetime
+
+import pytz
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.http_cache import PreparedBody, cache_headers, etag_matches, prepared_response, version_etag
+
+
+class TestPreparedBody(unittest.TestCase):
+    """Tests PreparedBody class."""
+
+    def test_from_object(self):
+        """Tests if objects are serialized like pydantic response models and get a strong ETag of their bytes."""
+        update_time = datetime(2024, 3, 1, 12, tzinfo=pytz.utc)
+        prepared = PreparedBody.from_object({"update_time": update_time, "rate_usd": 1.0})
+        self.assertEqual(prepared.body, b'{"update_time":"2024-03-01T12:00:00Z","rate_usd":1.0}')
+        self.assertRegex(prepared.etag, r'^"[0-9a-f]{32}"$')
+        self.assertEqual(PreparedBody(prepared.body).etag, prepared.etag)
+        self.assertNotEqual(PreparedBody(b"{}").etag, prepared.etag)
+
+
+class TestEtagMatches(unittest.TestCase):
+    """Tests etag_matches function."""
+
+    def test_etag_matches(self):
+        """Tests lists of tags, weak tags, "*" and missing headers."""
+        self.assertTrue(etag_matches('"a"', '"a"'))
+        self.assertTrue(etag_matches('"b", W/"a"', '"a"'))
+        self.assertTrue(etag_matches("*", '"a"'))
+        self.assertFalse(etag_matches('"b"', '"a"'))
+        self.assertFalse(etag_matches(None, '"a"'))
+
+
+class TestCacheHeaders(unittest.TestCase):
+    """Tests version_etag and cache_headers functions."""
+
+    def test_version_etag(self):
+        """Tests if equal versions get equal strong ETags."""
+        self.assertEqual(version_etag("2024-03-01", 1.1, 0.2), version_etag("2024-03-01", 1.1, 0.2))
+        self.assertNotEqual(version_etag("2024-03-01", 1.1, 0.2), version_etag("2024-03-01", 1.1, 0.3))
+        self.assertRegex(version_etag(1), r'^"[0-9a-f]{32}"$')
+
+    def test_cache_headers(self):
+        """Tests if max-age is the whole number of seconds left (0 if unknown)."""
+        self.assertEqual(cache_headers('"a"', 12.7), {"ETag": '"a"', "Cache-Control": "public, max-age=12"})
+        self.assertEqual(cache_headers('"a"', None)["Cache-Control"], "public, max-age=0")
+
+
+class TestPreparedResponse(unittest.TestCase):
+    """Tests prepared_response function."""
+
+    def setUp(self):
+        """Fixture setup: an app serving a prepared body."""
+        self.prepared = PreparedBody.from_object({"currencies": []})
+        app = FastAPI()
+
+        @app.get("/listing")
+        async def listing(request: Request):
+            return prepared_response(request, self.prepared)
+
+        self.client = TestClient(app)
+
+    def test_ok(self):
+        """Tests if the body is sent as is, with its ETag."""
+        response = self.client.get("/listing")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.prepared.body)
+        self.assertEqual(response.headers["etag"], self.prepared.etag)
+        self.assertEqual(response.headers["content-type"], "application/json")
+
+    def test_not_modified(self):
+        """Tests if a matching If-None-Match gets an empty 304 carrying the ETag."""
+        response = self.client.get("/listing", headers={"If-None-Match": self.prepared.etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["etag"], self.prepared.etag)
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Type
+from unittest.mock import patch
+
+import httpx
+
+from app import external_api
+from app.external_api import AsyncEconomiaAwesomeAPI
+from app.rate_providers import (
+    CircuitBreaker,
+    CompositeCurrencyAPI,
+    LatencyTracker,
+    ProvidersUnavailableError,
+)
+
+
+class StubRateServer:
+
+    """Local HTTP server answering like the AwesomeAPI "last" endpoint.
+
+    Attributes:
+        rates (Dict[str, str]): currency code -> bid sent by the server.
+        delay (float): seconds waited before answering.
+        status (int): status code of the answers (rates are only sent with 200).
+        hits (int): number of requests received.
+    """
+
+    def __init__(self, rates: Dict[str, str], delay: float = 0, status: int = 200) -> None:
+        self.rates = rates
+        self.delay = delay
+        self.status = status
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.hits += 1
+                time.sleep(stub.delay)
+                pairs = [pair.split("-") for pair in self.path.rsplit("/", 1)[-1].split(",")]
+                body = {"status": stub.status}
+                if stub.status == 200:
+                    body = {f"{a}{b}": {"code": a, "codein": b, "bid": stub.rates[a]} for a, b in pairs}
+                data = json.dumps(body).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.server.block_on_close = False
+        threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True).start()
+
+    def provider(self) -> Type[AsyncEconomiaAwesomeAPI]:
+        """Returns an AwesomeAPI provider pointing to this server."""
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}/json/last/"
+        return type(f"StubAPI{self.server.server_address[1]}", (AsyncEconomiaAwesomeAPI,), {"base_url": base_url})
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_with_client(coroutine_function):
+    """Runs coroutine_function() with a fresh shared HTTP client (bound to the running loop)."""
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            with patch.object(external_api, "_http_client", client):
+                return await coroutine_function()
+
+    return asyncio.run(run())
+
+
+class TestCompositeCurrencyAPI(unittest.TestCase):
+    """Tests CompositeCurrencyAPI class against local stub HTTP servers."""
+
+    def setUp(self):
+        """Fixture setup: a primary and a secondary provider."""
+        self.primary = StubRateServer({"EUR": "1.1", "BRL": "0.2"})
+        self.secondary = StubRateServer({"EUR": "1.2", "BRL": "0.3"})
+        self.api = CompositeCurrencyAPI(
+            [self.primary.provider(), self.secondary.provider()], hedge_delay=0.1, failure_threshold=2
+        )
+
+    def tearDown(self):
+        self.primary.close()
+        self.secondary.close()
+
+    def get_conversion(self):
+        return run_with_client(lambda: self.api.get_conversion(self.api.url_builder(["EUR", "BRL"])))
+
+    def test_primary(self):
+        """Tests if a fast primary answers alone."""
+        self.assertEqual(self.get_conversion(), {"EUR": 1.1, "BRL": 0.2})
+        self.assertEqual(self.secondary.hits, 0)
+
+    def test_hedged_request(self):
+        """Tests if a slow primary is hedged with the secondary, whose answer wins."""
+        self.primary.delay = 1
+        start = time.perf_counter()
+        self.assertEqual(self.get_conversion(), {"EUR": 1.2, "BRL": 0.3})
+        self.assertLess(time.perf_counter() - start, 0.8)
+        self.assertEqual(self.primary.hits, 1)
+        self.assertEqual(self.secondary.hits, 1)
+
+    def test_failover_and_circuit_breaker(self):
+        """Tests if failures move to the next provider and open the circuit of the failing one."""
+        self.primary.status = 500
+        self.api.providers[0].chunk_retries = 0
+        self.assertEqual(self.get_conversion(), {"EUR": 1.2, "BRL": 0.3})
+        self.assertEqual(self.get_conversion(), {"EUR": 1.2, "BRL": 0.3})
+        self.assertEqual(self.api.breakers[self.api.providers[0]].state, CircuitBreaker.OPEN)
+        self.get_conversion()
+        self.assertEqual(self.primary.hits, 2)
+        self.assertEqual(self.secondary.hits, 3)
+
+    def test_last_known_good(self):
+        """Tests if the last-known-good rates are used when every provider fails."""
+        self.get_conversion()
+        self.primary.status = self.secondary.status = 503
+        self.assertEqual(self.get_conversion(), {"EUR": 1.1, "BRL": 0.2})
+        self.api.last_good.clear()
+        with self.assertRaises(ProvidersUnavailableError):
+            self.get_conversion()
+
+    def test_cancelled_provider(self):
+        """Tests if a provider call cancelled from within counts as a failure and moves to the next provider."""
+        primary = self.api.providers[0]
+
+        async def cancelled(codes):
+            raise asyncio.CancelledError
+
+        with patch.object(primary, "get_rates", cancelled):
+            with self.assertLogs("app.rate_providers", level="WARNING"):
+                self.assertEqual(self.get_conversion(), {"EUR": 1.2, "BRL": 0.3})
+        self.assertEqual(self.api.breakers[primary].failures, 1)
+
+    def test_pair_exists(self):
+        """Tests if a pair unknown to the primary is looked up in the secondary."""
+        self.primary.status = 404
+        self.assertTrue(run_with_client(lambda: self.api.pair_exists("EUR", "USD")))
+        self.secondary.status = 404
+        self.assertFalse(run_with_client(lambda: self.api.pair_exists("EUR", "USD")))
+
+    def test_pair_exists_without_providers(self):
+        """Tests if pair_exists raises when every provider fails or is skipped, instead of reporting an unknown pair."""
+        self.primary.status = self.secondary.status = 500
+        for _ in range(2):
+            with self.assertLogs("app.rate_providers", level="WARNING"):
+                with self.assertRaises(ProvidersUnavailableError):
+                    run_with_client(lambda: self.api.pair_exists("EUR", "USD"))
+        self.assertEqual(self.api.breakers[self.api.providers[0]].state, CircuitBreaker.OPEN)
+        hits = self.primary.hits
+        with self.assertRaises(ProvidersUnavailableError):
+            run_with_client(lambda: self.api.pair_exists("EUR", "USD"))
+        self.assertEqual(self.primary.hits, hits)
+
+    def test_hedge_delay(self):
+        """Tests if the hedge delay is the p95 of the recent latencies once there are enough samples."""
+        provider = self.api.providers[0]
+        self.assertEqual(self.api.provider_hedge_delay(provider), 0.1)
+        for latency in range(1, 21):
+            self.api.latencies[provider].record(latency / 100)
+        self.assertAlmostEqual(self.api.provider_hedge_delay(provider), 0.19)
+
+
+class TestLatencyTracker(unittest.TestCase):
+    """Tests LatencyTracker class."""
+
+    def test_quantile(self):
+        """Tests nearest-rank quantiles over the kept window."""
+        tracker = LatencyTracker(window=10)
+        self.assertIsNone(tracker.quantile(0.95))
+        for latency in range(20):
+            tracker.record(latency)
+        self.assertEqual(tracker.quantile(0.95), 19)
+        self.assertEqual(tracker.quantile(0.5), 14)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Tests CircuitBreaker class."""
+
+    def test_transitions(self):
+        """Tests closed -> open -> half-open -> open/closed transitions."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
@@ -0,0 +1,120 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.cache import LocalCache
+from app.refresher import RateRefresher
+
+
+class TestRateRefresher(unittest.TestCase):
+    """Tests RateRefresher class."""
+
+    def test_next_delay(self):
+        """Tests if the delay stays between interval and interval + jitter."""
+        refresher = RateRefresher(interval=30, jitter=5)
+        for _ in range(100):
+            self.assertTrue(30 <= refresher.next_delay() <= 35)
+
+    def test_register_once(self):
+        """Tests if registering the same job twice keeps a single entry."""
+        refresher = RateRefresher(interval=30)
+        job = AsyncMock()
+        refresher.register(job)
+        refresher.register(job)
+        self.assertEqual(refresher.jobs, [job])
+
+    def test_refresh_once_runs_all_jobs(self):
+        """Tests if a failing job doesn't prevent the others from running."""
+        refresher = RateRefresher(interval=30)
+        failing_job = AsyncMock(side_effect=RuntimeError("upstream down"))
+        job = AsyncMock()
+        refresher.register(failing_job)
+        refresher.register(job)
+        with self.assertLogs("app.refresher"):
+            asyncio.run(refresher.refresh_once())
+        failing_job.assert_called_once()
+        job.assert_called_once()
+
+    def test_start_stop(self):
+        """Tests if the loop refreshes after each interval and stops cleanly (sleeps are stubbed, not timed)."""
+        refresher = RateRefresher(interval=30)
+        job = AsyncMock()
+        refresher.register(job)
+        delays = []
+
+        async def run():
+            second_sleep = asyncio.Event()
+
+            async def sleep(delay):
+                delays.append(delay)
+                if len(delays) == 2:
+                    second_sleep.set()
+                    # the second interval never ends: the loop is cancelled while waiting for it.
+                    await asyncio.Event().wait()
+
+            with patch("app.refresher.asyncio.sleep", sleep):
+                refresher.start()
+                await second_sleep.wait()
+                await refresher.stop()
+
+        asyncio.run(run())
+        job.assert_awaited_once()
+        self.assertEqual(delays, [30, 30])
+        self.assertIsNotNone(refresher.next_refresh)
+        self.assertIsNone(refresher._task)
+
+    def test_seconds_until_refresh(self):
+        """Tests if the time left is only known while the loop runs and never exceeds the delay."""
+        refresher = RateRefresher(interval=30, jitter=5)
+        self.assertIsNone(refresher.seconds_until_refresh())
+
+        async def run():
+            refresher.start()
+            await asyncio.sleep(0)
+            seconds = refresher.seconds_until_refresh()
+            await refresher.stop()
+            return seconds
+
+        self.assertTrue(0 < asyncio.run(run()) <= 35)
+        self.assertIsNone(refresher.seconds_until_refresh())
+
+    def test_refresh_cycle_lease(self):
+        """Tests if, among workers sharing a lease cache, only the one taking the lease runs the refresh jobs."""
+        lease = LocalCache()
+        workers = [RateRefresher(interval=30, lease=lease) for _ in range(2)]
+        jobs, follow_jobs = [AsyncMock(), AsyncMock()], [AsyncMock(), AsyncMock()]
+        for worker, job, follow_job in zip(workers, jobs, follow_jobs):
+            worker.register(job)
+            worker.follow(follow_job)
+
+        async def run():
+            for worker in workers:
+                await worker.refresh_cycle()
+
+        asyncio.run(run())
+        jobs[0].assert_awaited_once()
+        follow_jobs[0].assert_not_awaited()
+        jobs[1].assert_not_awaited()
+        follow_jobs[1].assert_awaited_once()
+
+    def test_refresh_cycle_without_lease(self):
+        """Tests if every cycle runs the refresh jobs without a lease cache."""
+        refresher = RateRefresher(interval=30)
+        job, follow_job = AsyncMock(), AsyncMock()
+        refresher.register(job)
+        refresher.follow(follow_job)
+        asyncio.run(refresher.refresh_cycle())
+        asyncio.run(refresher.refresh_cycle())
+        self.assertEqual(job.await_count, 2)
+        follow_job.assert_not_awaited()
+
+    def test_unreachable_lease(self):
+        """Tests if the refresh jobs still run when the lease cache can't be reached."""
+        lease = MagicMock(add=AsyncMock(side_effect=ConnectionRefusedError))
+        refresher = RateRefresher(interval=30, lease=lease)
+        job = AsyncMock()
+        refresher.register(job)
+        with self.assertLogs("app.refresher", level="WARNING"):
+            asyncio.run(refresher.refresh_cycle())
+        job.assert_awaited_once()
+        lease.add.assert_awaited_once_with("rate_refresher:lease", b"1", 30)
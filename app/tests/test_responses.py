@@ -0,0 +1,47 @@
+import unittest
+from datetime import datetime
+
+import pytz
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from app.api.v1.models import CurrencyItem, CurrencyList, DatabaseCurrencyList
+from app.main import app
+from app.responses import TrustedModelResponse
+
+
+class TestTrustedModelResponse(unittest.TestCase):
+    """Tests TrustedModelResponse class."""
+
+    def setUp(self):
+        """Fixture setup: a currency list and a route returning it with and without TrustedModelResponse."""
+        self.currency_list = DatabaseCurrencyList(currencies=CurrencyList([CurrencyItem("EUR", 1.1, "real")]))
+        self.currency_list.update_time = datetime(2024, 3, 1, 12, tzinfo=pytz.utc)
+        test_app = FastAPI(default_response_class=ORJSONResponse)
+
+        @test_app.get("/trusted", response_model=DatabaseCurrencyList)
+        async def trusted():
+            return TrustedModelResponse(self.currency_list, status_code=201)
+
+        @test_app.get("/validated", response_model=DatabaseCurrencyList)
+        async def validated():
+            return self.currency_list
+
+        self.client = TestClient(test_app)
+
+    def test_same_body_as_response_model(self):
+        """Tests if the model is rendered exactly like the response_model path would render it."""
+        trusted, validated = self.client.get("/trusted"), self.client.get("/validated")
+        self.assertEqual(trusted.status_code, 201)
+        self.assertEqual(trusted.headers["content-type"], "application/json")
+        self.assertEqual(trusted.json(), validated.json())
+        self.assertEqual(trusted.json()["update_time"], "2024-03-01T12:00:00Z")
+
+    def test_default_response_class(self):
+        """Tests if every route of the application renders plain objects with orjson."""
+        routes = [route for route in app.routes if isinstance(route, APIRoute)]
+        self.assertTrue(routes)
+        for route in routes:
+            self.assertIs(route.response_class, ORJSONResponse, route.path)
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+
+from app.singleflight import AsyncSingleFlight
+
+
+class TestAsyncSingleFlight(unittest.TestCase):
+    """Tests AsyncSingleFlight class."""
+
+    def test_concurrent_calls_are_coalesced(self):
+        """Tests if concurrent coroutines share a single execution."""
+        group = AsyncSingleFlight()
+        executions = []
+
+        async def fetch():
+            executions.append(1)
+            await asyncio.sleep(0.05)
+            return {"EUR": 1.1}
+
+        async def run():
+            return await asyncio.gather(*[group.do("EUR", fetch) for _ in range(10)])
+
+        results = asyncio.run(run())
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(results, [{"EUR": 1.1}] * 10)
+        self.assertEqual(group.stats(), {"calls": 1, "coalesced": 9})
+
+    def test_errors_are_shared(self):
+        """Tests if waiting coroutines get the leader's exception."""
+        group = AsyncSingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.05)
+            raise ValueError("upstream down")
+
+        async def run():
+            return await asyncio.gather(*[group.do("EUR", fail) for _ in range(3)], return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(group.calls, 1)
+
+    def test_cancelled_leader(self):
+        """Tests if cancelling the first caller doesn't cancel the callers waiting for the same execution."""
+        group = AsyncSingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return {"EUR": 1.1}
+
+        async def run():
+            leader = asyncio.ensure_future(group.do("EUR", fetch))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(group.do("EUR", fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await asyncio.gather(leader, waiter, return_exceptions=True)
+
+        leader_result, waiter_result = asyncio.run(run())
+        self.assertIsInstance(leader_result, asyncio.CancelledError)
+        self.assertEqual(waiter_result, {"EUR": 1.1})
+        self.assertEqual(group.stats(), {"calls": 1, "coalesced": 1})
+
+    def test_execution_cancelled_without_callers(self):
+        """Tests if the execution is cancelled once every caller is cancelled, and a later call runs it again."""
+        group = AsyncSingleFlight()
+        cancelled = []
+
+        async def fetch():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+            return 1
+
+        async def run():
+            caller = asyncio.ensure_future(group.do("EUR", fetch))
+            await asyncio.sleep(0.01)
+            caller.cancel()
+            await asyncio.gather(caller, return_exceptions=True)
+            await asyncio.sleep(0)
+            return "EUR" in group._in_flight
+
+        self.assertFalse(asyncio.run(run()))
+        self.assertEqual(cancelled, [1])
@@ -0,0 +1,173 @@
+import asyncio
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytz
+
+from app.cache import LocalCache
+from app.http_cache import PreparedBody
+from app.snapshot import RateSnapshot, RateSnapshotCache, convert_many_as_of
+
+
+class TestRateSnapshotCache(unittest.TestCase):
+    """Tests RateSnapshotCache class."""
+
+    def setUp(self):
+        """Fixture setup: a cache whose loader returns a fixed snapshot."""
+        self.snapshot = RateSnapshot(rates={"USD": 1.0, "EUR": 1.1}, update_time=datetime.now().astimezone(pytz.utc))
+        self.loader = AsyncMock(return_value=self.snapshot)
+        self.cache = RateSnapshotCache(loader=self.loader, ttl=60)
+
+    def test_loads_once_while_fresh(self):
+        """Tests if the loader is only called on the first read within the TTL."""
+        self.assertIs(asyncio.run(self.cache.get()), self.snapshot)
+        self.assertIs(asyncio.run(self.cache.get()), self.snapshot)
+        self.loader.assert_called_once()
+
+    def test_reloads_when_stale(self):
+        """Tests if an expired snapshot is reloaded."""
+        self.cache.ttl = 0
+        asyncio.run(self.cache.get())
+        asyncio.run(self.cache.get())
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_publish_replaces_snapshot(self):
+        """Tests if a published snapshot is served without calling the loader."""
+        new_snapshot = RateSnapshot(rates={"USD": 1.0}, update_time=self.snapshot.update_time)
+        asyncio.run(self.cache.publish(new_snapshot))
+        self.assertIs(asyncio.run(self.cache.get()), new_snapshot)
+        self.loader.assert_not_called()
+
+    def test_invalidate(self):
+        """Tests if invalidate forces a reload."""
+        asyncio.run(self.cache.get())
+        asyncio.run(self.cache.invalidate())
+        asyncio.run(self.cache.get())
+        self.assertEqual(self.loader.call_count, 2)
+
+
+class TestSharedRateSnapshotCache(unittest.TestCase):
+    """Tests RateSnapshotCache backed by a shared cache."""
+
+    def setUp(self):
+        """Fixture setup: two caches (standing for two workers) sharing one cache."""
+        self.snapshot = RateSnapshot(
+            rates={"USD": 1.0, "EUR": 1.1},
+            update_time=datetime.now().astimezone(pytz.utc),
+            listing=PreparedBody(b'{"currencies":[]}'),
+        )
+        self.shared = LocalCache()
+        self.loaders = [AsyncMock(return_value=self.snapshot), AsyncMock(return_value=self.snapshot)]
+        self.workers = [RateSnapshotCache(loader=loader, shared=self.shared, key="rates") for loader in self.loaders]
+
+    def test_loaded_once_per_fleet(self):
+        """Tests if a snapshot loaded by one worker is read by the other one from the shared cache."""
+        asyncio.run(self.workers[0].get())
+        snapshot = asyncio.run(self.workers[1].get())
+        self.loaders[0].assert_called_once()
+        self.loaders[1].assert_not_called()
+        self.assertEqual(snapshot, self.snapshot)
+        self.assertEqual(snapshot.listing.etag, self.snapshot.listing.etag)
+        self.assertEqual(snapshot.version, self.snapshot.version)
+
+    def test_load_shared(self):
+        """Tests if a worker replaces its snapshot by the one published by another worker, without loading it."""
+        self.assertFalse(asyncio.run(self.workers[1].load_shared()))
+        asyncio.run(self.workers[0].publish(self.snapshot))
+        self.assertTrue(asyncio.run(self.workers[1].load_shared()))
+        self.assertEqual(asyncio.run(self.workers[1].get()), self.snapshot)
+        self.loaders[1].assert_not_called()
+
+    def test_invalidate(self):
+        """Tests if invalidate drops the shared snapshot too."""
+        asyncio.run(self.workers[0].publish(self.snapshot))
+        asyncio.run(self.workers[1].invalidate())
+        asyncio.run(self.workers[1].get())
+        self.loaders[1].assert_called_once()
+
+
+class TestRateSnapshot(unittest.TestCase):
+    """Tests RateSnapshot class."""
+
+    def setUp(self):
+        """Fixture setup."""
+        self.snapshot = RateSnapshot(
+            rates={"USD": 1.0, "EUR": 1.1, "BRL": 0.2, "NEW": 0},
+            update_time=datetime.now().astimezone(pytz.utc),
+        )
+
+    def test_convert(self):
+        """Tests convert method."""
+        self.assertAlmostEqual(self.snapshot.convert("EUR", "BRL", 10), 55)
+        self.assertAlmostEqual(self.snapshot.convert("EUR", "USD", 10), 11)
+        self.assertEqual(self.snapshot.convert("XYZ", "XYZ", 10), 10)
+
+    def test_convert_unknown_currency(self):
+        """Tests if converting an unknown currency raises KeyError."""
+        with self.assertRaises(KeyError):
+            self.snapshot.convert("EUR", "XYZ", 10)
+
+    def test_convert_many(self):
+        """Tests if failing items are reported without failing the batch."""
+        items = [
+            SimpleNamespace(source="EUR", target="BRL", amount=10),
+            SimpleNamespace(source="XYZ", target="BRL", amount=10),
+            SimpleNamespace(source="EUR", target="NEW", amount=10),
+        ]
+        results = self.snapshot.convert_many(items)
+        self.assertAlmostEqual(results[0]["result"], 55)
+        self.assertIsNone(results[0]["error"])
+        self.assertIsNone(results[1]["result"])
+        self.assertEqual(results[1]["error"], "Currency with code=XYZ is not being tracked")
+        self.assertIsNotNone(results[2]["error"])
+
+    def test_version(self):
+        """Tests if the version only depends on the update time and the rates."""
+        same = RateSnapshot(rates=dict(self.snapshot.rates), update_time=self.snapshot.update_time)
+        changed = RateSnapshot(rates={**self.snapshot.rates, "EUR": 1.2}, update_time=self.snapshot.update_time)
+        self.assertEqual(same.version, self.snapshot.version)
+        self.assertNotEqual(changed.version, self.snapshot.version)
+
+    def test_precompute(self):
+        """Tests if precompute builds the cross-rate matrix once."""
+        self.snapshot.precompute()
+        matrix = self.snapshot.cross_rate_matrix
+        self.snapshot.precompute()
+        self.assertIs(self.snapshot.cross_rate_matrix, matrix)
+        self.assertEqual(matrix.codes, ("USD", "EUR", "BRL", "NEW"))
+
+
+class TestConvertManyAsOf(unittest.TestCase):
+    """Tests convert_many_as_of function."""
+
+    def setUp(self):
+        """Fixture setup: current rates and rates of a past moment."""
+        self.past = datetime(2024, 3, 1, tzinfo=pytz.utc)
+        self.current = RateSnapshot(rates={"USD": 1.0, "EUR": 1.2}, update_time=datetime.now().astimezone(pytz.utc))
+        self.historical = RateSnapshot(rates={"USD": 1.0, "EUR": 1.1}, update_time=self.past)
+        self.load_current = AsyncMock(return_value=self.current)
+        self.load_as_of = AsyncMock(return_value=self.historical)
+
+    def test_groups_by_moment(self):
+        """Tests if items are converted at their own moment, keeping their order and loading one snapshot per moment."""
+        items = [
+            SimpleNamespace(source="EUR", target="USD", amount=10, as_of=self.past),
+            SimpleNamespace(source="EUR", target="USD", amount=10, as_of=None),
+            SimpleNamespace(source="USD", target="EUR", amount=11, as_of=self.past),
+        ]
+        results = asyncio.run(convert_many_as_of(items, None, self.load_current, self.load_as_of))
+        self.assertAlmostEqual(results[0]["result"], 11)
+        self.assertAlmostEqual(results[1]["result"], 12)
+        self.assertAlmostEqual(results[2]["result"], 10)
+        self.assertEqual([result["as_of"] for result in results], [self.past, None, self.past])
+        self.load_current.assert_called_once_with({"EUR", "USD"})
+        self.load_as_of.assert_called_once_with({"EUR", "USD"}, self.past)
+
+    def test_default_as_of(self):
+        """Tests if as_of applies to items without a moment of their own."""
+        items = [SimpleNamespace(source="EUR", target="USD", amount=10)]
+        results = asyncio.run(convert_many_as_of(items, self.past, self.load_current, self.load_as_of))
+        self.assertAlmostEqual(results[0]["result"], 11)
+        self.load_current.assert_not_called()
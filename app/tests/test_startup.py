@@ -0,0 +1,47 @@
+import asyncio
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app import main
+
+NO_IO_SCRIPT = """
+import app.main
+from app import database, external_api, pg_database
+assert pg_database._engine is None
+assert database._mongo_client is None
+assert external_api._http_client is None
+"""
+
+
+class TestStartup(unittest.TestCase):
+    """Tests the application startup and shutdown."""
+
+    def test_import_without_services(self):
+        """Tests if app.main can be imported without DATABASE_URL and without opening any connection."""
+        environment = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+        completed = subprocess.run([sys.executable, "-c", NO_IO_SCRIPT], env=environment, capture_output=True, text=True)
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+
+    @patch.dict(os.environ, {"DATABASE_URL": "sqlite+aiosqlite://"})
+    def test_startup_is_idempotent(self):
+        """Tests if a second startup() is a no-op until shutdown() runs."""
+        init_databases = AsyncMock()
+
+        async def run():
+            with patch.object(main, "init_databases", init_databases), \
+                    patch.object(main.rate_refresher, "refresh_once", AsyncMock()):
+                await main.startup()
+                await main.startup()
+                self.assertEqual(main.rate_refresher.interval, main.Settings().RATE_REFRESH_INTERVAL)
+                # without CACHE_REDIS_URL, snapshots are only cached by each worker.
+                self.assertIsNone(main.services_v2.rate_snapshot_cache.shared)
+                await main.shutdown()
+                await main.startup()
+                await main.shutdown()
+
+        asyncio.run(run())
+        self.assertEqual(init_databases.call_count, 2)
+        self.assertIsNone(main.rate_refresher._task)
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytz
+from pymongo import ReturnDocument
+
+from app import database
+from app.database import (
+    SNAPSHOT_ID,
+    append_rate_history,
+    close_mongo_client,
+    create_snapshot_document,
+    default_currencies_document,
+    get_database,
+    get_mongo_client,
+    load_rate_snapshot_as_of,
+    pull_currency,
+    push_currency,
+    set_currency_rates,
+    set_custom_currency_rate,
+    snapshot_from_document,
+    write_concern_w,
+)
+
+
+class TestMongoClient(unittest.TestCase):
+    """Tests the process-wide motor client."""
+
+    def setUp(self):
+        """Provides the settings required by Settings (no database is contacted)."""
+        patcher = patch.dict("os.environ", {"DATABASE_URL": "sqlite+aiosqlite://"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Drops the client created by the test."""
+        close_mongo_client()
+
+    def test_write_concern_w(self):
+        """Tests if a number of nodes is parsed and other write concerns are kept as is."""
+        self.assertEqual(write_concern_w("1"), 1)
+        self.assertEqual(write_concern_w("majority"), "majority")
+
+    def test_client_is_shared(self):
+        """Tests if every call returns the same client, until it is closed."""
+        client = get_mongo_client()
+        self.assertIs(get_mongo_client(), client)
+        self.assertIs(get_database().client, client)
+        close_mongo_client()
+        self.assertIsNot(get_mongo_client(), client)
+
+    def test_client_settings(self):
+        """Tests if the pool, timeouts, read preference and write concern come from Settings."""
+        environment = {
+            "MONGO_MAX_POOL_SIZE": "7",
+            "MONGO_SERVER_SELECTION_TIMEOUT_MS": "1500",
+            "MONGO_READ_PREFERENCE": "secondaryPreferred",
+            "MONGO_WRITE_CONCERN": "majority",
+            "MONGO_DATABASE": "test_database",
+        }
+        with patch.dict("os.environ", environment):
+            client = get_mongo_client()
+        options = client.delegate.options
+        self.assertEqual(options.pool_options.max_pool_size, 7)
+        self.assertEqual(options.server_selection_timeout, 1.5)
+        self.assertEqual(client.read_preference.mongos_mode, "secondaryPreferred")
+        self.assertEqual(client.write_concern.document, {"w": "majority"})
+        self.assertEqual(get_database().name, "test_database")
+        self.assertIs(database._mongo_client, client)
+
+
+class TestSnapshotFromDocument(unittest.TestCase):
+    """Tests snapshot_from_document function."""
+
+    def test_listing(self):
+        """Tests if the snapshot carries the serialized available-currencies listing of the document."""
+        document = default_currencies_document()
+        document["update_time"] = datetime(2024, 3, 1, 12)
+        document["currencies"]["list_of_currencies"][0]["rate_usd"] = "0.2"
+        snapshot = snapshot_from_document(document)
+        listing = json.loads(snapshot.listing.body)
+        self.assertEqual(listing["update_time"], "2024-03-01T12:00:00Z")
+        self.assertEqual(
+            listing["currencies"]["list_of_currencies"][0], {"code": "BRL", "rate_usd": 0.2, "currency_type": "real"}
+        )
+        self.assertEqual(snapshot.rates["BRL"], 0.2)
+
+
+class TestAppendRateHistory(unittest.TestCase):
+    """Tests append_rate_history function."""
+
+    def test_placeholder_rates_are_skipped(self):
+        """Tests if currencies with a placeholder rate (0) get no tick."""
+        collection = MagicMock(insert_many=AsyncMock())
+        document = default_currencies_document()
+        document["update_time"] = datetime(2024, 3, 1, 12)
+        asyncio.run(append_rate_history(collection, document))
+        ticks = collection.insert_many.call_args.args[0]
+        self.assertEqual([tick["code"] for tick in ticks], ["USD"])
+
+        collection.insert_many.reset_mock()
+        asyncio.run(append_rate_history(collection, document, {"BRL"}))
+        collection.insert_many.assert_not_called()
+
+
+def mock_collection(**methods) -> MagicMock:
+    """Returns a mocked AsyncIOMotorCollection whose methods (find_one_and_update, update_one...) are AsyncMocks."""
+    collection = MagicMock()
+    for name in ["find_one", "find_one_and_update", "update_one", "delete_many"]:
+        setattr(collection, name, AsyncMock(return_value=methods.get(name)))
+    return collection
+
+
+class TestSnapshotDocumentUpdates(unittest.TestCase):
+    """Tests the atomic updates of the snapshot document."""
+
+    def test_set_currency_rates(self):
+        """Tests if every rate is set through its own array filter, along with update_time, in a single update."""
+        collection = mock_collection(find_one_and_update={"_id": SNAPSHOT_ID})
+        document = asyncio.run(set_currency_rates(collection, {"EUR": 1.1, "BRL": 0.2}))
+        self.assertEqual(document, {"_id": SNAPSHOT_ID})
+        (filter_, update), options = collection.find_one_and_update.call_args
+        self.assertEqual(filter_, {"_id": SNAPSHOT_ID})
+        fields = update["$set"]
+        self.assertEqual(fields.pop("update_time").tzinfo.utcoffset(None).total_seconds(), 0)
+        self.assertEqual(fields, {
+            "currencies.list_of_currencies.$[c0].rate_usd": 1.1,
+            "currencies.list_of_currencies.$[c1].rate_usd": 0.2,
+        })
+        self.assertEqual(options["array_filters"], [{"c0.code": "EUR"}, {"c1.code": "BRL"}])
+        self.assertEqual(options["return_document"], ReturnDocument.AFTER)
+
+    def test_set_no_currency_rates(self):
+        """Tests if an empty mapping only sets update_time (without array filters)."""
+        collection = mock_collection()
+        asyncio.run(set_currency_rates(collection, {}))
+        (_, update), options = collection.find_one_and_update.call_args
+        self.assertEqual(list(update["$set"]), ["update_time"])
+        self.assertIsNone(options["array_filters"])
+
+    def test_push_currency(self):
+        """Tests if the currency is only pushed when its code isn't in the snapshot document yet."""
+        collection = mock_collection()
+        currency = {"code": "GOLD", "rate_usd": 2.0, "currency_type": "custom"}
+        self.assertIsNone(asyncio.run(push_currency(collection, currency)))
+        (filter_, update), options = collection.find_one_and_update.call_args
+        self.assertEqual(filter_, {"_id": SNAPSHOT_ID, "currencies.list_of_currencies.code": {"$ne": "GOLD"}})
+        self.assertEqual(update, {"$push": {"currencies.list_of_currencies": currency}})
+        self.assertEqual(options["return_document"], ReturnDocument.AFTER)
+
+    def test_pull_currency(self):
+        """Tests if the currency is pulled by code from a snapshot document tracking it."""
+        collection = mock_collection()
+        asyncio.run(pull_currency(collection, "GOLD"))
+        (filter_, update), options = collection.find_one_and_update.call_args
+        self.assertEqual(filter_, {"_id": SNAPSHOT_ID, "currencies.list_of_currencies.code": "GOLD"})
+        self.assertEqual(update, {"$pull": {"currencies.list_of_currencies": {"code": "GOLD"}}})
+        self.assertEqual(options["return_document"], ReturnDocument.AFTER)
+
+    def test_set_custom_currency_rate(self):
+        """Tests if only a custom currency with the code is matched, and its rate set through the positional operator."""
+        collection = mock_collection()
+        asyncio.run(set_custom_currency_rate(collection, "GOLD", 3.0))
+        (filter_, update), options = collection.find_one_and_update.call_args
+        self.assertEqual(filter_, {
+            "_id": SNAPSHOT_ID,
+            "currencies.list_of_currencies": {"$elemMatch": {"code": "GOLD", "currency_type": "custom"}},
+        })
+        self.assertEqual(update, {"$set": {"currencies.list_of_currencies.$.rate_usd": 3.0}})
+        self.assertEqual(options["return_document"], ReturnDocument.AFTER)
+
+
+class TestCreateSnapshotDocument(unittest.TestCase):
+    """Tests create_snapshot_document function."""
+
+    legacy_document = {
+        "_id": "65e1f0000000000000000000",
+        "update_time": datetime(2024, 3, 1, 12),
+        "currencies": {"list_of_currencies": [{"code": "USD", "rate_usd": 1, "currency_type": "backing"}]},
+    }
+
+    def assert_upserted(self, collection: MagicMock, document: dict):
+        collection.update_one.assert_awaited_once_with({"_id": SNAPSHOT_ID}, {"$setOnInsert": document}, upsert=True)
+        collection.delete_many.assert_awaited_once_with({"_id": {"$ne": SNAPSHOT_ID}})
+
+    def test_existing_snapshot(self):
+        """Tests if an existing snapshot document is kept and only the documents of the previous layout are removed."""
+        collection = mock_collection(find_one={"_id": SNAPSHOT_ID})
+        legacy_collection = mock_collection()
+        asyncio.run(create_snapshot_document(collection, legacy_collection))
+        collection.find_one.assert_awaited_once_with({"_id": SNAPSHOT_ID})
+        collection.update_one.assert_not_awaited()
+        collection.delete_many.assert_awaited_once_with({"_id": {"$ne": SNAPSHOT_ID}})
+
+    def test_migration_from_currency_rate(self):
+        """Tests if the snapshot starts from the last currency_rate document of the previous layout."""
+        collection = mock_collection()
+        collection.find_one.side_effect = [None, self.legacy_document]
+        legacy_collection = mock_collection()
+        asyncio.run(create_snapshot_document(collection, legacy_collection))
+        legacy_lookup = collection.find_one.await_args_list[1]
+        self.assertEqual(legacy_lookup, (({"_id": {"$ne": SNAPSHOT_ID}},), {"sort": [("_id", -1)]}))
+        legacy_collection.find_one.assert_not_awaited()
+        self.assert_upserted(collection, {
+            "update_time": self.legacy_document["update_time"], "currencies": self.legacy_document["currencies"]
+        })
+
+    def test_migration_from_tracked_currencies(self):
+        """Tests if the snapshot starts from the last tracked_currencies document when currency_rate is empty."""
+        collection = mock_collection()
+        legacy_collection = mock_collection(find_one=self.legacy_document)
+        asyncio.run(create_snapshot_document(collection, legacy_collection))
+        legacy_collection.find_one.assert_awaited_once_with({}, sort=[("_id", -1)])
+        self.assert_upserted(collection, {
+            "update_time": self.legacy_document["update_time"], "currencies": self.legacy_document["currencies"]
+        })
+
+    def test_default_currencies(self):
+        """Tests if an empty database starts with the default currencies."""
+        collection = mock_collection()
+        with patch.object(database, "default_currencies_document", return_value={"currencies": "default"}):
+            asyncio.run(create_snapshot_document(collection, mock_collection()))
+        self.assert_upserted(collection, {"currencies": "default"})
+
+
+class TestLoadRateSnapshotAsOf(unittest.TestCase):
+    """Tests load_rate_snapshot_as_of function."""
+
+    def test_usd_before_its_first_tick(self):
+        """Tests if USD (the backing currency) has a rate of 1 even before its first rate history tick."""
+        as_of = datetime(2024, 3, 1, 12)
+        ticks = {"EUR": {"code": "EUR", "time": datetime(2024, 3, 1, 11), "rate_usd": 1.1}}
+        collection = MagicMock(find_one=AsyncMock(side_effect=lambda query, sort: ticks.get(query["code"])))
+        snapshot = asyncio.run(load_rate_snapshot_as_of(collection, ["EUR", "USD", "BRL"], as_of))
+        self.assertEqual(dict(snapshot.rates), {"EUR": 1.1, "USD": 1.0})
+        self.assertEqual(snapshot.update_time, datetime(2024, 3, 1, 11, tzinfo=pytz.utc))
+        snapshot = asyncio.run(load_rate_snapshot_as_of(collection, ["BRL"], as_of))
+        self.assertEqual(dict(snapshot.rates), {})
@@ -1,18 +1,15 @@
 import unittest
-from abc import ABC
 from datetime import datetime, timedelta
 from enum import Enum
-from unittest.mock import MagicMock, patch
 
 import pytz
 
 from app.api.v1.models import (
     CurrencyItem,
     CurrencyList,
-    CurrencyApiInterface,
-    EconomiaAwesomeAPI,
     CurrencyType,
     DatabaseCurrencyList,
+    RateTable,
 )
 
 
@@ -146,36 +143,52 @@ class TestDatabaseCurrencyList(unittest.TestCase):
         )
 
 
-class TestCurrencyApiInterface(unittest.TestCase):
+class TestRateTable(unittest.TestCase):
 
-    """Test CurrencyApiInterface class."""
-    def test_abstract_methods(self):
-        """Test if abstract methods are implemented properly."""
+    """Tests for RateTable class."""
+    @classmethod
+    def setUpClass(cls):
+        """Fixture setup: a table built from a snapshot document with a naive update time."""
+
+        cls.document = {
+            "_id": "current",
+            "update_time": datetime(2024, 3, 1, 12),
+            "currencies": {
+                "list_of_currencies": [
+                    {"code": "USD", "rate_usd": 1, "currency_type": "backing"},
+                    {"code": "EUR", "rate_usd": 1.55, "currency_type": "real"},
+                    {"code": "ABC", "rate_usd": 2, "currency_type": "custom"},
+                ]
+            },
+        }
+        cls.table = RateTable.from_document(cls.document)
 
-        self.assertTrue(issubclass(CurrencyApiInterface, ABC))
-        self.assertTrue(
-            hasattr(EconomiaAwesomeAPI, "url_builder")
-            and callable(EconomiaAwesomeAPI.url_builder)
-        )
-        self.assertTrue(
-            hasattr(EconomiaAwesomeAPI, "get_conversion")
-            and callable(EconomiaAwesomeAPI.get_conversion)
-        )
+    def test_from_document(self):
+        """Tests the codes, rates, code -> rate map and real/custom partitions of the table."""
 
+        self.assertEqual(self.table.codes, ("USD", "EUR", "ABC"))
+        self.assertEqual(list(self.table.rates), [1.0, 1.55, 2.0])
+        self.assertEqual(self.table.rate_map, {"USD": 1.0, "EUR": 1.55, "ABC": 2.0})
+        self.assertEqual(self.table.real_codes, ("EUR",))
+        self.assertEqual(self.table.custom_codes, ("ABC",))
+        self.assertEqual(self.table.update_time, datetime(2024, 3, 1, 12, tzinfo=pytz.utc))
+        self.assertEqual(len(self.table), 3)
+        self.assertIn("EUR", self.table)
+        self.assertNotIn("BRL", self.table)
 
-class TestEconomiaAwesomeAPI(unittest.TestCase):
+    def test_slots(self):
+        """Tests if the table has no per-instance __dict__."""
 
-    """Test EconomiaAwesomeAPI class."""
-    @patch("requests.get")
-    def test_get_conversion(self, mock_get):
-        """Test get_conversion method."""
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
-            "USD": {"code": "USD", "bid": 5.0},
-            "EUR": {"code": "EUR", "bid": 4.0},
-        }
-        mock_get.return_value = mock_response
+        self.assertFalse(hasattr(self.table, "__dict__"))
+
+    def test_to_model(self):
+        """Tests if the DatabaseCurrencyList built at the API boundary matches the document."""
 
-        rate_coll = MagicMock()
-        track_coll = MagicMock()
-        EconomiaAwesomeAPI.get_conversion("url", rate_coll, track_coll)
+        model = self.table.to_model()
+        self.assertIsInstance(model, DatabaseCurrencyList)
+        self.assertEqual(model.update_time, self.table.update_time)
+        self.assertEqual(
+            model.model_dump()["currencies"]["list_of_currencies"],
+            self.table.currency_dicts(),
+        )
+        self.assertEqual(model.currencies.list_of_currencies[1], CurrencyItem("EUR", 1.55, "real"))
@@ -0,0 +1,43 @@
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytz
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1 import routes
+from app.database import get_mongo_database, rate_snapshot_cache
+from app.snapshot import RateSnapshot
+
+
+class TestConversionRoute(unittest.TestCase):
+    """Tests the HTTP caching of the v1 conversion route."""
+
+    def setUp(self):
+        """Fixture setup: the v1 router, without MongoDB, serving a fixed rate snapshot."""
+        app = FastAPI()
+        app.include_router(routes.router)
+        app.dependency_overrides[get_mongo_database] = lambda: None
+        snapshot = RateSnapshot(rates={"USD": 1.0, "EUR": 1.1}, update_time=datetime(2024, 3, 1, tzinfo=pytz.utc))
+        patcher = patch.object(rate_snapshot_cache, "get", AsyncMock(return_value=snapshot))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+
+    def get_conversion(self, target_currency: str, if_none_match: str = None):
+        headers = {"If-None-Match": if_none_match} if if_none_match else {}
+        params = {"source_currency": "EUR", "target_currency": target_currency, "amount": 10}
+        return self.client.get("/v1/conversion", params=params, headers=headers)
+
+    def test_not_modified(self):
+        """Tests if a request carrying the ETag of the snapshot gets a 304."""
+        response = self.get_conversion("USD")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_conversion("USD", response.headers["ETag"]).status_code, 304)
+
+    def test_untracked_currency_is_not_cached(self):
+        """Tests if a currency that is not tracked gets a 400 even if If-None-Match matches."""
+        etag = self.get_conversion("USD").headers["ETag"]
+        self.assertEqual(self.get_conversion("XYZ", etag).status_code, 400)
+        self.assertEqual(self.get_conversion("XYZ", "*").status_code, 400)
@@ -0,0 +1,96 @@
+import unittest
+from datetime import datetime, timedelta
+
+import pytz
+from sqlalchemy import create_engine, insert, union_all
+
+from app.api.v2.models import Base, RateHistory
+from app.api.v2.services import interval_seconds, latest_tick_query, month_start, rate_history_query, to_naive_utc
+
+
+class TestRateHistoryQuery(unittest.TestCase):
+    """Tests the OHLC downsampling of the rate history (on SQLite)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Fixture setup: two hours of 30 second ticks of EUR (rate rising 0.001 per tick) and one tick of BRL."""
+        cls.engine = create_engine("sqlite://")
+        Base.metadata.create_all(cls.engine)
+        cls.start = datetime(2024, 3, 1)
+        ticks = [
+            {"code": "EUR", "time": cls.start + timedelta(seconds=30 * i), "rate_usd": 1 + i / 1000}
+            for i in range(240)
+        ]
+        ticks.append({"code": "BRL", "time": cls.start, "rate_usd": 0.2})
+        with cls.engine.begin() as connection:
+            connection.execute(insert(RateHistory), ticks)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+
+    def buckets(self, code: str, start: datetime, end: datetime, seconds: int) -> list:
+        with self.engine.connect() as connection:
+            return connection.execute(rate_history_query("sqlite", code, start, end, seconds)).all()
+
+    def test_hourly_buckets(self):
+        """Tests open, high, low, close and ticks of hourly buckets."""
+        rows = self.buckets("EUR", self.start, self.start + timedelta(hours=2), 3600)
+        self.assertEqual(len(rows), 2)
+        first, second = rows
+        self.assertEqual(datetime.fromtimestamp(first.bucket * 3600, pytz.utc), self.start.replace(tzinfo=pytz.utc))
+        self.assertEqual(first.ticks, 120)
+        self.assertAlmostEqual(first.open, 1.0)
+        self.assertAlmostEqual(first.close, 1.119)
+        self.assertAlmostEqual(first.low, 1.0)
+        self.assertAlmostEqual(first.high, 1.119)
+        self.assertAlmostEqual(second.open, 1.12)
+        self.assertEqual(second.bucket, first.bucket + 1)
+
+    def test_range_is_half_open(self):
+        """Tests if ticks at the end of the range (and of other currencies) are left out."""
+        rows = self.buckets("EUR", self.start, self.start + timedelta(minutes=5), 60)
+        self.assertEqual([row.ticks for row in rows], [2, 2, 2, 2, 2])
+
+    def test_unknown_currency(self):
+        """Tests if a currency without ticks has no buckets."""
+        self.assertEqual(self.buckets("XYZ", self.start, self.start + timedelta(hours=2), 3600), [])
+
+    def test_latest_tick(self):
+        """Tests if the latest tick at or before as_of of every currency is found."""
+        as_of = self.start + timedelta(minutes=10, seconds=15)
+        query = union_all(*(latest_tick_query(code, as_of) for code in ("EUR", "BRL", "XYZ")))
+        with self.engine.connect() as connection:
+            rows = {row.code: row for row in connection.execute(query)}
+        self.assertEqual(set(rows), {"EUR", "BRL"})
+        self.assertEqual(rows["EUR"].time, self.start + timedelta(minutes=10))
+        self.assertAlmostEqual(rows["EUR"].rate_usd, 1.02)
+        self.assertAlmostEqual(rows["BRL"].rate_usd, 0.2)
+
+    def test_latest_tick_index(self):
+        """Tests if the latest tick lookup is a search of the (code, time) primary key."""
+        query = latest_tick_query("EUR", self.start).compile(self.engine, compile_kwargs={"literal_binds": True})
+        with self.engine.connect() as connection:
+            plan = "\n".join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {query}"))
+        self.assertIn("SEARCH rate_history USING INDEX sqlite_autoindex_rate_history_1 (code=? AND time<?)", plan)
+
+
+class TestHistoryHelpers(unittest.TestCase):
+    """Tests rate history helper functions."""
+
+    def test_interval_seconds(self):
+        """Tests interval parsing."""
+        self.assertEqual(interval_seconds("30s"), 30)
+        self.assertEqual(interval_seconds("5m"), 300)
+        self.assertEqual(interval_seconds("1h"), 3600)
+        self.assertEqual(interval_seconds("2d"), 172800)
+
+    def test_to_naive_utc(self):
+        """Tests if aware datetimes are converted to UTC and naive ones are kept."""
+        aware = pytz.timezone("America/Sao_Paulo").localize(datetime(2024, 3, 1, 9))
+        self.assertEqual(to_naive_utc(aware), datetime(2024, 3, 1, 12))
+        self.assertEqual(to_naive_utc(datetime(2024, 3, 1, 9)), datetime(2024, 3, 1, 9))
+
+    def test_month_start(self):
+        """Tests month_start."""
+        self.assertEqual(month_start(datetime(2024, 2, 29, 23, 59, 59, 5)), datetime(2024, 2, 1))
@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect, insert, select, text
+
+from app.api.v2.models import Base, Currency, CurrencyType
+from app.api.v2.services import rate_snapshot_query
+
+MIGRATIONS_PATH = Path(__file__).resolve().parents[3] / "migrations"
+
+
+class TestCurrencyIndexes(unittest.TestCase):
+    """Tests if the currency lookups use the currencies indexes (EXPLAIN QUERY PLAN on SQLite)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Fixture setup: currencies table seeded with thousands of currencies."""
+        cls.engine = create_engine("sqlite://")
+        Base.metadata.create_all(cls.engine)
+        update_time = datetime(2024, 1, 1)
+        with cls.engine.begin() as connection:
+            connection.execute(insert(Currency), [
+                {
+                    "code": f"C{i:04d}",
+                    "rate_usd": i + 1,
+                    "type": CurrencyType.REAL if i % 2 else CurrencyType.CUSTOM,
+                    "update_time": update_time + timedelta(seconds=i),
+                }
+                for i in range(5_000)
+            ])
+            connection.execute(text("ANALYZE"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+
+    def query_plan(self, query, **params) -> str:
+        """Returns the EXPLAIN QUERY PLAN details of query."""
+        if params:
+            query = query.params(**params)
+        compiled = query.compile(self.engine, compile_kwargs={"literal_binds": True})
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+        return "\n".join(row[-1] for row in rows)
+
+    def test_code_lookup(self):
+        """Tests if looking up a currency by code searches the unique code index."""
+        plan = self.query_plan(select(Currency.rate_usd).where(Currency.code == "C0042"))
+        self.assertIn("USING INDEX ix_currencies_code", plan)
+        self.assertNotIn("SCAN", plan)
+
+    def test_rate_snapshot_of_every_currency(self):
+        """Tests if the rate snapshot of every currency is read in code order from the unique code index (no sort)."""
+        plan = self.query_plan(rate_snapshot_query())
+        self.assertIn("USING INDEX ix_currencies_code", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_unique_code(self):
+        """Tests if duplicated codes are rejected."""
+        with self.assertRaises(Exception):
+            with self.engine.begin() as connection:
+                connection.execute(insert(Currency).values(
+                    code="C0001", rate_usd=1, type=CurrencyType.REAL, update_time=datetime(2024, 1, 1)
+                ))
+
+
+class TestIndexesMigration(unittest.TestCase):
+    """Tests the currencies indexes Alembic migration."""
+
+    def setUp(self):
+        """Fixture setup: a currencies table as created by populate1.sql (no indexes, duplicated code)."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.database_url = f"sqlite:///{os.path.join(self.directory.name, 'database.db')}"
+        self.engine = create_engine(self.database_url)
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                "CREATE TABLE currencies (id INTEGER PRIMARY KEY, code VARCHAR(10) NOT NULL, rate_usd NUMERIC NOT NULL, "
+                "type VARCHAR(20) NOT NULL, update_time TIMESTAMP NOT NULL)"
+            ))
+            connection.execute(text(
+                "INSERT INTO currencies (code, rate_usd, type, update_time) VALUES "
+                "('BRL', 0, 'REAL', '2024-01-01'), ('EUR', 0, 'REAL', '2024-01-01'), ('BRL', 0.2, 'REAL', '2024-01-02')"
+            ))
+        self.config = Config()
+        self.config.set_main_option("script_location", str(MIGRATIONS_PATH))
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def indexes(self) -> dict:
+        """Returns index name -> index description of the currencies table."""
+        return {index["name"]: index for index in inspect(self.engine).get_indexes("currencies")}
+
+    def test_upgrade_and_downgrade(self):
+        """Tests if upgrade creates the code index (dropping duplicates) and rate_history and downgrade drops them."""
+        with patch.dict(os.environ, {"DATABASE_URL": self.database_url}):
+            command.upgrade(self.config, "head")
+            indexes = self.indexes()
+            self.assertTrue(indexes["ix_currencies_code"]["unique"])
+            with self.engine.connect() as connection:
+                rows = connection.execute(text("SELECT code, rate_usd FROM currencies ORDER BY code")).all()
+            self.assertEqual([(row.code, float(row.rate_usd)) for row in rows], [("BRL", 0.2), ("EUR", 0)])
+            self.assertTrue(inspect(self.engine).has_table("rate_history"))
+
+            command.downgrade(self.config, "base")
+            self.assertEqual(self.indexes(), {})
+            self.assertFalse(inspect(self.engine).has_table("rate_history"))
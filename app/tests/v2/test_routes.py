@@ -0,0 +1,106 @@
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytz
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import main
+from app.api.v2 import routes
+from app.api.v2.services import rate_snapshot_cache
+from app.pg_database import get_session
+from app.rate_providers import ProvidersUnavailableError
+from app.singleflight import AsyncSingleFlight
+from app.snapshot import RateSnapshot
+
+
+class TestConversionRoutes(unittest.TestCase):
+    """Tests the current-rate path of the v2 conversion routes."""
+
+    def setUp(self):
+        """Fixture setup: the v2 router, without PostgreSQL, serving a fixed rate snapshot."""
+        app = FastAPI()
+        app.include_router(routes.router)
+        app.dependency_overrides[get_session] = lambda: None
+        snapshot = RateSnapshot(
+            rates={"USD": 1.0, "EUR": 1.1, "NEW": 0.0}, update_time=datetime(2024, 3, 1, tzinfo=pytz.utc)
+        )
+        self.get = AsyncMock(return_value=snapshot)
+        patcher = patch.object(rate_snapshot_cache, "get", self.get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+
+    def get_conversion(self, target_currency: str, if_none_match: str = None):
+        headers = {"If-None-Match": if_none_match} if if_none_match else {}
+        params = {"source_currency": "EUR", "target_currency": target_currency, "amount": 10}
+        return self.client.get("/v2/conversion", params=params, headers=headers)
+
+    def test_conversion(self):
+        """Tests if a conversion is computed from the rate snapshot and can be revalidated with its ETag."""
+        response = self.get_conversion("USD")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"result": "11.00"})
+        self.assertEqual(self.get_conversion("USD", response.headers["ETag"]).status_code, 304)
+        self.get.assert_awaited()
+
+    def test_conversion_errors(self):
+        """Tests if untracked currencies and currencies without a rate yet get a 400."""
+        response = self.get_conversion("XYZ")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Currency with code=XYZ is not being tracked")
+        response = self.get_conversion("NEW")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Currency with code=NEW has no conversion rate yet")
+
+    def test_batch_conversion(self):
+        """Tests if the items converted at the current rates are served by the rate snapshot."""
+        items = [
+            {"source": "EUR", "target": "USD", "amount": 10},
+            {"source": "EUR", "target": "XYZ", "amount": 10},
+        ]
+        results = self.client.post("/v2/conversions", json=items).json()["results"]
+        self.assertAlmostEqual(results[0]["result"], 11.0)
+        self.assertIn("XYZ", results[1]["error"])
+        self.get.assert_awaited_once()
+
+
+class TestProvidersUnavailable(unittest.TestCase):
+    """Tests the answer of the application when no rate provider can be reached."""
+
+    def setUp(self):
+        """Fixture setup: the application, without PostgreSQL, tracking no currency and with every provider down."""
+        main.app.dependency_overrides[get_session] = lambda: None
+        self.addCleanup(main.app.dependency_overrides.clear)
+        provider = AsyncMock()
+        provider.pair_exists.side_effect = ProvidersUnavailableError("No rate provider answered for USD-EUR")
+        patchers = [
+            patch.object(routes, "check_currency_exists_db", AsyncMock(return_value=False)),
+            patch.object(routes, "get_rate_provider", return_value=provider),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(main.app)
+
+    def test_service_unavailable(self):
+        """Tests if adding or tracking a currency answers 503 instead of guessing whether the currency is real."""
+        response = self.client.post("/v2/add-custom-currency", params={"code": "EUR", "rate_usd": 1})
+        self.assertEqual(response.status_code, 503)
+        response = self.client.post("/v2/track-real-currency", params={"code": "EUR"})
+        self.assertEqual(response.status_code, 503)
+
+
+class TestMetricsRoutes(unittest.TestCase):
+    """Tests the v2 metrics routes."""
+
+    def test_upstream_single_flight(self):
+        """Tests if the coalescing counters of the upstream fetches are exposed."""
+        app = FastAPI()
+        app.include_router(routes.router)
+        group = AsyncSingleFlight()
+        group.calls, group.coalesced = 3, 7
+        with patch.object(routes, "async_upstream_flight", group):
+            response = TestClient(app).get("/v2/metrics/upstream-single-flight")
+        self.assertEqual(response.json(), {"calls": 3, "coalesced": 7})
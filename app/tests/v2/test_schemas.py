@@ -1,7 +1,7 @@
 import unittest
 
 from app.api.v2.models import CurrencyType
-from app.api.v2.schemas import CurrencySchema, CurrencyList
+from app.api.v2.schemas import CurrencySchema, CurrencyList, ConversionResultItem
 
 
 class TestCurrencySchema(unittest.TestCase):
@@ -32,3 +32,13 @@ class TestCurrencyList(unittest.TestCase):
         """Tests empty currencies attribute."""
         currency_list = CurrencyList(currencies=[])
         self.assertEqual(currency_list.currencies, [])
+
+
+class TestConversionResultItem(unittest.TestCase):
+    """Tests ConversionResultItem class."""
+
+    def test_defaults(self):
+        """Tests if result and error default to None."""
+        item = ConversionResultItem(source="EUR", target="BRL", amount=10)
+        self.assertIsNone(item.result)
+        self.assertIsNone(item.error)
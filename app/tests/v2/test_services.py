@@ -0,0 +1,175 @@
+import asyncio
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api.v2 import services
+from app.api.v2.models import Base, Currency, CurrencyType, RateHistory
+from app.api.v2.services import (
+    append_rate_history,
+    bulk_insert_missing,
+    bulk_update_rates,
+    ensure_history_partitions,
+)
+
+
+class TestBulkStatements(unittest.TestCase):
+    """Tests bulk_update_rates and bulk_insert_missing functions (on SQLite)."""
+
+    time = datetime(2024, 3, 1)
+
+    def run_with_session(self, test, codes=("EUR", "BRL")):
+        """Runs test(session) on a fresh database holding the given real currencies (rate_usd 1), then returns the
+        code -> (rate_usd, type, update_time) of every row."""
+
+        async def run():
+            engine = create_async_engine("sqlite+aiosqlite://")
+            try:
+                async with engine.begin() as connection:
+                    await connection.run_sync(Base.metadata.create_all)
+                async with async_sessionmaker(engine)() as session:
+                    if codes:
+                        await session.execute(insert(Currency), [
+                            {"code": code, "rate_usd": 1, "type": CurrencyType.REAL, "update_time": self.time}
+                            for code in codes
+                        ])
+                        await session.commit()
+                    await test(session)
+                    await session.commit()
+                    rows = (await session.execute(select(Currency.code, Currency.rate_usd, Currency.type,
+                                                         Currency.update_time))).all()
+                return {row.code: (row.rate_usd, row.type, row.update_time) for row in rows}
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(run())
+
+    def test_update_by_code(self):
+        """Tests if rates and update_time are set by code, leaving other currencies alone."""
+        new_time = datetime(2024, 3, 2)
+        rows = self.run_with_session(lambda session: bulk_update_rates(session, {"EUR": 1.1}, new_time))
+        self.assertEqual(rows["EUR"], (1.1, CurrencyType.REAL, new_time))
+        self.assertEqual(rows["BRL"], (1.0, CurrencyType.REAL, self.time))
+
+    def test_untracked_codes_are_ignored(self):
+        """Tests if codes that are no longer in the table are neither inserted nor an error."""
+        rows = self.run_with_session(lambda session: bulk_update_rates(session, {"EUR": 1.1, "XYZ": 3}, self.time))
+        self.assertEqual(set(rows), {"EUR", "BRL"})
+        self.assertEqual(rows["EUR"][0], 1.1)
+
+    def test_empty_update(self):
+        """Tests if an empty mapping is a no-op."""
+        rows = self.run_with_session(lambda session: bulk_update_rates(session, {}, self.time))
+        self.assertEqual(rows["EUR"][0], 1.0)
+
+    def test_insert_chunk_boundaries(self):
+        """Tests if every row is inserted when the currencies span several chunks."""
+        currencies = [
+            {"code": f"C{i}", "rate_usd": i, "type": CurrencyType.CUSTOM, "update_time": self.time} for i in range(7)
+        ]
+        with patch.object(services, "BULK_CHUNK_SIZE", 3):
+            rows = self.run_with_session(lambda session: bulk_insert_missing(session, currencies), codes=())
+        self.assertEqual(rows, {f"C{i}": (i, CurrencyType.CUSTOM, self.time) for i in range(7)})
+
+    def test_insert_keeps_existing_rows(self):
+        """Tests if rows whose code already exists are left untouched (ON CONFLICT DO NOTHING)."""
+        currencies = [
+            {"code": "EUR", "rate_usd": 9, "type": CurrencyType.CUSTOM, "update_time": self.time},
+            {"code": "GOLD", "rate_usd": 2, "type": CurrencyType.CUSTOM, "update_time": self.time},
+        ]
+        rows = self.run_with_session(lambda session: bulk_insert_missing(session, currencies))
+        self.assertEqual(rows["EUR"], (1.0, CurrencyType.REAL, self.time))
+        self.assertEqual(rows["GOLD"], (2.0, CurrencyType.CUSTOM, self.time))
+        self.assertEqual(len(rows), 3)
+
+    def test_postgresql_update_chunks(self):
+        """Tests if PostgreSQL gets one UPDATE ... FROM (VALUES ...) per chunk, covering every code once."""
+        session = MagicMock()
+        session.bind.dialect.name = "postgresql"
+        session.execute = AsyncMock()
+        rates = {f"C{i}": float(i) for i in range(7)}
+        with patch.object(services, "BULK_CHUNK_SIZE", 3):
+            asyncio.run(bulk_update_rates(session, rates, self.time))
+        statements = [call.args[0] for call in session.execute.call_args_list]
+        self.assertEqual(len(statements), 3)
+        codes = []
+        for statement in statements:
+            compiled = statement.compile(dialect=postgresql.dialect())
+            self.assertIn("FROM (VALUES", str(compiled))
+            codes.extend(value for key, value in compiled.params.items() if isinstance(value, str))
+        self.assertEqual(sorted(codes), sorted(rates))
+
+
+class TestRateHistory(unittest.TestCase):
+    """Tests append_rate_history and ensure_history_partitions functions."""
+
+    time = datetime(2024, 3, 31, 12)
+
+    def setUp(self):
+        """Fixture setup: no partition is known to exist."""
+        patcher = patch.object(services, "history_partitions", set())
+        self.partitions = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def postgresql_engine(execute: AsyncMock) -> MagicMock:
+        """Returns a mocked PostgreSQL engine whose transactions run statements with execute."""
+        engine = MagicMock()
+        engine.dialect.name = "postgresql"
+        engine.begin.return_value.__aenter__.return_value.execute = execute
+        return engine
+
+    def test_placeholder_rates_are_skipped(self):
+        """Tests if currencies with a placeholder rate (0) get no tick."""
+
+        async def run():
+            engine = create_async_engine("sqlite+aiosqlite://")
+            try:
+                async with engine.begin() as connection:
+                    await connection.run_sync(Base.metadata.create_all)
+                async with async_sessionmaker(engine)() as session:
+                    await append_rate_history(session, {"EUR": 1.1, "NEW": 0}, self.time)
+                    await append_rate_history(session, {"NEW": 0}, self.time)
+                    await session.commit()
+                    return (await session.execute(select(RateHistory.code, RateHistory.rate_usd))).all()
+            finally:
+                await engine.dispose()
+
+        self.assertEqual(asyncio.run(run()), [("EUR", 1.1)])
+
+    def test_partitions_of_this_and_next_month(self):
+        """Tests if the partitions of the month and of the next month are created once, in a transaction of their own."""
+        execute = AsyncMock()
+        engine = self.postgresql_engine(execute)
+        asyncio.run(ensure_history_partitions(engine, self.time))
+        asyncio.run(ensure_history_partitions(engine, self.time))
+        statements = [str(call.args[0]) for call in execute.call_args_list]
+        self.assertEqual(len(statements), 2)
+        self.assertIn("rate_history_2024_03 PARTITION OF rate_history FOR VALUES FROM ('2024-03-01') TO ('2024-04-01')",
+                      statements[0])
+        self.assertIn("rate_history_2024_04 PARTITION OF rate_history FOR VALUES FROM ('2024-04-01') TO ('2024-05-01')",
+                      statements[1])
+        engine.begin.assert_called_once()
+        self.assertEqual(self.partitions, {datetime(2024, 3, 1), datetime(2024, 4, 1)})
+
+    def test_failed_partition_is_not_recorded(self):
+        """Tests if a month whose partition could not be created is created again on the next call."""
+        execute = AsyncMock(side_effect=RuntimeError("connection lost"))
+        engine = self.postgresql_engine(execute)
+        with self.assertRaises(RuntimeError):
+            asyncio.run(ensure_history_partitions(engine, self.time))
+        self.assertEqual(self.partitions, set())
+        execute.side_effect = None
+        asyncio.run(ensure_history_partitions(engine, self.time))
+        self.assertEqual(len(self.partitions), 2)
+
+    def test_other_dialects(self):
+        """Tests if no partition is created outside PostgreSQL."""
+        engine = MagicMock()
+        engine.dialect.name = "sqlite"
+        asyncio.run(ensure_history_partitions(engine, self.time))
+        engine.begin.assert_not_called()
@@ -0,0 +1,28 @@
+"""add currencies indexes
+
+Revision ID: 3f1c2a9b7d10
+Revises:
+Create Date: 2024-03-01 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9b7d10'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # keeps only the most recent row of duplicated codes, so that the unique index can be built.
+    op.execute(sa.text("DELETE FROM currencies WHERE id NOT IN (SELECT max(id) FROM currencies GROUP BY code)"))
+    op.create_index('ix_currencies_code', 'currencies', ['code'], unique=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_currencies_code', table_name='currencies', if_exists=True)
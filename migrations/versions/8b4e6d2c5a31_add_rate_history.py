@@ -0,0 +1,37 @@
+"""add rate history
+
+Revision ID: 8b4e6d2c5a31
+Revises: 3f1c2a9b7d10
+Create Date: 2024-03-08 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b4e6d2c5a31'
+down_revision: Union[str, None] = '3f1c2a9b7d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # databases initialised with populate1.sql already have the table.
+    if sa.inspect(op.get_bind()).has_table('rate_history'):
+        return
+    # on PostgreSQL the table is partitioned by month; partitions are created by the application as rates come in.
+    op.create_table(
+        'rate_history',
+        sa.Column('code', sa.String(length=10), nullable=False),
+        sa.Column('time', sa.DateTime(), nullable=False),
+        sa.Column('rate_usd', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('code', 'time'),
+        postgresql_partition_by='RANGE (time)',
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rate_history')
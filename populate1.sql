@@ -6,9 +6,21 @@ CREATE TABLE IF NOT EXISTS currencies (
     update_time TIMESTAMP NOT NULL
 );
 
+CREATE UNIQUE INDEX IF NOT EXISTS ix_currencies_code ON currencies (code);
+CREATE INDEX IF NOT EXISTS ix_currencies_type_update_time ON currencies (type, update_time);
+
+-- histórico das cotações, particionado por mês (as partições são criadas pela aplicação)
+CREATE TABLE IF NOT EXISTS rate_history (
+    code VARCHAR(10) NOT NULL,
+    time TIMESTAMP NOT NULL,
+    rate_usd DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (code, time)
+) PARTITION BY RANGE (time);
+
 INSERT INTO currencies (code, rate_usd, type, update_time) VALUES
     ('BRL', 0, 'REAL', '2024-01-01 00:00:00'),
     ('EUR', 0, 'REAL', '2024-01-01 00:00:00'),
     ('BTC', 0, 'REAL', '2024-01-01 00:00:00'),
     ('ETH', 0, 'REAL', '2024-01-01 00:00:00'),
-    ('USD', 1, 'BACKING', '2024-01-01 00:00:00');
\ No newline at end of file
+    ('USD', 1, 'BACKING', '2024-01-01 00:00:00')
+ON CONFLICT (code) DO NOTHING;
\ No newline at end of file